@@ -1,43 +1,311 @@
 import os
-from flask import Flask, request, jsonify
+import json
+import base64
+import hashlib
+import logging
+import sqlite3
+import time
+import click
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify
 from flask_cors import CORS
-from models import get_db, init_db
-from scraper import scrape_real_estate_leads
-from voice import place_call, get_llm_response
-from config import get_config, save_config
-
-app = Flask(__name__)
-CORS(app)
-
-# --- INIT DB (moved to first request handler) ---
-@app.before_request
-def setup():
-    if not hasattr(app, 'db_initialized'):
-        init_db()
-        app.db_initialized = True
-
-@app.route('/')
+from models import get_db, find_shared_task, init_db, lead_version, load_shared_task, rebuild_stats, save_shared_task, BULK_CHUNK_SIZE, STATS_DIMENSIONS, LEAD_FIELDS, extract_city_from_address, extract_zip_from_address, normalize_phone, upsert_leads
+from buyers import fresh_buyer_count, record_buyers, refresh_buyer_counts, start_buyer_refresh
+from bulk_io import CALL_LOG_EXPORT_FIELDS, FORMATS, ImportReport, export_rows, format_for_path, gzip_chunks, import_call_logs, import_leads, iter_ndjson, read_records, text_stream, valid_leads
+from dialer import get_dialer, build_call_script, claim_leads, voice_configured, dial
+from config import DEFAULT_CONFIG, get_config, multi_worker, save_config
+from jobs import JobManager, JobQueueFull
+from scrape_cache import get_scrape_cache
+from events import get_event_bus, publish
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Routes live on a blueprint so create_app() can build the app (and set up the
+# database) once per process, rather than checking on every request
+api = Blueprint('api', __name__, cli_group=None)
+
+def create_app(background=True):
+    """The API app, with the database schema created or migrated.
+
+    background starts this process's buyer-count refresher; serve.py passes False and
+    starts one in each worker instead, since threads don't survive a fork.
+    """
+    init_db()
+    app = Flask(__name__)
+    CORS(app, expose_headers=['ETag'])
+    app.register_blueprint(api)
+    if background:
+        start_buyer_refresh()
+    return app
+
+def share_job(job):
+    """Let other worker processes answer status requests for this job"""
+    if multi_worker():
+        save_shared_task(job.id, 'scrape', job.to_dict(), key=job.key)
+
+_config = get_config()
+scrape_jobs = JobManager(max_workers=_config['SCRAPE_WORKERS'], max_pending=_config['SCRAPE_MAX_PENDING'],
+                         on_update=share_job)
+
+# --- Metrics ---
+@api.before_app_request
+def start_request_timer():
+    if metrics.enabled():
+        g.request_started = time.perf_counter()
+
+@api.after_app_request
+def record_request_time(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Label by route pattern, not path, so /api/leads/<id> stays one series
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        metrics.observe_request(request.method, route, response.status_code, time.perf_counter() - started)
+    return response
+
+@api.route('/metrics')
+def prometheus_metrics():
+    """Request, SQL and vendor-call latency histograms for this process in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/')
 def index():
     return {'status': 'LeadGen API running'}
 
 # --- Leads CRUD ---
-@app.route('/api/leads', methods=['GET'])
+# Keyset pagination: each page seeks past the last (sort key, id) of the previous one,
+# so page N costs the same as page 1 regardless of table size. That holds for the filter
+# and sort combinations an index covers (see init_db); a buyer_count range needs sort=buyer_count.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+SORTABLE_FIELDS = ['id', 'buyer_count']
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor, length):
+    """The key values in a cursor from encode_cursor; ValueError unless it holds `length` scalars"""
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if (not isinstance(values, list) or len(values) != length
+            or not all(isinstance(v, (int, float, str)) and not isinstance(v, bool) for v in values)):
+        raise ValueError('Invalid cursor')
+    return values
+
+def lead_filters(params):
+    """WHERE clauses and values for the status/category/zip/buyer_count filters in params"""
+    where = []
+    values = []
+    for k in ['status', 'category', 'zip']:
+        if k in params:
+            where.append(f"{k} = ?")
+            values.append(params[k])
+    if 'min_buyers' in params:
+        where.append("buyer_count >= ?")
+        values.append(int(params['min_buyers']))
+    if 'max_buyers' in params:
+        where.append("buyer_count <= ?")
+        values.append(int(params['max_buyers']))
+    return where, values
+
+def requested_fields(args):
+    """(lead fields named by ?fields=a,b or all of them, any names that aren't lead fields)"""
+    fields = args.get('fields')
+    fields = fields.split(',') if fields else list(LEAD_FIELDS)
+    return fields, [f for f in fields if f not in LEAD_FIELDS]
+
+@api.route('/api/leads', methods=['GET'])
 def get_leads():
+    args = request.args
+    try:
+        limit = min(max(int(args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        where, values = lead_filters(args)
+        since = int(args['since']) if 'since' in args else None
+    except ValueError:
+        return {'error': 'limit, since, min_buyers and max_buyers must be integers'}, 400
+
+    sort = args.get('sort', 'id')
+    order = args.get('order', 'asc').lower()
+    if sort not in SORTABLE_FIELDS or order not in ('asc', 'desc'):
+        return {'error': f"sort must be one of {SORTABLE_FIELDS} and order asc or desc"}, 400
+    # No index serves a buyer_count range in id order, so every page would scan or sort the matches
+    if sort == 'id' and ('min_buyers' in args or 'max_buyers' in args):
+        return {'error': 'min_buyers and max_buyers require sort=buyer_count'}, 400
+
+    fields, unknown = requested_fields(args)
+    if unknown:
+        return {'error': f"Unknown fields: {', '.join(unknown)}"}, 400
+
+    # Any lead write bumps the version, so (version, query) identifies the response body
+    with get_db() as conn:
+        version = lead_version(conn)
+    etag = f"leads-{version}-{hashlib.sha1(request.query_string).hexdigest()[:16]}"
+    if request.if_none_match.contains(etag):
+        return conditional_response(current_app.response_class(status=304), etag)
+
+    if since is not None:
+        if where or 'cursor' in args or 'sort' in args:
+            return {'error': 'since cannot be combined with filters, sort or cursor'}, 400
+        return conditional_response(jsonify(lead_changes(since, limit, fields, version)), etag)
+
+    # id and the sort key are needed to build the next cursor even if not projected
+    columns = list(dict.fromkeys(['id', sort] + fields))
+
+    cmp = '>' if order == 'asc' else '<'
+    if args.get('cursor'):
+        try:
+            after = decode_cursor(args['cursor'], 1 if sort == 'id' else 2)
+        except (ValueError, TypeError):
+            return {'error': 'Invalid cursor'}, 400
+        if sort == 'id':
+            where.append(f"id {cmp} ?")
+            values.append(after[0])
+        else:
+            where.append(f"({sort}, id) {cmp} (?, ?)")
+            values.extend(after)
+
+    sql = f"SELECT {', '.join(columns)} FROM leads"
+    if where:
+        sql += f" WHERE {' AND '.join(where)}"
+    order_by = ['id'] if sort == 'id' else [sort, 'id']
+    sql += f" ORDER BY {', '.join(f'{k} {order.upper()}' for k in order_by)} LIMIT ?"
+    # Fetch one extra row to know whether another page exists
+    values.append(limit + 1)
+
     with get_db() as conn:
-        leads = conn.execute('SELECT * FROM leads').fetchall()
-        return jsonify([dict(row) for row in leads])
+        rows = conn.execute(sql, values).fetchall()
 
-@app.route('/api/leads', methods=['POST'])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor([last[k] for k in order_by])
+    leads = [{k: row[k] for k in fields} for row in rows]
+    # version was read before the page, so syncing from it can only repeat changes, never miss them
+    return conditional_response(jsonify({'leads': leads, 'next_cursor': next_cursor, 'has_more': has_more,
+                                         'version': version}), etag)
+
+def lead_changes(since, limit, fields, version):
+    """Leads written and ids deleted after version `since`, oldest change first"""
+    columns = list(dict.fromkeys(['id', 'version'] + fields))
+    with get_db() as conn:
+        rows = conn.execute(f"SELECT {', '.join(columns)} FROM leads WHERE version > ? ORDER BY version LIMIT ?",
+                            (since, limit + 1)).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        # A partial page only covers changes up to its last row; the client continues from there
+        upto = rows[-1]['version'] if has_more else max([version] + [row['version'] for row in rows])
+        deleted = [row['id'] for row in conn.execute(
+            'SELECT id FROM lead_tombstones WHERE version > ? AND version <= ? ORDER BY version', (since, upto))]
+    return {
+        'leads': [{k: row[k] for k in fields} for row in rows],
+        'deleted': deleted,
+        'version': upto,
+        'has_more': has_more,
+    }
+
+def conditional_response(response, etag):
+    response.set_etag(etag)
+    # Let browsers keep the body but always revalidate it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@api.route('/api/leads', methods=['POST'])
 def add_lead():
     data = request.json
-    with get_db() as conn:
-        c = conn.cursor()
-        c.execute('''INSERT INTO leads (name, phone, category, address, website, status, buyer_count) VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                  (data['name'], data['phone'], data['category'], data['address'], data.get('website', ''), data.get('status', 'Not Called'), data.get('buyer_count', 0)))
-        conn.commit()
-        return {'id': c.lastrowid}, 201
+    inserted_ids, updated_ids = upsert_leads([data])
+    # A lead whose phone is already on file is merged into the existing row
+    if updated_ids:
+        return {'id': updated_ids[0], 'updated': True}
+    return {'id': inserted_ids[0]}, 201
 
-@app.route('/api/leads/<int:lead_id>', methods=['PATCH'])
+@api.route('/api/leads/bulk', methods=['POST'])
+def bulk_add_leads():
+    """Upsert many leads from a JSON array or an NDJSON stream"""
+    rejected = []
+    reject = lambda row, error: rejected.append({'row': row, 'error': error})
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        records = iter_ndjson(request.stream, reject)
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            return {'error': 'Expected a JSON array or an application/x-ndjson body'}, 400
+        records = enumerate(data, start=1)
+    inserted_ids, updated_ids = upsert_leads(valid_leads(records, reject))
+    return {
+        'inserted_ids': inserted_ids,
+        'updated_ids': updated_ids,
+        'inserted': len(inserted_ids),
+        'updated': len(updated_ids),
+        'rejected': rejected,
+    }
+
+# --- Bulk export / import ---
+# Exports stream from one cursor and imports commit a chunk at a time, so neither holds
+# the whole table (or file) in memory. An upload is imported while the request waits,
+# holding one of the server's request slots, so bodies are capped at IMPORT_MAX_BYTES;
+# use the import-leads / import-call-logs CLI commands for anything bigger.
+def export_response(chunks, fmt, name):
+    """Stream export chunks as a download, gzipped when the client accepts it"""
+    headers = {'Content-Disposition': f'attachment; filename="{name}.{fmt}"', 'Vary': 'Accept-Encoding'}
+    if request.accept_encodings['gzip']:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(chunks, mimetype=FORMATS[fmt], headers=headers)
+
+@api.route('/api/leads/export', methods=['GET'])
+def export_leads():
+    """Every lead matching the list filters (status, category, zip, min/max_buyers), as CSV or NDJSON"""
+    args = request.args
+    fmt = args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return {'error': f"format must be one of {list(FORMATS)}"}, 400
+    try:
+        where, values = lead_filters(args)
+    except ValueError:
+        return {'error': 'min_buyers and max_buyers must be integers'}, 400
+    fields, unknown = requested_fields(args)
+    if unknown:
+        return {'error': f"Unknown fields: {', '.join(unknown)}"}, 400
+    sql = f"SELECT {', '.join(fields)} FROM leads"
+    if where:
+        sql += f" WHERE {' AND '.join(where)}"
+    return export_response(export_rows(sql + ' ORDER BY id', values, fields, fmt), fmt, 'leads')
+
+def import_too_large():
+    """An error response if the upload has no Content-Length or exceeds IMPORT_MAX_BYTES, else None"""
+    limit = get_config()['IMPORT_MAX_BYTES']
+    if request.content_length is None:
+        return {'error': 'Content-Length is required'}, 411
+    if request.content_length > limit:
+        return {'error': f"Bodies over {limit} bytes must be imported with the import-leads / import-call-logs CLI commands"}, 413
+    return None
+
+def import_request_stream():
+    """(format, text stream) of a CSV or NDJSON request body, or (None, None) for other types"""
+    if request.mimetype == 'text/csv':
+        fmt = 'csv'
+    elif request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        fmt = 'ndjson'
+    else:
+        return None, None
+    return fmt, text_stream(request.stream, gzipped=request.headers.get('Content-Encoding') == 'gzip')
+
+@api.route('/api/leads/import', methods=['POST'])
+def import_leads_upload():
+    """Upsert leads from a text/csv or application/x-ndjson body (optionally Content-Encoding: gzip)"""
+    fmt, stream = import_request_stream()
+    if not fmt:
+        return {'error': 'Send a text/csv or application/x-ndjson body'}, 415
+    error = import_too_large()
+    if error:
+        return error
+    report = ImportReport()
+    import_leads(read_records(stream, fmt, report), report)
+    if report.inserted or report.updated:
+        publish('leads_changed', {'imported': report.inserted + report.updated})
+    return report.to_dict()
+
+@api.route('/api/leads/<int:lead_id>', methods=['PATCH'])
 def update_lead(lead_id):
     data = request.json
     with get_db() as conn:
@@ -47,46 +315,167 @@ def update_lead(lead_id):
             if k in data:
                 fields.append(f"{k} = ?")
                 values.append(data[k])
+        if 'address' in data:
+            fields.append("zip = ?")
+            values.append(extract_zip_from_address(data['address']))
+            fields.append("city = ?")
+            values.append(extract_city_from_address(data['address']))
+        if 'phone' in data:
+            fields.append("phone_norm = ?")
+            values.append(normalize_phone(data['phone']))
         if not fields:
             return {'error': 'No fields to update'}, 400
         values.append(lead_id)
-        conn.execute(f"UPDATE leads SET {', '.join(fields)} WHERE id = ?", values)
+        try:
+            conn.execute(f"UPDATE leads SET {', '.join(fields)} WHERE id = ?", values)
+        except sqlite3.IntegrityError:
+            return {'error': 'Another lead already has this phone number'}, 409
         conn.commit()
-        return {'status': 'updated'}
+        # A lead that moved is matched against the buyers of its new place, unless told its count
+        if 'address' in data and 'buyer_count' not in data:
+            fresh_buyer_count(lead_id)
+        lead = conn.execute(f"SELECT {', '.join(LEAD_FIELDS)} FROM leads WHERE id = ?", (lead_id,)).fetchone()
+    if lead:
+        publish('lead', dict(lead))
+    return {'status': 'updated'}
 
-@app.route('/api/scrape', methods=['POST'])
+# Most metros one sharded scrape request may cover
+MAX_SCRAPE_LOCATIONS = 100
+
+@api.route('/api/scrape', methods=['POST'])
 def scrape_new_leads():
-    config = get_config()
+    """Scrape one location, or a `locations` list sharded across the scrape process pool"""
+    data = request.json or {}
     # Get location from request or use default
-    location = request.json.get('location', 'Austin, TX')
-    limit = request.json.get('limit', 30)
+    location = data.get('location', 'Austin, TX')
+    try:
+        limit = int(data.get('limit', 30))
+    except (TypeError, ValueError):
+        return {'error': 'limit must be an integer'}, 400
+    force_refresh = bool(data.get('force_refresh', False))
+    from scraper import normalize_location
     
-    # If missing keys, return dummy data (dummy handling is now in the scraper)
-    scraped = scrape_real_estate_leads(location=location, limit=limit)
+    locations = data.get('locations', [location])
+    if not isinstance(locations, list) or not locations or not all(isinstance(l, str) and l.strip() for l in locations):
+        return {'error': 'locations must be a non-empty list of location names'}, 400
+    # One shard per metro, however it was spelled
+    unique = {}
+    for l in locations:
+        unique.setdefault(normalize_location(l), l)
+    if len(unique) > MAX_SCRAPE_LOCATIONS:
+        return {'error': f"At most {MAX_SCRAPE_LOCATIONS} locations per request"}, 400
+    locations = list(unique.values())
+    if len(locations) == 1:
+        location = locations[0]
+        key = f"{normalize_location(location)}|{limit}|{force_refresh}"
+        params = {'location': location, 'limit': limit, 'force_refresh': force_refresh}
+        run = lambda job: run_scrape_job(job, location, limit, force_refresh)
+    else:
+        key = f"locations:{'|'.join(sorted(unique))}|{limit}|{force_refresh}"
+        params = {'locations': locations, 'limit': limit, 'force_refresh': force_refresh}
+        run = lambda job: run_sharded_scrape_job(job, locations, limit, force_refresh)
     
-    with get_db() as conn:
-        c = conn.cursor()
-        new_ids = []
-        for lead in scraped:
-            c.execute('''INSERT INTO leads (name, phone, category, address, website, status, buyer_count) VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                      (lead['name'], lead['phone'], lead['category'], lead['address'], lead.get('website', ''), 'Not Called', lead.get('buyer_count', 0)))
-            new_ids.append(c.lastrowid)
-        conn.commit()
+    # Scrapes take minutes, so they run in the background; a second request for a location
+    # (or set of locations) already being scraped with the same limit and force_refresh
+    # joins the in-flight job, while one asking for something different gets its own
+    shared = find_shared_task('scrape', key) if multi_worker() else None
+    if shared:
+        # Already running in another worker process
+        return {'job_id': shared['job_id'], 'state': shared['state'], 'deduplicated': True}, 202
+    try:
+        job, created = scrape_jobs.submit(key, params, run)
+    except JobQueueFull as e:
+        return {'error': str(e)}, 503
+    return {'job_id': job.id, 'state': job.state, 'deduplicated': not created}, 202
+
+@api.route('/api/scrape/cache', methods=['GET'])
+def scrape_cache_stats():
+    return jsonify(get_scrape_cache().stats())
+
+@api.route('/api/scrape/<job_id>', methods=['GET'])
+def get_scrape_job(job_id):
+    job = scrape_jobs.get(job_id)
+    if job:
+        return jsonify(job.to_dict())
+    # Another worker process may be running it
+    shared = load_shared_task(job_id, 'scrape') if multi_worker() else None
+    if not shared:
+        return {'error': 'Job not found'}, 404
+    return jsonify(shared)
+
+def run_scrape_job(job, location, limit, force_refresh=False):
+    """Scrape a location and ingest the results (runs on a job worker thread)"""
+    from scraper import scrape_real_estate_leads
+    config = get_config()
+    # If missing keys, return dummy data (dummy handling is now in the scraper)
+    mined = []
+    scraped = scrape_real_estate_leads(location=location, limit=limit, on_progress=job.set_progress,
+                                       force_refresh=force_refresh, on_buyers=mined.extend)
+    is_dummy = not config['BRIGHTDATA_API_TOKEN']
+    new_ids, updated_ids = ingest_scrape(job, location, scraped, None if is_dummy else mined)
     
+    return {'inserted_ids': new_ids, 'updated_ids': updated_ids, 'count': len(new_ids), 'dummy': is_dummy}
+
+def run_sharded_scrape_job(job, locations, limit, force_refresh=False):
+    """Scrape several locations in the scrape process pool, ingesting each one as it finishes.
+
+    job.progress has a status per location: queued, then ingesting, then done (with its
+    counts and per-source results) or failed.
+    """
+    from scrape_pool import scrape_shards
+    config = get_config()
     is_dummy = not config['BRIGHTDATA_API_TOKEN']
-    return {'inserted_ids': new_ids, 'count': len(new_ids), 'dummy': is_dummy}
+    for location in locations:
+        job.set_progress(location, 'queued')
+    new_ids, updated_ids, failed = [], [], 0
+    for location, shard, error in scrape_shards(locations, limit, force_refresh):
+        if error is not None:
+            job.set_progress(location, 'failed', error=str(error))
+            failed += 1
+            continue
+        job.set_progress(location, 'ingesting', count=len(shard['agents']))
+        try:
+            inserted, updated = ingest_scrape(job, location, shard['agents'], None if is_dummy else shard['buyers'])
+        except Exception as e:
+            # One shard's bad write shouldn't lose the others' results
+            logger.exception(f"Ingesting scrape shard {location} failed")
+            job.set_progress(location, 'failed', error=str(e))
+            failed += 1
+            continue
+        new_ids += inserted
+        updated_ids += updated
+        job.set_progress(location, 'done', inserted=len(inserted), updated=len(updated), buyers=len(shard['buyers']),
+                         sources=shard['sources'], seconds=round(shard['seconds'], 2))
+    if failed == len(locations):
+        raise RuntimeError(f"All {failed} scrape shards failed")
+    return {'inserted_ids': new_ids, 'updated_ids': updated_ids, 'count': len(new_ids),
+            'shards': len(locations), 'failed_shards': failed, 'dummy': is_dummy}
 
-@app.route('/api/config', methods=['GET', 'POST'])
+def ingest_scrape(job, location, scraped, mined):
+    """Upsert one location's scraped agents and store its mined buyers (if any); returns (inserted_ids, updated_ids)"""
+    # Re-scraped agents are matched on phone and refreshed rather than duplicated
+    new_ids, updated_ids = upsert_leads(scraped)
+    # Mined buyers are kept, and every lead in a place they reach is recounted, not just this scrape's.
+    # Dummy scrapes pass mined=None and skip this: their made-up buyers mustn't count towards real leads
+    recounted = record_buyers(mined, new_ids + updated_ids) if mined is not None else 0
+    publish('scrape', {'job_id': job.id, 'location': location, 'inserted': len(new_ids), 'updated': len(updated_ids)})
+    if recounted:
+        publish('leads_changed', {'buyer_counts': recounted})
+    return new_ids, updated_ids
+
+@api.route('/api/config', methods=['GET', 'POST'])
 def api_config():
+    # Only the dashboard-editable keys; server settings come from the environment
     if request.method == 'GET':
-        return jsonify(get_config())
+        config = get_config()
+        return jsonify({k: config[k] for k in DEFAULT_CONFIG})
     else:
         data = request.json or {}
         save_config(data)
         return {'status': 'updated'}
 
 # --- Call Logs ---
-@app.route('/api/call_logs', methods=['POST'])
+@api.route('/api/call_logs', methods=['POST'])
 def add_call_log():
     data = request.json
     with get_db() as conn:
@@ -94,15 +483,108 @@ def add_call_log():
         c.execute('''INSERT INTO call_logs (lead_id, call_status, transcript) VALUES (?, ?, ?)''',
                   (data['lead_id'], data['call_status'], data.get('transcript', '')))
         conn.commit()
-        return {'id': c.lastrowid}, 201
+    # Transcripts can be long; subscribers fetch them on demand
+    publish('call_log', {'id': c.lastrowid, 'lead_id': data['lead_id'], 'call_status': data['call_status']})
+    return {'id': c.lastrowid}, 201
 
-@app.route('/api/call_logs/<int:lead_id>', methods=['GET'])
+@api.route('/api/call_logs/<int:lead_id>', methods=['GET'])
 def get_call_logs(lead_id):
     with get_db() as conn:
         logs = conn.execute('SELECT * FROM call_logs WHERE lead_id = ? ORDER BY created_at DESC', (lead_id,)).fetchall()
         return jsonify([dict(row) for row in logs])
 
-@app.route('/api/call', methods=['POST'])
+@api.route('/api/call_logs/export', methods=['GET'])
+def export_call_logs():
+    """Call logs (optionally for one lead_id or created since a timestamp), oldest first, as CSV or NDJSON"""
+    args = request.args
+    fmt = args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return {'error': f"format must be one of {list(FORMATS)}"}, 400
+    where = []
+    values = []
+    if 'lead_id' in args:
+        try:
+            values.append(int(args['lead_id']))
+        except ValueError:
+            return {'error': 'lead_id must be an integer'}, 400
+        where.append('lead_id = ?')
+    if 'since' in args:
+        where.append('created_at >= ?')
+        values.append(args['since'])
+    sql = f"SELECT {', '.join(CALL_LOG_EXPORT_FIELDS)} FROM call_logs"
+    if where:
+        sql += f" WHERE {' AND '.join(where)}"
+    return export_response(export_rows(sql + ' ORDER BY id', values, CALL_LOG_EXPORT_FIELDS, fmt), fmt, 'call_logs')
+
+@api.route('/api/call_logs/import', methods=['POST'])
+def import_call_logs_upload():
+    """Insert call logs from a text/csv or application/x-ndjson body (optionally Content-Encoding: gzip)"""
+    fmt, stream = import_request_stream()
+    if not fmt:
+        return {'error': 'Send a text/csv or application/x-ndjson body'}, 415
+    error = import_too_large()
+    if error:
+        return error
+    report = ImportReport()
+    import_call_logs(read_records(stream, fmt, report), report)
+    return report.to_dict()
+
+# Search results are ranked, so they page by offset rather than by key: bm25 ranks aren't
+# a stable sort key, and each page re-ranks every match. The cursor pins the call logs that
+# existed when the first page was served, and only the best SEARCH_MAX_RESULTS are pageable.
+SEARCH_MAX_RESULTS = 1000
+
+@api.route('/api/call_logs/search', methods=['GET'])
+def search_call_logs():
+    """Transcripts matching an FTS5 query (e.g. "not interested" OR zillow), best match first"""
+    args = request.args
+    query = args.get('q', '').strip()
+    if not query:
+        return {'error': 'q is required'}, 400
+    try:
+        limit = min(max(int(args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        lead_id = int(args['lead_id']) if 'lead_id' in args else None
+    except ValueError:
+        return {'error': 'limit and lead_id must be integers'}, 400
+    offset, max_id = 0, None
+    if args.get('cursor'):
+        try:
+            offset, max_id = decode_cursor(args['cursor'], 2)
+            if not isinstance(offset, int) or not isinstance(max_id, int) or not 0 <= offset < SEARCH_MAX_RESULTS:
+                raise ValueError('Invalid cursor')
+        except (ValueError, TypeError):
+            return {'error': 'Invalid cursor'}, 400
+    limit = min(limit, SEARCH_MAX_RESULTS - offset)
+
+    try:
+        with get_db() as conn:
+            if max_id is None:
+                max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM call_logs').fetchone()[0]
+            where = ['call_logs_fts MATCH ?', 'call_logs_fts.rowid <= ?']
+            values = [query, max_id]
+            if lead_id is not None:
+                where.append('call_logs.lead_id = ?')
+                values.append(lead_id)
+            sql = f'''SELECT call_logs.id, call_logs.lead_id, leads.name AS lead_name, call_logs.call_status,
+                             call_logs.created_at, call_logs_fts.rank AS rank,
+                             snippet(call_logs_fts, 0, '<mark>', '</mark>', '…', 16) AS snippet
+                      FROM call_logs_fts
+                      JOIN call_logs ON call_logs.id = call_logs_fts.rowid
+                      LEFT JOIN leads ON leads.id = call_logs.lead_id
+                      WHERE {' AND '.join(where)}
+                      ORDER BY call_logs_fts.rank, call_logs.id LIMIT ? OFFSET ?'''
+            rows = conn.execute(sql, values + [limit + 1, offset]).fetchall()
+    except sqlite3.OperationalError as e:
+        if 'no such table' in str(e):
+            return {'error': 'Transcript search is unavailable (SQLite built without FTS5)'}, 503
+        return {'error': f"Invalid search query: {e}"}, 400
+
+    has_more = len(rows) > limit and offset + limit < SEARCH_MAX_RESULTS
+    rows = rows[:limit]
+    next_cursor = encode_cursor([offset + limit, max_id]) if has_more else None
+    return jsonify({'results': [dict(row) for row in rows], 'next_cursor': next_cursor, 'has_more': has_more})
+
+@api.route('/api/call', methods=['POST'])
 def call_lead():
     data = request.json
     lead_id = data['lead_id']
@@ -114,43 +596,183 @@ def call_lead():
         lead = conn.execute('SELECT * FROM leads WHERE id = ?', (lead_id,)).fetchone()
         if not lead:
             return {'error': 'Lead not found'}, 404
-        
-        # Generate script based on lead data if not provided
-        if not script:
-            agent_name = lead['name'].split()[0] if lead['name'] else "there"
-            buyer_count = lead.get('buyer_count', 0) or 10 # Fallback to 10 if not set
-            zip_code = extract_zip_from_address(lead['address']) or "your area"
-            script = f"Hi {agent_name}, this is Ava from Home IQ. We've tracked {buyer_count} qualified buyers searching in {zip_code} right now. Would you like a list?"
+    # The pitch quotes buyer_count, so count against the buyers stored as of now
+    lead = dict(lead, buyer_count=fresh_buyer_count(lead_id))
     
-    # Dummy mode
-    if not config['TWILIO_ACCOUNT_SID'] or not config['ELEVENLABS_API_KEY'] or not config['LLM_API_KEY']:
-        with get_db() as conn:
-            conn.execute('UPDATE leads SET status = ? WHERE id = ?', ("Calling", lead_id))
-            conn.commit()
-        return {'call_sid': 'dummy-call', 'dummy': True}
+    # Generate script based on lead data if not provided
+    if not script and config['SCRIPT_MODE'] == 'llm':
+        from script_gen import generate_scripts
+        script = generate_scripts([lead])[lead['id']]
+    elif not script:
+        script = build_call_script(lead)
     
-    # Real mode
     try:
-        call_sid = place_call(lead['phone'], script)
+        # Dummy mode is handled by the dialer when voice keys are missing
+        call_sid = dial(lead, script, config)
         with get_db() as conn:
             conn.execute('UPDATE leads SET status = ? WHERE id = ?', ("Calling", lead_id))
             conn.commit()
+        publish('lead', {'id': lead_id, 'status': 'Calling'})
+        if not voice_configured(config):
+            return {'call_sid': call_sid, 'dummy': True}
         return {'call_sid': call_sid}
     except Exception as e:
         return {'error': str(e)}, 500
 
-def extract_zip_from_address(address):
-    """Extract zip code from an address string"""
-    if not address:
-        return None
-    # Simple implementation - would need to be more robust in production
-    parts = address.split()
-    for part in parts:
-        if len(part) == 5 and part.isdigit():
-            return part
-    return None
+@api.route('/api/call/batch', methods=['POST'])
+def call_batch():
+    """Dial many leads: an explicit lead_ids list, or every lead matching filter (default Not Called)"""
+    data = request.json or {}
+    try:
+        if 'lead_ids' in data:
+            lead_ids = [int(i) for i in data['lead_ids']]
+            where, values = [f"id IN ({', '.join('?' for _ in lead_ids)})"], lead_ids
+        else:
+            where, values = lead_filters(data.get('filter') or {'status': 'Not Called'})
+        limit = int(data['limit']) if 'limit' in data else -1
+    except (TypeError, ValueError):
+        return {'error': 'lead_ids, limit, min_buyers and max_buyers must be integers'}, 400
+    
+    # Counts whose buyers aged out of the window are recounted in the background, not here
+    # Only the leads this batch claims are dialed; another batch's queued leads are left to it
+    leads = claim_leads(where, values, limit)
+    
+    campaign = get_dialer().start(leads, data.get('script'))
+    return {**campaign.to_dict(), 'dummy': not voice_configured(get_config())}, 202
+
+@api.route('/api/call/batch/<campaign_id>', methods=['GET'])
+def get_call_batch(campaign_id):
+    status = get_dialer().status(campaign_id)
+    if not status:
+        return {'error': 'Campaign not found'}, 404
+    return jsonify(status)
+
+@api.route('/api/call/batch/<campaign_id>/cancel', methods=['POST'])
+def cancel_call_batch(campaign_id):
+    status = get_dialer().cancel(campaign_id)
+    if not status:
+        return {'error': 'Campaign not found'}, 404
+    return jsonify(status)
+
+# --- Stats ---
+@api.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Lead counts and buyer totals per status/category/zip, and call outcomes per day.
+
+    Served from trigger-maintained summary tables; a missing value is grouped under "".
+    """
+    try:
+        days = min(max(int(request.args.get('days', 30)), 1), 3650)
+    except ValueError:
+        return {'error': 'days must be an integer'}, 400
+    with get_db() as conn:
+        groups = conn.execute('SELECT dimension, value, leads, buyers FROM lead_stats ORDER BY leads DESC, value').fetchall()
+        calls = conn.execute('''SELECT day, call_status, calls FROM call_stats_daily
+                                WHERE day > date('now', ?) ORDER BY day DESC''', (f'-{days} days',)).fetchall()
+    stats = {f'by_{dim}': {} for dim in STATS_DIMENSIONS}
+    for row in groups:
+        stats[f"by_{row['dimension']}"][row['value']] = {'leads': row['leads'], 'buyers': row['buyers']}
+    # Every lead has exactly one status, so the status groups add up to the totals
+    stats['total_leads'] = sum(group['leads'] for group in stats['by_status'].values())
+    stats['total_buyers'] = sum(group['buyers'] for group in stats['by_status'].values())
+    calls_per_day = {}
+    for row in calls:
+        day = calls_per_day.setdefault(row['day'], {'day': row['day'], 'total': 0, 'outcomes': {}})
+        day['outcomes'][row['call_status']] = row['calls']
+        day['total'] += row['calls']
+    stats['calls_per_day'] = list(calls_per_day.values())
+    return jsonify(stats)
+
+@api.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the /api/stats summary tables from leads and call_logs"""
+    init_db()
+    with get_db() as conn:
+        rebuild_stats(conn)
+    print('Stats rebuilt')
+
+@api.cli.command('recount-buyers')
+@click.option('--all', 'everything', is_flag=True, help='recount every lead, e.g. after changing MATCH_RADIUS_MILES')
+def recount_buyers_command(everything):
+    """Bring buyer_count up to date with the stored buyers and the BUYER_WINDOW_DAYS window"""
+    init_db()
+    changed = refresh_buyer_counts(everything)
+    if changed:
+        publish('leads_changed', {'buyer_counts': changed})
+    print(f'{changed} lead(s) recounted')
+
+def run_import(importer, path, fmt, chunk_size, rejects):
+    fmt = fmt or format_for_path(path)
+    if not fmt:
+        raise click.UsageError('Cannot tell the format from the file name; pass --format')
+    init_db()
+    on_reject = (lambda reject: rejects.write(json.dumps(reject) + '\n')) if rejects else None
+    report = ImportReport(on_reject)
+    with open(path, 'rb') as f:
+        importer(read_records(text_stream(f, gzipped=path.endswith('.gz')), fmt, report), report, chunk_size)
+    summary = report.to_dict()
+    if rejects:
+        del summary['rejects'], summary['rejects_truncated']
+    print(json.dumps(summary, indent=2))
+    return report
+
+import_options = [
+    click.argument('path', type=click.Path(exists=True, dir_okay=False)),
+    click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), help='default: from the file extension'),
+    click.option('--chunk-size', default=BULK_CHUNK_SIZE, show_default=True, help='rows per transaction'),
+    click.option('--rejects', type=click.File('w'), help='write every rejected row here as NDJSON'),
+]
+
+def with_import_options(fn):
+    for option in reversed(import_options):
+        fn = option(fn)
+    return fn
+
+@api.cli.command('import-leads')
+@with_import_options
+def import_leads_command(path, fmt, chunk_size, rejects):
+    """Upsert leads from a CSV or NDJSON file (optionally .gz) of any size"""
+    report = run_import(import_leads, path, fmt, chunk_size, rejects)
+    if report.inserted or report.updated:
+        publish('leads_changed', {'imported': report.inserted + report.updated})
+
+@api.cli.command('import-call-logs')
+@with_import_options
+def import_call_logs_command(path, fmt, chunk_size, rejects):
+    """Insert call logs from a CSV or NDJSON file (optionally .gz) of any size"""
+    run_import(import_call_logs, path, fmt, chunk_size, rejects)
+
+# --- Live updates ---
+@api.route('/api/events', methods=['GET'])
+def event_stream():
+    """Server-sent events: lead, call_log and scrape updates, plus leads_changed after bulk writes.
+
+    Reconnecting clients send Last-Event-ID and get what they missed from the ring buffer;
+    if it has moved past them they get a resync event and should refetch instead.
+    """
+    bus = get_event_bus()
+    keepalive = get_config()['EVENTS_KEEPALIVE_SECONDS']
+    after, missed = bus.resume(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+
+    def generate(after, missed):
+        yield 'retry: 3000\n\n'
+        while True:
+            if missed:
+                yield f"id: {bus.event_id(after)}\nevent: resync\ndata: {{}}\n\n"
+            events, missed = bus.wait(after, keepalive)
+            if not events and not missed:
+                # Comment line: keeps proxies from timing out an idle stream
+                yield ': keepalive\n\n'
+                continue
+            for seq, event_type, data in events:
+                yield f"id: {bus.event_id(seq)}\nevent: {event_type}\ndata: {data}\n\n"
+            after = events[-1][0] if events else after
+
+    return Response(generate(after, missed), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 if __name__ == '__main__':
+    # Development server with the reloader; use serve.py for production
     import sys
     port = 5000
     if len(sys.argv) > 1 and sys.argv[1].startswith('--port'):
@@ -160,4 +782,4 @@ if __name__ == '__main__':
             port = 5001
     else:
         port = int(os.environ.get('PORT', 5001))
-    app.run(debug=True, host='0.0.0.0', port=port)
+    create_app().run(debug=True, host='0.0.0.0', port=port)
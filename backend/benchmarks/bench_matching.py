@@ -0,0 +1,91 @@
+"""Benchmark indexed buyer-to-agent matching against the original nested-loop matcher.
+
+Generates synthetic agents and buyers spread across many metros and zips, then times
+both implementations and prints the results as JSON.
+
+Usage: python benchmarks/bench_matching.py [--agents 1000] [--buyers 10000] [--metros 50]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from scraper import match_buyers_to_agents, extract_zip_from_address  # noqa: E402
+
+def naive_location_match(buyer_location, agent_location):
+    return buyer_location.lower() in agent_location.lower() or agent_location.lower() in buyer_location.lower()
+
+def naive_match_buyers_to_agents(buyers, agents, location="Austin, TX"):
+    """The original O(agents x buyers) matcher, kept as the baseline"""
+    matches = []
+    for agent in agents:
+        agent_zip = extract_zip_from_address(agent['address']) or location
+        matched_buyers = [buyer for buyer in buyers if naive_location_match(buyer['location_interest'], agent_zip)]
+        if matched_buyers:
+            matches.append({'agent': agent, 'potential_buyers': matched_buyers, 'buyer_count': len(matched_buyers)})
+    matches.sort(key=lambda x: x['buyer_count'], reverse=True)
+    return matches
+
+def synthetic_metros(count):
+    return [(f"City{m}", 'TX', [f"{70000 + m * 20 + z:05d}" for z in range(20)]) for m in range(count)]
+
+def synthetic_agents(metros, count, rng):
+    agents = []
+    for i in range(count):
+        city, state, zips = rng.choice(metros)
+        agents.append({'name': f"Agent {i}", 'address': f"{i} Main St, {city}, {state} {rng.choice(zips)}"})
+    return agents
+
+def synthetic_buyers(metros, count, rng):
+    buyers = []
+    for i in range(count):
+        city, state, zips = rng.choice(metros)
+        # Buyers name a zip, a city, or a city in free text
+        location = rng.choice([rng.choice(zips), f"{city}, {state}", f"moving to {city} soon"])
+        buyers.append({'user_id': f"user{i}", 'location_interest': location})
+    return buyers
+
+def timed(fn, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--agents', type=int, default=1000)
+    parser.add_argument('--buyers', type=int, default=10000)
+    parser.add_argument('--metros', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    metros = synthetic_metros(args.metros)
+    agents = synthetic_agents(metros, args.agents, rng)
+    buyers = synthetic_buyers(metros, args.buyers, rng)
+
+    naive_seconds, naive_matches = timed(naive_match_buyers_to_agents, buyers, agents, repeat=args.repeat)
+    indexed_seconds, indexed_matches = timed(match_buyers_to_agents, buyers, agents, repeat=args.repeat)
+
+    print(json.dumps({
+        'benchmark': 'match_buyers_to_agents',
+        'agents': args.agents,
+        'buyers': args.buyers,
+        'metros': args.metros,
+        'naive_seconds': round(naive_seconds, 4),
+        'indexed_seconds': round(indexed_seconds, 4),
+        'speedup': round(naive_seconds / indexed_seconds, 1) if indexed_seconds else None,
+        'naive_pairs': sum(m['buyer_count'] for m in naive_matches),
+        'indexed_pairs': sum(m['buyer_count'] for m in indexed_matches),
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
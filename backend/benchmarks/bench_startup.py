@@ -0,0 +1,120 @@
+"""Startup time and memory of the API server (Linux only: reads /proc).
+
+Launches a server command against a scratch database, waits until GET / answers and
+reports the time that took plus RSS and PSS of every process in the server's tree, once
+idle and again after some warm-up traffic to /api/leads. PSS splits shared pages
+between the processes using them, so it is the fair per-worker cost under pre-fork.
+
+Usage: python benchmarks/bench_startup.py [--workers 4] [--threads 8] [--requests 200]
+           [--command "python serve.py"]
+"""
+import argparse
+import json
+import os
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.join(HERE, '..')
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def process_tree(root):
+    """root and all its descendants, parents first"""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    # The command name may contain spaces; the ppid comes right after it
+                    parents[int(entry)] = int(f.read().rpartition(')')[2].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+    tree = [root]
+    for pid in tree:
+        tree.extend(sorted(child for child, parent in parents.items() if parent == pid))
+    return tree
+
+def memory(pid):
+    """{'rss_mb', 'pss_mb'} of one process"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                values[f"{key.lower()}_mb"] = round(int(rest.split()[0]) / 1024, 1)
+    return values
+
+def snapshot(root):
+    processes = []
+    for pid in process_tree(root):
+        try:
+            processes.append({'pid': pid, **memory(pid)})
+        except OSError:
+            continue
+    return {
+        'processes': processes,
+        'total_rss_mb': round(sum(p['rss_mb'] for p in processes), 1),
+        'total_pss_mb': round(sum(p['pss_mb'] for p in processes), 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='warm-up requests before the second snapshot')
+    parser.add_argument('--command', default=f'"{sys.executable}" serve.py',
+                        help='server command, run from backend/ with WEB_PORT/PORT set')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='leadgen-startup-')
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=os.path.join(workdir, 'startup.db'), WEB_HOST='127.0.0.1',
+               WEB_PORT=str(port), PORT=str(port), WEB_WORKERS=str(args.workers), WEB_THREADS=str(args.threads),
+               SCRAPE_CACHE_PATH=os.path.join(workdir, 'scrape_cache.db'))
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    proc = subprocess.Popen(shlex.split(args.command), cwd=BACKEND, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                urllib.request.urlopen(base + '/', timeout=1).read()
+                break
+            except OSError:
+                if proc.poll() is not None:
+                    sys.exit(f"server exited with status {proc.returncode}")
+                time.sleep(0.01)
+        ready_seconds = time.perf_counter() - started
+        # Give the other workers a moment to finish forking
+        time.sleep(0.5)
+        idle = snapshot(proc.pid)
+        for _ in range(args.requests):
+            urllib.request.urlopen(base + '/api/leads?limit=100', timeout=10).read()
+        warm = snapshot(proc.pid)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    print(json.dumps({
+        'command': args.command,
+        'workers': args.workers,
+        'threads': args.threads,
+        'ready_seconds': round(ready_seconds, 3),
+        'idle': idle,
+        'after_requests': warm,
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
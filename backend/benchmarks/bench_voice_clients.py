@@ -0,0 +1,130 @@
+"""Benchmark per-call overhead of the voice vendor clients against a local stub server.
+
+Compares the old pattern (a bare requests.post / a new twilio Client for every call) with
+the pooled keep-alive clients from voice.ClientRegistry, and prints the results as JSON.
+The stub speaks plain HTTP on localhost, so the savings shown are connection setup only;
+against the real vendors each avoided connection is also an avoided TLS handshake.
+
+Usage: python benchmarks/bench_voice_clients.py [--calls 500] [--threads 8]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers ElevenLabs generate and Twilio calls.create requests with canned JSON"""
+    protocol_version = 'HTTP/1.1'
+    connections = 0
+    _lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        # Like real servers: without this, Nagle plus delayed ACKs stalls keep-alive responses
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with StubHandler._lock:
+            StubHandler.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if '/Calls.json' in self.path:
+            status, body = 201, {'sid': 'CA' + '0' * 32, 'status': 'queued'}
+        else:
+            status, body = 200, {'audio_url': 'http://127.0.0.1/audio.mp3'}
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+def start_stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def run(fn, calls, threads):
+    StubHandler.connections = 0
+    latencies = []
+    lock = threading.Lock()
+
+    def one(_):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(calls)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'calls': calls,
+        'wall_seconds': round(wall, 3),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3),
+        'connections_opened': StubHandler.connections,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    server, base = start_stub()
+    os.environ.update({
+        'ELEVENLABS_API_BASE': base,
+        'TWILIO_API_BASE': base,
+        'TWILIO_ACCOUNT_SID': 'AC' + '0' * 32,
+        'TWILIO_AUTH_TOKEN': 'token',
+    })
+    import config
+    config.CONFIG_PATH = os.path.join(tempfile.mkdtemp(), 'config.json')
+    import requests
+    from twilio.rest import Client
+    import voice
+
+    settings = config.get_config()
+    tts_url = f"{base}/agents/{settings['ELEVENLABS_AGENT_ID']}/generate"
+    call_args = {'to': '+15125550100', 'from_': '+15125550199', 'url': 'http://127.0.0.1/audio.mp3'}
+
+    def fresh_tts():
+        requests.post(tts_url, json={'text': 'hello'}).json()
+
+    def pooled_tts():
+        voice.http_session().post(tts_url, json={'text': 'hello'}, timeout=voice.http_timeout(settings)).json()
+
+    def fresh_twilio():
+        client = Client(settings['TWILIO_ACCOUNT_SID'], settings['TWILIO_AUTH_TOKEN'])
+        client.api.base_url = base
+        client.calls.create(**call_args)
+
+    def pooled_twilio():
+        voice.twilio_client().calls.create(**call_args)
+
+    results = {}
+    for name, fn in [('tts_per_call_requests', fresh_tts), ('tts_pooled_session', pooled_tts),
+                     ('twilio_per_call_client', fresh_twilio), ('twilio_pooled_client', pooled_twilio)]:
+        fn()  # warm up imports and the pool
+        results[name] = run(fn, args.calls, args.threads)
+    server.shutdown()
+    print(json.dumps({'threads': args.threads, 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Stand-in for an OpenAI-compatible chat completions API, for exercising script generation offline.
+
+Answers POST /chat/completions with a canned opener built from the prompt, and reports
+how many completions it has served at GET /stats. Behaviour is tuned with:
+
+    FAKE_LLM_LATENCY   seconds to sleep per completion (default 0.2)
+    FAKE_LLM_FAIL_ON   substring of a prompt that should get a 500 instead
+
+Usage: python benchmarks/fake_llm_server.py [--port 8089]
+       LLM_API_BASE=http://127.0.0.1:8089 SCRIPT_MODE=llm python app.py
+"""
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY = float(os.getenv('FAKE_LLM_LATENCY', 0.2))
+FAIL_ON = os.getenv('FAKE_LLM_FAIL_ON', '')
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    completions = 0
+    in_flight = 0
+    max_in_flight = 0
+    _lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_GET(self):
+        with FakeLLMHandler._lock:
+            stats = {'completions': FakeLLMHandler.completions, 'max_in_flight': FakeLLMHandler.max_in_flight}
+        self._reply(200, stats)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        prompt = body.get('messages', [{}])[-1].get('content', '')
+        with FakeLLMHandler._lock:
+            FakeLLMHandler.in_flight += 1
+            FakeLLMHandler.max_in_flight = max(FakeLLMHandler.max_in_flight, FakeLLMHandler.in_flight)
+        try:
+            time.sleep(LATENCY)
+            if FAIL_ON and FAIL_ON in prompt:
+                self._reply(500, {'error': {'message': 'fake failure'}})
+                return
+            with FakeLLMHandler._lock:
+                FakeLLMHandler.completions += 1
+            content = f"Hi! Ava from Home IQ here. ({len(prompt)}-char prompt, id {abs(hash(prompt)) % 10000})"
+            self._reply(200, {
+                'object': 'chat.completion',
+                'model': body.get('model'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            })
+        finally:
+            with FakeLLMHandler._lock:
+                FakeLLMHandler.in_flight -= 1
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+def serve(port=0):
+    """Start the fake server on a background thread; returns (server, base_url)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeLLMHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8089)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), FakeLLMHandler)
+    server.daemon_threads = True
+    print(f"Fake LLM listening on http://127.0.0.1:{args.port}", flush=True)
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
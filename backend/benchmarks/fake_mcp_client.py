@@ -0,0 +1,83 @@
+"""Stand-in for `npx @brightdata/mcp-client`, for running one-shot scrapes offline.
+
+Accepts the same --config/--prompt arguments, prints a few log lines and then streams a
+pretty-printed JSON array the way the real client does. Agent prompts get agents, social
+prompts (Reddit, tweets, Facebook) get buyer posts. Behaviour is tuned with:
+
+    FAKE_MCP_LATENCY        seconds before the first record (default 0.2)
+    FAKE_MCP_STREAM_SECONDS seconds spent streaming the records (default 0.1)
+    FAKE_MCP_RECORDS        records per prompt (default 15)
+    FAKE_MCP_PAYLOAD_BYTES  extra filler bytes per record, to test large payloads (default 0)
+    FAKE_MCP_HANG_ON        substring of a prompt that should never finish
+
+Usage: MCP_SESSION_MODE=oneshot MCP_CLIENT_COMMAND="python benchmarks/fake_mcp_client.py" python app.py
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+LATENCY = float(os.getenv('FAKE_MCP_LATENCY', 0.2))
+STREAM_SECONDS = float(os.getenv('FAKE_MCP_STREAM_SECONDS', 0.1))
+RECORDS = int(os.getenv('FAKE_MCP_RECORDS', 15))
+PAYLOAD_BYTES = int(os.getenv('FAKE_MCP_PAYLOAD_BYTES', 0))
+HANG_ON = os.getenv('FAKE_MCP_HANG_ON', '')
+
+SOCIAL_RE = re.compile(r'reddit|tweets|facebook', re.IGNORECASE)
+LOCATION_RE = re.compile(r' in (.+?)(?: from | or |\. )')
+
+def fake_agent(location, rng):
+    zip_code = f"7{rng.randrange(8700, 8800):04d}"
+    number = rng.randrange(10 ** 7)
+    return {
+        'name': f"Fake Agent {number}",
+        'phone': f"512-{number // 10000 % 1000:03d}-{number % 10000:04d}",
+        'address': f"{rng.randrange(100, 9999)} Main St, {location} {zip_code}",
+        'website': f"https://agent{number}.example.com",
+    }
+
+def fake_buyer(location, rng):
+    return {
+        'platform': rng.choice(['Reddit', 'Twitter', 'Facebook']),
+        'user_id': f"user{rng.randrange(10 ** 7)}",
+        'content': f"Moving to {location} soon, need a realtor",
+        'location': rng.choice([location, f"7{rng.randrange(8700, 8800):04d}"]),
+        'requirements': '3BR/2BA single family home',
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config')
+    parser.add_argument('--prompt', default='')
+    args = parser.parse_args()
+
+    rng = random.Random()
+    match = LOCATION_RE.search(args.prompt)
+    location = match.group(1).strip(' ,') if match else 'Austin, TX'
+    make = fake_buyer if SOCIAL_RE.search(args.prompt) else fake_agent
+
+    print('[INFO] Connecting to Bright Data MCP server...', flush=True)
+    if HANG_ON and HANG_ON in args.prompt:
+        time.sleep(3600)
+    time.sleep(LATENCY)
+    print('[INFO] Tool call complete', flush=True)
+
+    out = sys.stdout
+    out.write('[\n')
+    for i in range(RECORDS):
+        record = make(location, rng)
+        if PAYLOAD_BYTES:
+            record['notes'] = 'x' * PAYLOAD_BYTES
+        text = json.dumps(record, indent=2)
+        out.write('  ' + text.replace('\n', '\n  ') + (',\n' if i < RECORDS - 1 else '\n'))
+        out.flush()
+        if STREAM_SECONDS:
+            time.sleep(STREAM_SECONDS / RECORDS)
+    out.write(']\n')
+    out.flush()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Stand-in for the Bright Data MCP server, for exercising the scraper offline.
+
+Speaks newline-delimited JSON-RPC over stdio like a real MCP server and exposes a
+single `prompt` tool that answers with synthetic agents. Behaviour is tuned with:
+
+    FAKE_MCP_LATENCY   seconds to sleep per tool call (default 0.05)
+    FAKE_MCP_RECORDS   records returned per call (default 15)
+    FAKE_MCP_HANG_ON   substring of a prompt that should never be answered
+
+Usage: MCP_SERVER_COMMAND="python benchmarks/fake_mcp_server.py" python app.py
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+LATENCY = float(os.getenv('FAKE_MCP_LATENCY', 0.05))
+RECORDS = int(os.getenv('FAKE_MCP_RECORDS', 15))
+HANG_ON = os.getenv('FAKE_MCP_HANG_ON', '')
+
+_write_lock = threading.Lock()
+
+def send(message):
+    with _write_lock:
+        sys.stdout.write(json.dumps(message) + '\n')
+        sys.stdout.flush()
+
+def fake_agents(prompt, count):
+    return [{
+        'name': f"Fake Agent {i+1}",
+        'phone': f"555-01{i % 100:02d}-{i // 100:04d}",
+        'address': f"{100+i} Main St, Austin, TX 787{i % 50:02d}",
+        'website': f"https://fake{i+1}.example.com",
+        'location': 'Austin, TX',
+    } for i in range(count)]
+
+def call_tool(request_id, arguments):
+    prompt = arguments.get('prompt', '')
+    if HANG_ON and HANG_ON in prompt:
+        return
+    time.sleep(LATENCY)
+    text = json.dumps({'agents': fake_agents(prompt, RECORDS)})
+    send({'jsonrpc': '2.0', 'id': request_id, 'result': {'content': [{'type': 'text', 'text': text}]}})
+
+def main():
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        message = json.loads(line)
+        method = message.get('method')
+        request_id = message.get('id')
+        if request_id is None:
+            continue  # notifications need no reply
+        if method == 'initialize':
+            send({'jsonrpc': '2.0', 'id': request_id, 'result': {
+                'protocolVersion': message['params'].get('protocolVersion'),
+                'capabilities': {'tools': {}},
+                'serverInfo': {'name': 'fake-brightdata', 'version': '0.0.1'},
+            }})
+        elif method == 'tools/list':
+            send({'jsonrpc': '2.0', 'id': request_id, 'result': {'tools': [
+                {'name': 'prompt', 'inputSchema': {'type': 'object', 'properties': {'prompt': {'type': 'string'}}}},
+            ]}})
+        elif method == 'ping':
+            send({'jsonrpc': '2.0', 'id': request_id, 'result': {}})
+        elif method == 'tools/call':
+            # Answer concurrently so multiplexed requests overlap like they would upstream
+            threading.Thread(target=call_tool, args=(request_id, message['params'].get('arguments', {})),
+                             daemon=True).start()
+        else:
+            send({'jsonrpc': '2.0', 'id': request_id, 'error': {'code': -32601, 'message': f"Unknown method {method}"}})
+
+if __name__ == '__main__':
+    main()
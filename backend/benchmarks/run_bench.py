@@ -0,0 +1,256 @@
+"""Offline end-to-end benchmarks: the API, scraping, calling and matching with every vendor stubbed.
+
+Starts the app in-process on a threaded server against a scratch database seeded by
+seed.py, with the one-shot MCP client (fake_mcp_client.py) or persistent MCP server
+(fake_mcp_server.py) standing in for Bright Data and voice_stubs.py for Twilio,
+ElevenLabs and the LLM. Each scenario is driven by a pool of client threads and reported
+as latency percentiles and throughput in JSON, so runs can be diffed. Load generator and
+server share one interpreter: compare runs with each other, not with production numbers.
+
+Scenarios:
+    leads_first_page  GET /api/leads?limit=100
+    leads_deep_page   GET /api/leads from a cursor half way through the table
+    leads_filtered    GET /api/leads?status=Interested&limit=100
+    leads_since       GET /api/leads?since=<recent version>
+    leads_patch       PATCH /api/leads/<id> status changes
+    scrape            POST /api/scrape (force_refresh) and poll the job to completion
+    scrape_metros     POST /api/scrape with --metros locations, sharded across the scrape process pool
+    call              POST /api/call through Twilio/ElevenLabs stubs
+    match             match_buyers_to_agents in-process on synthetic agents and buyers
+
+Usage: python benchmarks/run_bench.py [--leads 10000] [--requests 500] [--concurrency 8]
+           [--scenarios leads_first_page,match] [--mcp-mode oneshot|persistent] [--out results.json]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+
+SCENARIOS = ['leads_first_page', 'leads_deep_page', 'leads_filtered', 'leads_since', 'leads_patch',
+             'scrape', 'scrape_metros', 'call', 'match']
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def measure(fn, count, concurrency):
+    """Call fn(i) count times across concurrency threads; latency percentiles in ms and throughput"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            fn(i)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(count)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'requests': count,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'concurrency': concurrency,
+        'wall_seconds': round(wall, 3),
+        'throughput_per_second': round(len(latencies) / wall, 2) if wall else None,
+        'mean_ms': round(statistics.mean(latencies), 3) if latencies else None,
+        'p50_ms': round(percentile(latencies, 50), 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 3) if latencies else None,
+        'max_ms': round(latencies[-1], 3) if latencies else None,
+    }
+
+def configure_environment(workdir, args, stub_base):
+    """Point every setting at scratch files and local stand-ins; must run before the app is imported"""
+    python = sys.executable
+    os.environ.update({
+        'DATABASE_URL': args.db or os.path.join(workdir, 'bench.db'),
+        'SCRAPE_CACHE_PATH': os.path.join(workdir, 'scrape_cache.db'),
+        'TTS_CACHE_PATH': os.path.join(workdir, 'tts_cache.db'),
+        'SCRIPT_CACHE_PATH': os.path.join(workdir, 'script_cache.db'),
+        'BRIGHTDATA_API_TOKEN': 'bench-token',
+        'MCP_SESSION_MODE': args.mcp_mode,
+        'MCP_CLIENT_COMMAND': f'"{python}" "{os.path.join(HERE, "fake_mcp_client.py")}"',
+        'MCP_SERVER_COMMAND': f'"{python}" "{os.path.join(HERE, "fake_mcp_server.py")}"',
+        'TWILIO_ACCOUNT_SID': 'AC' + '0' * 32,
+        'TWILIO_AUTH_TOKEN': 'bench-token',
+        'TWILIO_PHONE_NUMBER': '+15125550199',
+        'TWILIO_API_BASE': stub_base,
+        'ELEVENLABS_API_KEY': 'bench-key',
+        'ELEVENLABS_API_BASE': stub_base,
+        'LLM_API_KEY': 'bench-key',
+        'LLM_API_BASE': stub_base,
+    })
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--leads', type=int, default=10000, help='leads to seed (10k to 1M)')
+    parser.add_argument('--db', help='reuse this database instead of a scratch one (seeded only if short of --leads)')
+    parser.add_argument('--requests', type=int, default=500, help='requests per HTTP scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--scrapes', type=int, default=10, help='scrape jobs to run')
+    parser.add_argument('--metros', type=int, default=20, help='locations per scrape_metros request')
+    parser.add_argument('--calls', type=int, default=100, help='calls to place')
+    parser.add_argument('--match-agents', type=int, default=1000)
+    parser.add_argument('--match-buyers', type=int, default=10000)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--mcp-mode', choices=['oneshot', 'persistent'], default='oneshot')
+    parser.add_argument('--out', help='also write the JSON report here')
+    args = parser.parse_args()
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    import voice_stubs
+    stub_server, stub_base = voice_stubs.serve()
+    workdir = tempfile.mkdtemp(prefix='leadgen-bench-')
+    configure_environment(workdir, args, stub_base)
+
+    import config
+    config.CONFIG_PATH = os.path.join(workdir, 'config.json')
+    import requests
+    from werkzeug.serving import make_server
+    import seed
+    from app import create_app, encode_cursor
+    from models import get_db, init_db, lead_version
+    from scraper import match_buyers_to_agents
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    init_db()
+    with get_db() as conn:
+        existing = conn.execute('SELECT COUNT(*) FROM leads').fetchone()[0]
+    seeding = seed.seed_leads(args.leads - existing) if existing < args.leads else {'leads_inserted': 0}
+    with get_db() as conn:
+        total, max_id = conn.execute('SELECT COUNT(*), MAX(id) FROM leads').fetchone()
+
+    server = make_server('127.0.0.1', 0, create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}/api"
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return local.session
+
+    def get(path, **params):
+        r = session().get(base + path, params=params, timeout=60)
+        r.raise_for_status()
+        return r
+
+    rng = random.Random(0)
+    lead_ids = [rng.randrange(1, max_id + 1) for _ in range(max(args.requests, args.calls))]
+    results = {}
+
+    def run(name, fn, count, concurrency=args.concurrency):
+        if name in scenarios:
+            print(f"running {name}...", file=sys.stderr, flush=True)
+            results[name] = measure(fn, count, concurrency)
+
+    run('leads_first_page', lambda i: get('/leads', limit=100), args.requests)
+    middle = encode_cursor([max_id // 2])
+    run('leads_deep_page', lambda i: get('/leads', limit=100, cursor=middle), args.requests)
+    run('leads_filtered', lambda i: get('/leads', status='Interested', limit=100), args.requests)
+
+    def patch(i):
+        status = ['Interested', 'Declined', 'Completed'][i % 3]
+        r = session().patch(f"{base}/leads/{lead_ids[i]}", json={'status': status}, timeout=60)
+        r.raise_for_status()
+
+    run('leads_patch', patch, args.requests)
+    with get_db() as conn:
+        recent = max(lead_version(conn) - 100, 0)
+    run('leads_since', lambda i: get('/leads', since=recent, limit=1000), args.requests)
+
+    metros = seed.synthetic_metros(50)
+
+    def scrape_job(body):
+        r = session().post(f"{base}/scrape", json={'limit': 30, 'force_refresh': True, **body}, timeout=60)
+        r.raise_for_status()
+        job = r.json()
+        while job['state'] in ('queued', 'running'):
+            time.sleep(0.05)
+            job = get(f"/scrape/{job['job_id']}").json()
+        if job['state'] != 'succeeded':
+            raise RuntimeError(f"scrape job {job['state']}: {job.get('error')}")
+
+    def scrape(i):
+        city, state, _ = metros[i % len(metros)]
+        scrape_job({'location': f"{city}, {state}"})
+
+    run('scrape', scrape, args.scrapes, min(args.concurrency, 4))
+    metro_names = [f"{city}, {state}" for city, state, _ in seed.synthetic_metros(args.metros)]
+    run('scrape_metros', lambda i: scrape_job({'locations': metro_names}), 3, 1)
+
+    def call(i):
+        r = session().post(f"{base}/call", json={'lead_id': lead_ids[i]}, timeout=60)
+        r.raise_for_status()
+
+    run('call', call, args.calls)
+
+    if 'match' in scenarios:
+        match_rng = random.Random(1)
+        agents = list(seed.synthetic_agents(args.match_agents, metros, match_rng))
+        buyers = seed.synthetic_buyers(args.match_buyers, metros, match_rng)
+        run('match', lambda i: match_buyers_to_agents(buyers, agents), 5, 1)
+
+    server.shutdown()
+    stub_server.shutdown()
+    report = {
+        'meta': {
+            'git_revision': git_revision(),
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'leads': total,
+            'seeding': seeding,
+            'mcp_mode': args.mcp_mode,
+            'match_agents': args.match_agents,
+            'match_buyers': args.match_buyers,
+            'metros': args.metros,
+        },
+        'scenarios': results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Synthetic data for benchmarks, built from the scraper's dummy agent and buyer generators.
+
+Seeds the leads table (through the normal upsert path, so triggers and indexes are
+exercised) with anywhere from a few thousand to a million agents spread across many
+metros and zips, optionally with call logs, and builds matching buyer lists in memory.
+
+Usage: DATABASE_URL=/tmp/bench.db python benchmarks/seed.py --leads 100000 [--call-logs 20000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from scraper import generate_dummy_agents, generate_dummy_buyers  # noqa: E402
+
+CITIES = ['Austin', 'Dallas', 'Houston', 'San Antonio', 'Fort Worth', 'El Paso', 'Plano', 'Frisco', 'Round Rock',
+          'Georgetown', 'Waco', 'Lubbock', 'Amarillo', 'Laredo', 'Irving', 'Garland', 'McKinney', 'Killeen',
+          'Denton', 'Midland', 'Odessa', 'Tyler', 'Abilene', 'Beaumont', 'Pflugerville', 'Cedar Park']
+STATUSES = ['Not Called'] * 6 + ['Calling', 'Completed', 'Interested', 'Declined']
+CALL_STATUSES = ['completed', 'no-answer', 'busy', 'failed']
+TRANSCRIPT_LINES = [
+    "Thanks for calling, but I'm not interested right now.",
+    "We already work with Zillow Premier Agent for leads.",
+    "Sure, send the buyer list over to my email.",
+    "Call me back next week, I'm showing a house.",
+    "How did you get this number?",
+    "I'd love to hear more about the buyers in {zip}.",
+]
+
+def synthetic_metros(count, seed=0):
+    """[(city, state, [zips])] for count metros, twenty zips each"""
+    rng = random.Random(seed)
+    return [(f"{CITIES[m % len(CITIES)]}{'' if m < len(CITIES) else m // len(CITIES)}", 'TX',
+             sorted(rng.sample(range(75000, 79999), 20))) for m in range(count)]
+
+def synthetic_agents(count, metros, rng, start=0):
+    """Yield count agents shaped like generate_dummy_agents output, with unique phones and real zips"""
+    produced = 0
+    while produced < count:
+        city, state, zips = rng.choice(metros)
+        batch = min(count - produced, 500)
+        for agent in generate_dummy_agents(f"{city}, {state}", batch):
+            n = start + produced
+            agent['name'] = f"Agent {n} {agent['name'].split()[-1]}"
+            agent['phone'] = f"+1{200 + n // 10 ** 7:03d}{n % 10 ** 7:07d}"
+            agent['address'] = f"{agent['address']} {rng.choice(zips):05d}"
+            agent['buyer_count'] = rng.randrange(0, 40)
+            agent['status'] = rng.choice(STATUSES)
+            produced += 1
+            yield agent
+
+def synthetic_buyers(count, metros, rng):
+    """Buyers shaped like generate_dummy_buyers output, naming a zip, a city or a city in free text"""
+    buyers = []
+    while len(buyers) < count:
+        city, state, zips = rng.choice(metros)
+        for buyer in generate_dummy_buyers(f"{city}, {state}", min(count - len(buyers), 50)):
+            buyer['location_interest'] = rng.choice([f"{rng.choice(zips):05d}", f"{city}, {state}",
+                                                     f"moving to {city} soon"])
+            buyers.append(buyer)
+    return buyers
+
+def seed_leads(count, metros=50, call_logs=0, seed=0, chunk_size=5000):
+    """Insert count synthetic leads (and call_logs call logs); returns timing details"""
+    from models import get_db, init_db, upsert_leads
+    init_db()
+    rng = random.Random(seed)
+    metro_list = synthetic_metros(metros, seed)
+    with get_db() as conn:
+        start_n = conn.execute('SELECT COUNT(*) FROM leads').fetchone()[0]
+    started = time.perf_counter()
+    inserted, updated = upsert_leads(synthetic_agents(count, metro_list, rng, start=start_n), chunk_size)
+    leads_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if call_logs:
+        with get_db() as conn:
+            max_id = conn.execute('SELECT MAX(id) FROM leads').fetchone()[0]
+            rows = []
+            for _ in range(call_logs):
+                lines = rng.sample(TRANSCRIPT_LINES, 3)
+                transcript = ' '.join(lines).format(zip=f"{rng.choice(rng.choice(metro_list)[2]):05d}")
+                rows.append((rng.randrange(1, max_id + 1), rng.choice(CALL_STATUSES), transcript))
+                if len(rows) >= chunk_size:
+                    conn.executemany('INSERT INTO call_logs (lead_id, call_status, transcript) VALUES (?, ?, ?)', rows)
+                    conn.commit()
+                    rows = []
+            if rows:
+                conn.executemany('INSERT INTO call_logs (lead_id, call_status, transcript) VALUES (?, ?, ?)', rows)
+                conn.commit()
+    logs_seconds = time.perf_counter() - started
+    return {
+        'leads_inserted': len(inserted),
+        'leads_updated': len(updated),
+        'leads_seconds': round(leads_seconds, 3),
+        'leads_per_second': round(len(inserted) / leads_seconds, 1) if leads_seconds else None,
+        'call_logs_inserted': call_logs,
+        'call_logs_seconds': round(logs_seconds, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--leads', type=int, default=10000)
+    parser.add_argument('--call-logs', type=int, default=0)
+    parser.add_argument('--metros', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if 'DATABASE_URL' not in os.environ:
+        parser.error('set DATABASE_URL so the seed does not land in the working leads.db')
+    print(json.dumps(seed_leads(args.leads, args.metros, args.call_logs, args.seed), indent=2))
+
+if __name__ == '__main__':
+    main()
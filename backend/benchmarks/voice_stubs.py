@@ -0,0 +1,74 @@
+"""Local stand-ins for the whole voice stack: Twilio, ElevenLabs and the LLM on one port.
+
+Point TWILIO_API_BASE, ELEVENLABS_API_BASE and LLM_API_BASE at the printed URL and calls
+go through the real client code without leaving the machine. Behaviour is tuned with:
+
+    FAKE_TWILIO_LATENCY      seconds per calls.create (default 0.05)
+    FAKE_ELEVENLABS_LATENCY  seconds per TTS render (default 0.3)
+    FAKE_LLM_LATENCY         seconds per chat completion (default 0.2, see fake_llm_server)
+
+GET /stats reports how many requests each vendor has served.
+
+Usage: python benchmarks/voice_stubs.py [--port 8090]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_llm_server import FakeLLMHandler  # noqa: E402
+
+TWILIO_LATENCY = float(os.getenv('FAKE_TWILIO_LATENCY', 0.05))
+ELEVENLABS_LATENCY = float(os.getenv('FAKE_ELEVENLABS_LATENCY', 0.3))
+
+class VoiceStubHandler(FakeLLMHandler):
+    counts = {'twilio': 0, 'elevenlabs': 0}
+    _counts_lock = threading.Lock()
+
+    def do_GET(self):
+        with FakeLLMHandler._lock:
+            llm = FakeLLMHandler.completions
+        with VoiceStubHandler._counts_lock:
+            self._reply(200, {**VoiceStubHandler.counts, 'llm': llm})
+
+    def do_POST(self):
+        if self.path.rstrip('/').endswith('/chat/completions'):
+            return super().do_POST()
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if '/Calls.json' in self.path:
+            vendor, latency = 'twilio', TWILIO_LATENCY
+            status, body = 201, {'sid': f"CA{time.time_ns():032x}"[:34], 'status': 'queued'}
+        elif self.path.rstrip('/').endswith('/generate'):
+            vendor, latency = 'elevenlabs', ELEVENLABS_LATENCY
+            status, body = 200, {'audio_url': f"http://127.0.0.1/audio/{time.time_ns()}.mp3"}
+        else:
+            self._reply(404, {'error': f"No stub for {self.path}"})
+            return
+        time.sleep(latency)
+        with VoiceStubHandler._counts_lock:
+            VoiceStubHandler.counts[vendor] += 1
+        self._reply(status, body)
+
+def serve(port=0):
+    """Start the stubs on a background thread; returns (server, base_url)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), VoiceStubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8090)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), VoiceStubHandler)
+    server.daemon_threads = True
+    print(json.dumps({'base_url': f"http://127.0.0.1:{args.port}"}), flush=True)
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
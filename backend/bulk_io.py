@@ -0,0 +1,210 @@
+"""Streaming export and chunked import of leads and call logs as CSV or NDJSON.
+
+Exports step one SQLite cursor and encode a batch of rows at a time, so memory stays
+flat however big the table is. Imports read their input a record at a time and commit
+every chunk; bad rows are counted and reported rather than failing the import.
+"""
+import csv
+import gzip
+import io
+import json
+import zlib
+from models import BULK_CHUNK_SIZE, get_db, open_db, upsert_lead_batches
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+EXPORT_BATCH_ROWS = 1000
+# Only the first few rejected rows are kept in a report; the rest are just counted
+MAX_REPORTED_REJECTS = 100
+IMPORT_LEAD_FIELDS = ['name', 'phone', 'category', 'address', 'website', 'status', 'buyer_count']
+CALL_LOG_EXPORT_FIELDS = ['id', 'lead_id', 'call_status', 'transcript', 'created_at']
+
+# Transcripts can be far longer than the csv module's default 128KB field limit
+csv.field_size_limit(64 * 1024 * 1024)
+
+def export_rows(sql, values, columns, fmt):
+    """Yield a query's rows as CSV or NDJSON text, a batch of rows per chunk.
+
+    Runs on a connection of its own, closed when the download ends or is abandoned, so a
+    slow client doesn't keep a pooled connection (or its read snapshot) from other requests.
+    """
+    conn = open_db()
+    try:
+        cursor = conn.execute(sql, values)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == 'csv':
+            writer.writerow(columns)
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_ROWS)
+            if not rows:
+                break
+            if fmt == 'csv':
+                writer.writerows(rows)
+            else:
+                for row in rows:
+                    buffer.write(json.dumps(dict(zip(columns, row))))
+                    buffer.write('\n')
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        # A header with no rows under it
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        conn.close()
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a stream of text chunks on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+class ImportReport:
+    """Row counts for an import, plus the first MAX_REPORTED_REJECTS rejected rows"""
+
+    def __init__(self, on_reject=None):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.rejected = 0
+        self.rejects = []
+        self.on_reject = on_reject
+
+    def reject(self, row, error):
+        self.rejected += 1
+        reject = {'row': row, 'error': error}
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append(reject)
+        if self.on_reject:
+            self.on_reject(reject)
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'rejected': self.rejected,
+            'rejects': self.rejects,
+            'rejects_truncated': self.rejected > len(self.rejects),
+        }
+
+def text_stream(binary, gzipped=False):
+    """Decode a binary stream (optionally gzipped) as UTF-8 text, tolerating a BOM"""
+    if gzipped:
+        binary = gzip.GzipFile(fileobj=binary, mode='rb')
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+def format_for_path(path):
+    """'csv' or 'ndjson' from a file name like leads.csv or logs.ndjson.gz, else None"""
+    name = path.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return None
+
+def read_records(stream, fmt, report):
+    """Yield (row number, record dict) from a CSV (with header) or NDJSON text stream.
+
+    Every row read, parseable or not, counts towards report.rows.
+    """
+    def reject(row, error):
+        report.rows += 1
+        report.reject(row, error)
+
+    records = iter_ndjson(stream, reject) if fmt == 'ndjson' else iter_csv(stream, reject)
+    for record in records:
+        report.rows += 1
+        yield record
+
+def iter_csv(stream, reject):
+    """Yield (line number, record) from a CSV stream whose first row names the columns"""
+    reader = csv.DictReader(stream)
+    while True:
+        try:
+            record = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            reject(reader.line_num, f"Invalid CSV: {e}")
+            continue
+        yield reader.line_num, record
+
+def iter_ndjson(stream, reject):
+    """Yield (line number, record) from an NDJSON stream without buffering the body"""
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError:
+            reject(line_no, 'Invalid JSON')
+
+def valid_leads(records, reject):
+    """Yield leads that have the fields ingestion needs, recording the rest as rejected"""
+    for row_no, lead in records:
+        if not isinstance(lead, dict) or not lead.get('name') or not lead.get('phone'):
+            reject(row_no, 'name and phone are required')
+            continue
+        # Blank CSV cells mean "use the default", and exported columns like id are ignored
+        lead = {k: lead[k] for k in IMPORT_LEAD_FIELDS if lead.get(k) not in (None, '')}
+        if 'buyer_count' in lead:
+            try:
+                lead['buyer_count'] = int(lead['buyer_count'])
+            except (TypeError, ValueError):
+                reject(row_no, 'buyer_count must be an integer')
+                continue
+        yield lead
+
+def import_leads(records, report, chunk_size=BULK_CHUNK_SIZE):
+    """Upsert leads from (row number, record) pairs, one transaction per chunk"""
+    for inserted, updated in upsert_lead_batches(valid_leads(records, report.reject), chunk_size):
+        report.inserted += len(inserted)
+        report.updated += len(updated)
+    return report
+
+def import_call_logs(records, report, chunk_size=BULK_CHUNK_SIZE):
+    """Insert call logs from (row number, record) pairs, one transaction per chunk.
+
+    Each record needs lead_id and call_status; transcript and created_at are optional.
+    """
+    chunk = []
+    for row_no, record in records:
+        if not isinstance(record, dict) or not record.get('call_status'):
+            report.reject(row_no, 'lead_id and call_status are required')
+            continue
+        try:
+            lead_id = int(record.get('lead_id'))
+        except (TypeError, ValueError):
+            report.reject(row_no, 'lead_id must be an integer')
+            continue
+        chunk.append((row_no, lead_id, record['call_status'], record.get('transcript') or '',
+                      record.get('created_at') or None))
+        if len(chunk) >= chunk_size:
+            _insert_call_logs(chunk, report)
+            chunk = []
+    if chunk:
+        _insert_call_logs(chunk, report)
+    return report
+
+def _insert_call_logs(chunk, report):
+    lead_ids = list({row[1] for row in chunk})
+    with get_db() as conn:
+        known = {row['id'] for row in conn.execute(
+            f"SELECT id FROM leads WHERE id IN ({', '.join('?' for _ in lead_ids)})", lead_ids)}
+        rows = []
+        for row_no, lead_id, call_status, transcript, created_at in chunk:
+            if lead_id in known:
+                rows.append((lead_id, call_status, transcript, created_at))
+            else:
+                report.reject(row_no, f"Unknown lead_id {lead_id}")
+        conn.executemany('''INSERT INTO call_logs (lead_id, call_status, transcript, created_at)
+                            VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))''', rows)
+        conn.commit()
+    report.inserted += len(rows)
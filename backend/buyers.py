@@ -0,0 +1,216 @@
+"""Mined buyer signals kept in the database, and lead buyer counts kept current from them.
+
+Every scrape appends the buyers it mined (or refreshes when they were last seen) and
+indexes them by location token. A lead's buyer_count is the number of stored buyers
+that match its place, its zip (or a zip within MATCH_RADIUS_MILES) or every word of its
+city, the same rule scrape-time matching uses. Leads sharing a (zip, city) place share a
+count, so a recount is one indexed query per place. Only places that gained buyers, or
+whose buyers fell out of the BUYER_WINDOW_DAYS recency window, are recounted. Leads whose
+address names neither a zip nor a city, or whose place no stored buyer has ever matched,
+keep the count they were scraped, added or imported with.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from config import get_config
+from events import publish
+from matching import get_zip_centroids, tokenize
+from models import BULK_CHUNK_SIZE, get_db
+
+logger = logging.getLogger(__name__)
+
+BUYER_FIELDS = ['platform', 'user_id', 'post_content', 'location_interest', 'requirements', 'budget']
+
+def window_cutoff(now=None):
+    """Oldest seen_at still counted, or 0 when there is no recency window"""
+    days = get_config()['BUYER_WINDOW_DAYS']
+    if not days or days <= 0:
+        return 0
+    return (now or time.time()) - days * 86400
+
+def signal_key(buyer):
+    """Identity of a mined post, so the same signal mined again isn't counted twice"""
+    parts = [str(buyer.get(field) or '') for field in ('platform', 'user_id', 'post_content', 'location_interest')]
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+def store_buyers(conn, buyers, cutoff, now=None):
+    """Append new buyers and refresh re-mined ones; returns the token sets of buyers that now count and didn't before"""
+    now = now or time.time()
+    by_key = {signal_key(buyer): buyer for buyer in buyers}
+    keys = list(by_key)
+    existing = {}
+    for start in range(0, len(keys), BULK_CHUNK_SIZE):
+        chunk = keys[start:start + BULK_CHUNK_SIZE]
+        for row in conn.execute(f"SELECT id, signal_key, seen_at FROM buyers WHERE signal_key IN ({', '.join('?' for _ in chunk)})",
+                                chunk):
+            existing[row['signal_key']] = row
+    gained = []
+    for key, buyer in by_key.items():
+        tokens = tokenize(buyer.get('location_interest'))
+        values = [buyer.get(field) for field in BUYER_FIELDS] + [buyer.get('timestamp')]
+        row = existing.get(key)
+        if row is None:
+            buyer_id = conn.execute(f'''INSERT INTO buyers (signal_key, {', '.join(BUYER_FIELDS)}, posted_at, first_seen, seen_at)
+                                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', [key] + values + [now, now]).lastrowid
+        else:
+            buyer_id = row['id']
+            conn.execute(f'''UPDATE buyers SET {', '.join(f"{field} = ?" for field in BUYER_FIELDS)}, posted_at = ?, seen_at = ?
+                             WHERE id = ?''', values + [now, buyer_id])
+            conn.executemany('DELETE FROM buyer_places WHERE token = ? AND seen_at = ? AND buyer_id = ?',
+                             [(token, row['seen_at'], buyer_id) for token in tokens])
+        conn.executemany('INSERT OR IGNORE INTO buyer_places (token, seen_at, buyer_id) VALUES (?, ?, ?)',
+                         [(token, now, buyer_id) for token in tokens])
+        if row is None or row['seen_at'] < cutoff:
+            gained.append(tokens)
+    return gained
+
+def affected_places(conn, token_sets):
+    """(zip, city) places of leads that any of these buyers' location tokens would match"""
+    config = get_config()
+    centroids = get_zip_centroids(config['ZIP_CENTROIDS_PATH'])
+    radius = config['MATCH_RADIUS_MILES']
+    tokens = set().union(*token_sets) if token_sets else set()
+    zips = set()
+    for token in tokens:
+        if len(token) == 5 and token.isdigit():
+            # Radius matching is symmetric: the leads near a buyer's zip are the ones whose radius reaches it
+            zips.update(centroids.within(token, radius) if centroids and radius else (token,))
+    # A city matches a buyer who mentions all of its words; look cities up by their first word
+    cities = set()
+    for token in tokens:
+        for row in conn.execute('SELECT DISTINCT city FROM leads WHERE city = ? OR (city > ? AND city < ?)',
+                                (token, token + ' ', token + '!')):
+            words = set(row['city'].split())
+            if any(words <= token_set for token_set in token_sets):
+                cities.add(row['city'])
+    places = set()
+    for column, values in (('zip', list(zips)), ('city', list(cities))):
+        for start in range(0, len(values), BULK_CHUNK_SIZE):
+            chunk = values[start:start + BULK_CHUNK_SIZE]
+            places.update(tuple(row) for row in conn.execute(
+                f"SELECT DISTINCT zip, city FROM leads WHERE {column} IN ({', '.join('?' for _ in chunk)})", chunk))
+    return places
+
+def lead_places(conn, lead_ids):
+    """(zip, city) places of the given leads"""
+    lead_ids = list(lead_ids)
+    places = set()
+    for start in range(0, len(lead_ids), BULK_CHUNK_SIZE):
+        chunk = lead_ids[start:start + BULK_CHUNK_SIZE]
+        places.update(tuple(row) for row in conn.execute(
+            f"SELECT DISTINCT zip, city FROM leads WHERE id IN ({', '.join('?' for _ in chunk)})", chunk))
+    return places
+
+def count_buyers(conn, zip_code, city, cutoff):
+    """Stored buyers seen since cutoff that match a lead at (zip_code, city), or None if none ever has"""
+    config = get_config()
+    centroids = get_zip_centroids(config['ZIP_CENTROIDS_PATH'])
+    radius = config['MATCH_RADIUS_MILES']
+    selects = []
+    values = []
+    if zip_code:
+        zips = centroids.within(zip_code, radius) if centroids and radius else (zip_code,)
+        selects.append(f"SELECT buyer_id, seen_at FROM buyer_places WHERE token IN ({', '.join('?' for _ in zips)})")
+        values += list(zips)
+    words = sorted(set(city.split())) if city else []
+    if words:
+        selects.append(f'''SELECT buyer_id, MAX(seen_at) AS seen_at FROM buyer_places WHERE token IN ({', '.join('?' for _ in words)})
+                           GROUP BY buyer_id HAVING COUNT(*) = ?''')
+        values += words + [len(words)]
+    if not selects:
+        return None
+    # A place no stored buyer has ever matched has nothing to recount from (dummy scrapes, added or
+    # imported leads), so its count stays as given; one whose buyers all aged out really is 0
+    ever, recent = conn.execute(f'''SELECT COUNT(DISTINCT buyer_id), COUNT(DISTINCT CASE WHEN seen_at >= ? THEN buyer_id END)
+                                   FROM ({' UNION ALL '.join(selects)})''',
+                                [cutoff] + values).fetchone()
+    return recent if ever else None
+
+def recount_places(conn, places, cutoff):
+    """Set buyer_count for every lead at these places; returns how many leads changed.
+
+    Commits every BULK_CHUNK_SIZE places so a big recount doesn't hold the write lock throughout.
+    """
+    changed = 0
+    for n, (zip_code, city) in enumerate(places, start=1):
+        count = count_buyers(conn, zip_code, city, cutoff)
+        if count is None:
+            continue
+        changed += conn.execute('UPDATE leads SET buyer_count = ? WHERE zip IS ? AND city IS ? AND buyer_count IS NOT ?',
+                                (count, zip_code, city, count)).rowcount
+        if n % BULK_CHUNK_SIZE == 0:
+            conn.commit()
+    conn.commit()
+    return changed
+
+def aged_out_places(conn, cutoff):
+    """Places whose buyers crossed the recency window since the last recount, moving the stored cutoff to cutoff"""
+    previous = conn.execute('SELECT cutoff FROM buyer_window WHERE id = 1').fetchone()[0]
+    if previous == cutoff:
+        return set()
+    # A window that grew (or was switched off) brings buyers back, so recount either way
+    low, high = min(previous, cutoff), max(previous, cutoff)
+    token_sets = [tokenize(row['location_interest']) for row in conn.execute(
+        'SELECT location_interest FROM buyers WHERE seen_at >= ? AND seen_at < ?', (low, high))]
+    conn.execute('UPDATE buyer_window SET cutoff = ? WHERE id = 1', (cutoff,))
+    return affected_places(conn, token_sets)
+
+def record_buyers(buyers, lead_ids=()):
+    """Store freshly mined buyers and recount the leads they (or buyers aging out) affect, plus lead_ids.
+
+    Returns how many leads' buyer_count changed.
+    """
+    cutoff = window_cutoff()
+    with get_db() as conn:
+        gained = store_buyers(conn, buyers, cutoff)
+        places = affected_places(conn, gained) | lead_places(conn, lead_ids) | aged_out_places(conn, cutoff)
+        return recount_places(conn, places, cutoff)
+
+def refresh_buyer_counts(everything=False):
+    """Recount leads whose buyers aged out of the window, or every lead; returns how many changed"""
+    cutoff = window_cutoff()
+    with get_db() as conn:
+        if everything:
+            aged_out_places(conn, cutoff)
+            places = {tuple(row) for row in conn.execute('SELECT DISTINCT zip, city FROM leads')}
+        else:
+            places = aged_out_places(conn, cutoff)
+        return recount_places(conn, places, cutoff)
+
+_refresher_pid = None
+_refresher_lock = threading.Lock()
+
+def start_buyer_refresh():
+    """Recount leads whose buyers aged out every BUYER_REFRESH_SECONDS, on a background thread (one per process)"""
+    global _refresher_pid
+    with _refresher_lock:
+        if _refresher_pid == os.getpid():
+            return
+        _refresher_pid = os.getpid()
+    threading.Thread(target=_refresh_forever, name='buyer-refresh', daemon=True).start()
+
+def _refresh_forever():
+    while True:
+        try:
+            changed = refresh_buyer_counts()
+            if changed:
+                publish('leads_changed', {'buyer_counts': changed})
+        except Exception:
+            logger.exception('Refreshing buyer counts failed')
+        time.sleep(get_config()['BUYER_REFRESH_SECONDS'])
+
+def fresh_buyer_count(lead_id):
+    """Recount one lead against the stored buyers, saving and returning its current buyer_count"""
+    with get_db() as conn:
+        lead = conn.execute('SELECT zip, city, buyer_count FROM leads WHERE id = ?', (lead_id,)).fetchone()
+        if not lead:
+            return None
+        count = count_buyers(conn, lead['zip'], lead['city'], window_cutoff())
+        if count is None:
+            return lead['buyer_count']
+        if count != lead['buyer_count']:
+            conn.execute('UPDATE leads SET buyer_count = ? WHERE id = ?', (count, lead_id))
+            conn.commit()
+        return count
@@ -1,18 +1,119 @@
 import os
 import json
+import tempfile
+import threading
+import time
+from types import MappingProxyType
 
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'runtime_config.json')
 
+# How often a cached config re-checks the file for writes from other processes
+CONFIG_REVALIDATE_SECONDS = float(os.getenv('CONFIG_REVALIDATE_SECONDS', 1.0))
+
+# Vendor credentials and account choices, editable from the dashboard (saved to CONFIG_PATH)
 DEFAULT_CONFIG = {
     'TWILIO_ACCOUNT_SID': os.getenv('TWILIO_ACCOUNT_SID', ''),
     'TWILIO_AUTH_TOKEN': os.getenv('TWILIO_AUTH_TOKEN', ''),
     'TWILIO_PHONE_NUMBER': os.getenv('TWILIO_PHONE_NUMBER', ''),
     'ELEVENLABS_API_KEY': os.getenv('ELEVENLABS_API_KEY', ''),
     'ELEVENLABS_AGENT_ID': os.getenv('ELEVENLABS_AGENT_ID', 'h3dC4sQ9cPDtYItAe0Z8'),
+    'ELEVENLABS_VOICE_ID': os.getenv('ELEVENLABS_VOICE_ID', ''),
     'LLM_API_KEY': os.getenv('LLM_API_KEY', ''),
+    'LLM_MODEL': os.getenv('LLM_MODEL', 'gpt-4'),
     'BRIGHTDATA_API_TOKEN': os.getenv('BRIGHTDATA_API_TOKEN', ''),
     'BRIGHTDATA_WEB_UNLOCKER_ZONE': os.getenv('BRIGHTDATA_WEB_UNLOCKER_ZONE', 'mcp_unlocker'),
     'BRIGHTDATA_BROWSER_AUTH': os.getenv('BRIGHTDATA_BROWSER_AUTH', ''),
+    # 'template' uses the fixed pitch; 'llm' personalizes each distinct pitch with the LLM
+    'SCRIPT_MODE': os.getenv('SCRIPT_MODE', 'template'),
+}
+
+# Server settings: read from the environment only, so a saved dashboard config can't override them
+SERVER_SETTINGS = {
+    # Vendor endpoints (the credentials above are sent to them)
+    'TWILIO_API_BASE': os.getenv('TWILIO_API_BASE', 'https://api.twilio.com'),
+    'ELEVENLABS_API_BASE': os.getenv('ELEVENLABS_API_BASE', 'https://api.elevenlabs.io/v1'),
+    # Any OpenAI-compatible chat completions endpoint
+    'LLM_API_BASE': os.getenv('LLM_API_BASE', 'https://api.openai.com/v1'),
+    # SQLite connection tuning (applied when a pooled connection is opened)
+    'SQLITE_JOURNAL_MODE': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'SQLITE_SYNCHRONOUS': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'SQLITE_MMAP_SIZE': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'SQLITE_CACHE_SIZE_KB': int(os.getenv('SQLITE_CACHE_SIZE_KB', 64 * 1024)),
+    'SQLITE_BUSY_TIMEOUT_MS': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'SQLITE_STATEMENT_CACHE': int(os.getenv('SQLITE_STATEMENT_CACHE', 256)),
+    # Idle connections each process keeps open for reuse
+    'SQLITE_POOL_SIZE': int(os.getenv('SQLITE_POOL_SIZE', 16)),
+    # Background scrape jobs
+    'SCRAPE_WORKERS': int(os.getenv('SCRAPE_WORKERS', 2)),
+    'SCRAPE_MAX_PENDING': int(os.getenv('SCRAPE_MAX_PENDING', 20)),
+    # Processes multi-location scrapes are sharded across, and the total concurrent MCP runs
+    # every scrape (single or multi-location) may make, split between web workers
+    'SCRAPE_PROCESSES': int(os.getenv('SCRAPE_PROCESSES', 4)),
+    'SCRAPE_MCP_BUDGET': int(os.getenv('SCRAPE_MCP_BUDGET', 8)),
+    # Bright Data MCP: default and per-source timeouts
+    'MCP_TIMEOUT_SECONDS': float(os.getenv('MCP_TIMEOUT_SECONDS', 180)),
+    'MCP_SOURCE_TIMEOUTS': json.loads(os.getenv('MCP_SOURCE_TIMEOUTS', '{}')),
+    # 'oneshot' spawns the npx client per prompt. 'persistent' keeps one MCP server session alive and
+    # sends each prompt to its MCP_PROMPT_TOOL, so it only helps with a server that has such a tool:
+    # the stock Bright Data server (@brightdata/mcp) offers scraping tools like search_engine and
+    # scrape_as_markdown but no prompt tool, and is dropped in favour of one-shot on first use
+    'MCP_SESSION_MODE': os.getenv('MCP_SESSION_MODE', 'oneshot'),
+    'MCP_PROMPT_TOOL': os.getenv('MCP_PROMPT_TOOL', 'prompt'),
+    'MCP_MAX_RECORD_BYTES': int(os.getenv('MCP_MAX_RECORD_BYTES', 1024 * 1024)),
+    # Scrape result cache: default and per-source TTLs, memory LRU size and disk budget
+    'SCRAPE_CACHE_PATH': os.getenv('SCRAPE_CACHE_PATH', os.path.join(os.path.dirname(__file__), 'scrape_cache.db')),
+    'SCRAPE_CACHE_TTL_SECONDS': float(os.getenv('SCRAPE_CACHE_TTL_SECONDS', 3600)),
+    'SCRAPE_CACHE_TTLS': json.loads(os.getenv('SCRAPE_CACHE_TTLS', '{"realtor": 86400, "zillow": 86400, "social": 3600}')),
+    'SCRAPE_CACHE_MEMORY_ENTRIES': int(os.getenv('SCRAPE_CACHE_MEMORY_ENTRIES', 256)),
+    'SCRAPE_CACHE_MAX_BYTES': int(os.getenv('SCRAPE_CACHE_MAX_BYTES', 50 * 1024 * 1024)),
+    # Buyer matching: optional zip,lat,lon centroid table enables radius matching
+    'ZIP_CENTROIDS_PATH': os.getenv('ZIP_CENTROIDS_PATH', os.path.join(os.path.dirname(__file__), 'data', 'zip_centroids.csv')),
+    'MATCH_RADIUS_MILES': float(os.getenv('MATCH_RADIUS_MILES', 10)),
+    # Only buyers mined within this many days count towards buyer_count; 0 counts every stored buyer
+    'BUYER_WINDOW_DAYS': float(os.getenv('BUYER_WINDOW_DAYS', 0)),
+    # How often leads whose buyers aged out of that window are recounted in the background
+    'BUYER_REFRESH_SECONDS': float(os.getenv('BUYER_REFRESH_SECONDS', 300)),
+    # Batch dialer: concurrent calls, Twilio calls-per-second cap, leads per status update
+    'DIALER_WORKERS': int(os.getenv('DIALER_WORKERS', 8)),
+    'TWILIO_CPS': float(os.getenv('TWILIO_CPS', 1)),
+    'DIALER_STATUS_BATCH': int(os.getenv('DIALER_STATUS_BATCH', 50)),
+    # Rendered TTS audio URLs, content-addressed by voice, agent and text. A URL is cached until
+    # shortly before the expiry the vendor states (or its signature carries), and never longer
+    # than the TTL, which is all that bounds URLs that state no expiry
+    'TTS_CACHE_PATH': os.getenv('TTS_CACHE_PATH', os.path.join(os.path.dirname(__file__), 'tts_cache.db')),
+    'TTS_CACHE_TTL_SECONDS': float(os.getenv('TTS_CACHE_TTL_SECONDS', 3600)),
+    'TTS_CACHE_MEMORY_ENTRIES': int(os.getenv('TTS_CACHE_MEMORY_ENTRIES', 1024)),
+    'TTS_CACHE_MAX_BYTES': int(os.getenv('TTS_CACHE_MAX_BYTES', 20 * 1024 * 1024)),
+    'TTS_PRERENDER_WORKERS': int(os.getenv('TTS_PRERENDER_WORKERS', 8)),
+    # Shared keep-alive clients for the voice vendors
+    'HTTP_POOL_SIZE': int(os.getenv('HTTP_POOL_SIZE', 32)),
+    'HTTP_CONNECT_TIMEOUT': float(os.getenv('HTTP_CONNECT_TIMEOUT', 3.05)),
+    'HTTP_READ_TIMEOUT': float(os.getenv('HTTP_READ_TIMEOUT', 30)),
+    'LLM_TIMEOUT_SECONDS': float(os.getenv('LLM_TIMEOUT_SECONDS', 60)),
+    'LLM_CONCURRENCY': int(os.getenv('LLM_CONCURRENCY', 4)),
+    'SCRIPT_CACHE_PATH': os.getenv('SCRIPT_CACHE_PATH', os.path.join(os.path.dirname(__file__), 'script_cache.db')),
+    'SCRIPT_CACHE_TTL_SECONDS': float(os.getenv('SCRIPT_CACHE_TTL_SECONDS', 30 * 24 * 3600)),
+    'SCRIPT_CACHE_MAX_BYTES': int(os.getenv('SCRIPT_CACHE_MAX_BYTES', 20 * 1024 * 1024)),
+    # Server-sent events: how many recent events a reconnecting client can resume from
+    'EVENTS_HISTORY': int(os.getenv('EVENTS_HISTORY', 1000)),
+    'EVENTS_KEEPALIVE_SECONDS': float(os.getenv('EVENTS_KEEPALIVE_SECONDS', 15)),
+    # Largest request body (as sent, so before gunzipping) the import endpoints accept; bigger
+    # files go through the import-leads / import-call-logs CLI commands
+    'IMPORT_MAX_BYTES': int(os.getenv('IMPORT_MAX_BYTES', 100 * 1024 * 1024)),
+    # 'on' times requests, SQL statements and vendor calls for /metrics; 'off' skips it
+    'METRICS': os.getenv('METRICS', 'on'),
+    # Anything slower than these is logged to the leadgen.slow logger
+    'SLOW_OPERATION_MS': float(os.getenv('SLOW_OPERATION_MS', 1000)),
+    'SLOW_QUERY_MS': float(os.getenv('SLOW_QUERY_MS', 100)),
+    # Production server (serve.py): pre-forked worker processes, each handling up to WEB_THREADS
+    # requests at once. With more than one worker, jobs, campaigns and events are shared through the DB.
+    'WEB_HOST': os.getenv('WEB_HOST', '0.0.0.0'),
+    'WEB_PORT': int(os.getenv('WEB_PORT', os.getenv('PORT', 5001))),
+    'WEB_WORKERS': int(os.getenv('WEB_WORKERS', 1)),
+    'WEB_THREADS': int(os.getenv('WEB_THREADS', 8)),
+    # How often each worker picks up events published by the others
+    'EVENTS_RELAY_SECONDS': float(os.getenv('EVENTS_RELAY_SECONDS', 0.25)),
+    'SHARED_STATE_RETENTION_SECONDS': float(os.getenv('SHARED_STATE_RETENTION_SECONDS', 24 * 3600)),
 }
 
 def load_config():
@@ -22,13 +123,71 @@ def load_config():
     return DEFAULT_CONFIG.copy()
 
 def save_config(new_config):
-    with open(CONFIG_PATH, 'w') as f:
-        json.dump(new_config, f)
+    """Persist the dashboard-editable keys of new_config; anything else is ignored"""
+    new_config = {k: v for k, v in new_config.items() if k in DEFAULT_CONFIG}
+    # Write a sibling temp file and rename it over the config so readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(prefix='.runtime_config.', suffix='.json', dir=os.path.dirname(CONFIG_PATH))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(new_config, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, CONFIG_PATH)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    invalidate_config()
+
+# Process-wide cache of the merged config. It is rebuilt when the file's identity
+# (mtime, size, inode) changes, checked at most every CONFIG_REVALIDATE_SECONDS.
+_cache_lock = threading.Lock()
+_cached = None
+_cached_stamp = None
+_checked_at = 0.0
+_generation = 0
+
+def _file_stamp():
+    try:
+        st = os.stat(CONFIG_PATH)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def invalidate_config():
+    """Force the next get_config() to re-read the file"""
+    global _checked_at, _cached_stamp
+    with _cache_lock:
+        _checked_at = 0.0
+        _cached_stamp = False
+
+def config_generation():
+    """A counter that increases every time the config is reloaded with new contents"""
+    get_config()
+    return _generation
 
 def get_config():
-    config = load_config()
-    # fallback to env if missing
-    for k, v in DEFAULT_CONFIG.items():
-        if not config.get(k):
-            config[k] = v
-    return config
+    """The saved dashboard config plus the server settings, as a read-only mapping shared by all callers"""
+    global _cached, _cached_stamp, _checked_at, _generation
+    config = _cached
+    if config is not None and time.monotonic() - _checked_at < CONFIG_REVALIDATE_SECONDS:
+        return config
+    with _cache_lock:
+        stamp = _file_stamp()
+        if _cached is not None and stamp == _cached_stamp:
+            _checked_at = time.monotonic()
+            return _cached
+        saved = load_config()
+        # fallback to env if missing
+        config = {k: saved.get(k) or v for k, v in DEFAULT_CONFIG.items()}
+        config.update(SERVER_SETTINGS)
+        if _cached is None or dict(_cached) != config:
+            _generation += 1
+        _cached = MappingProxyType(config)
+        _cached_stamp = stamp
+        _checked_at = time.monotonic()
+        return _cached
+
+def multi_worker():
+    """Whether the API runs as several processes that must share in-flight state through the DB"""
+    return get_config()['WEB_WORKERS'] > 1
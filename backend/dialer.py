@@ -0,0 +1,304 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from config import get_config, multi_worker
+from events import publish
+from models import get_db, load_shared_task, request_shared_task_cancel, save_shared_task, take_shared_token
+
+logger = logging.getLogger(__name__)
+
+def build_call_script(lead):
+    """Default pitch for a lead row"""
+    agent_name = lead['name'].split()[0] if lead['name'] else "there"
+    buyer_count = lead['buyer_count'] or 10 # Fallback to 10 if not set
+    zip_code = lead['zip'] or "your area"
+    return f"Hi {agent_name}, this is Ava from Home IQ. We've tracked {buyer_count} qualified buyers searching in {zip_code} right now. Would you like a list?"
+
+def voice_configured(config):
+    """Calls are simulated unless Twilio, ElevenLabs and the LLM are all configured"""
+    return bool(config['TWILIO_ACCOUNT_SID'] and config['ELEVENLABS_API_KEY'] and config['LLM_API_KEY'])
+
+def dial(lead, script, config):
+    """Place one call and return its sid (a dummy sid when voice isn't configured)"""
+    if not voice_configured(config):
+        return 'dummy-call'
+    from voice import place_call
+    return place_call(lead['phone'], script)
+
+def claim_leads(where, values, limit=-1):
+    """Mark the matching leads Queued and return them (with their prior status), skipping leads already queued.
+
+    The select and update share one IMMEDIATE transaction, so concurrent batches in any worker
+    never claim the same lead.
+    """
+    sql = f"SELECT id, name, phone, address, zip, buyer_count, status FROM leads WHERE {' AND '.join(where + ['status != ?'])}"
+    with get_db() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        leads = conn.execute(sql + ' ORDER BY id LIMIT ?', values + ['Queued', limit]).fetchall()
+        conn.executemany('UPDATE leads SET status = ? WHERE id = ?', [('Queued', lead['id']) for lead in leads])
+        conn.commit()
+    return leads
+
+class TokenBucket:
+    """Blocking token bucket: at most `rate` acquisitions per second, bursting up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, self.rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """Take a token if one is available; returns 0, or how long until one is"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, cancelled=None):
+        """Wait for a token; returns False if `cancelled` (an Event) is set first"""
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if cancelled is not None:
+                if cancelled.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+class SharedTokenBucket(TokenBucket):
+    """Token bucket kept in the database, so every worker process draws from the same `rate`"""
+
+    def __init__(self, name, rate, burst=None):
+        super().__init__(rate, burst)
+        self.name = name
+
+    def _take(self):
+        return take_shared_token(self.name, self.rate, self.capacity)
+
+class Campaign:
+    """Progress of one batch of outbound calls"""
+
+    def __init__(self, leads, status_batch_size):
+        self.id = uuid.uuid4().hex
+        self.total = len(leads)
+        self.status_batch_size = status_batch_size
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.errors = deque(maxlen=20)
+        self.prerendering = False
+        self.prerendered = 0
+        self.cancelled = threading.Event()
+        self.created_at = time.time()
+        self.finished_at = None
+        self._prior_status = {lead['id']: lead['status'] for lead in leads}
+        self._called_ids = []
+        self._released_ids = []
+        self._lock = threading.Lock()
+
+    @property
+    def completed(self):
+        return self.succeeded + self.failed
+
+    def record(self, lead_id, error=None):
+        with self._lock:
+            if error is None:
+                self.succeeded += 1
+                self._called_ids.append(lead_id)
+            else:
+                self.failed += 1
+                self.errors.append({'lead_id': lead_id, 'error': error})
+                self._released_ids.append(lead_id)
+            flush = len(self._called_ids) + len(self._released_ids) >= self.status_batch_size
+        if flush:
+            self.flush_statuses()
+        self.share()
+
+    def skip(self, lead_id):
+        with self._lock:
+            self.skipped += 1
+            self._released_ids.append(lead_id)
+
+    def flush_statuses(self):
+        """Mark dialed leads as Calling and give failed or skipped ones back their prior status, one statement per batch"""
+        with self._lock:
+            lead_ids, self._called_ids = self._called_ids, []
+            released, self._released_ids = self._released_ids, []
+        if not lead_ids and not released:
+            return
+        with get_db() as conn:
+            conn.executemany('UPDATE leads SET status = ? WHERE id = ?', [("Calling", lead_id) for lead_id in lead_ids])
+            # Unless the lead was edited while queued
+            conn.executemany('UPDATE leads SET status = ? WHERE id = ? AND status = ?',
+                             [(self._prior_status[lead_id], lead_id, 'Queued') for lead_id in released])
+            conn.commit()
+        if lead_ids:
+            publish('leads_changed', {'campaign_id': self.id, 'lead_ids': lead_ids, 'status': 'Calling'})
+        if released:
+            publish('leads_changed', {'campaign_id': self.id, 'released_ids': released})
+
+    def finish_if_done(self):
+        with self._lock:
+            done = self.finished_at is None and self.completed + self.skipped >= self.total
+            if done:
+                self.finished_at = time.time()
+        if done:
+            self.flush_statuses()
+            self.share()
+
+    def share(self):
+        """Publish progress for other worker processes and pick up a cancel one of them asked for"""
+        if not multi_worker():
+            return
+        try:
+            if save_shared_task(self.id, 'campaign', self.to_dict()):
+                self.cancelled.set()
+        except Exception as e:
+            logger.error(f"Sharing campaign {self.id} failed: {str(e)}")
+
+    def to_dict(self):
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = max(end - self.created_at, 1e-9)
+            completed = self.completed
+            rate = completed / elapsed
+            if self.finished_at:
+                state = 'cancelled' if self.cancelled.is_set() else 'finished'
+            elif self.prerendering:
+                state = 'prerendering'
+            else:
+                state = 'cancelling' if self.cancelled.is_set() else 'running'
+            return {
+                'campaign_id': self.id,
+                'state': state,
+                'total': self.total,
+                'completed': completed,
+                'succeeded': self.succeeded,
+                'failed': self.failed,
+                'skipped': self.skipped,
+                'prerendered_scripts': self.prerendered,
+                'remaining': self.total - completed - self.skipped,
+                'elapsed_seconds': round(elapsed, 3),
+                'calls_per_second': round(rate, 3),
+                'eta_seconds': round((self.total - completed - self.skipped) / rate, 1) if rate and not self.finished_at else None,
+                'recent_errors': list(self.errors),
+            }
+
+class Dialer:
+    """Places calls for campaigns on a bounded worker pool, paced to the Twilio account's CPS"""
+
+    def __init__(self, workers, calls_per_second, status_batch_size=50, max_history=100, bucket=None):
+        self.status_batch_size = status_batch_size
+        self.max_history = max_history
+        self.bucket = bucket or TokenBucket(calls_per_second)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dialer')
+        self._campaigns = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, leads, script=None):
+        """Queue a call for every lead row claimed by claim_leads; returns the Campaign tracking them"""
+        campaign = Campaign(leads, self.status_batch_size)
+        with self._lock:
+            self._campaigns[campaign.id] = campaign
+            while len(self._campaigns) > self.max_history:
+                oldest = next(iter(self._campaigns.values()))
+                if oldest.finished_at is None:
+                    break
+                self._campaigns.popitem(last=False)
+        personalize = not script and get_config()['SCRIPT_MODE'] == 'llm'
+        campaign.share()
+        if not leads:
+            campaign.finish_if_done()
+        elif personalize or voice_configured(get_config()):
+            # Write and render each distinct script once, up front, so calls don't wait on the LLM or TTS
+            campaign.prerendering = True
+            threading.Thread(target=self._prepare_then_dial, args=(campaign, leads, script, personalize),
+                             name='dialer-prepare', daemon=True).start()
+        else:
+            self._submit_calls(campaign, leads, {lead['id']: script or build_call_script(lead) for lead in leads})
+        return campaign
+
+    def _prepare_then_dial(self, campaign, leads, script, personalize):
+        scripts = {lead['id']: script or build_call_script(lead) for lead in leads}
+        try:
+            if personalize:
+                from script_gen import generate_scripts
+                scripts.update(generate_scripts(leads))
+            if voice_configured(get_config()):
+                from voice import prerender_scripts
+                rendered = prerender_scripts(scripts.values())
+                campaign.prerendered = sum(1 for audio_url in rendered.values() if audio_url)
+        except Exception as e:
+            logger.error(f"Preparing campaign {campaign.id} failed: {str(e)}")
+        finally:
+            campaign.prerendering = False
+            campaign.share()
+            self._submit_calls(campaign, leads, scripts)
+
+    def _submit_calls(self, campaign, leads, scripts):
+        for lead in leads:
+            self._executor.submit(self._call, campaign, lead, scripts[lead['id']])
+
+    def get(self, campaign_id):
+        with self._lock:
+            return self._campaigns.get(campaign_id)
+
+    def status(self, campaign_id):
+        """A campaign's progress dict, whichever worker process is running it; None if unknown"""
+        campaign = self.get(campaign_id)
+        if campaign:
+            return campaign.to_dict()
+        return load_shared_task(campaign_id, 'campaign') if multi_worker() else None
+
+    def cancel(self, campaign_id):
+        """Stop dialing a campaign; returns its progress dict, or None if unknown"""
+        campaign = self.get(campaign_id)
+        if campaign:
+            campaign.cancelled.set()
+            return campaign.to_dict()
+        # Running in another worker: it sees the flag the next time it shares progress
+        if multi_worker() and request_shared_task_cancel(campaign_id, 'campaign'):
+            snapshot = load_shared_task(campaign_id, 'campaign')
+            if snapshot['state'] in ('running', 'prerendering'):
+                snapshot['state'] = 'cancelling'
+            return snapshot
+        return None
+
+    def _call(self, campaign, lead, script):
+        try:
+            if campaign.cancelled.is_set() or not self.bucket.acquire(campaign.cancelled):
+                campaign.skip(lead['id'])
+                return
+            try:
+                dial(lead, script, get_config())
+                campaign.record(lead['id'])
+            except Exception as e:
+                logger.error(f"Call to lead {lead['id']} failed: {str(e)}")
+                campaign.record(lead['id'], error=str(e))
+        finally:
+            campaign.finish_if_done()
+
+_dialer = None
+_dialer_lock = threading.Lock()
+
+def get_dialer():
+    global _dialer
+    with _dialer_lock:
+        if _dialer is None:
+            config = get_config()
+            # The CPS limit is per Twilio account, so worker processes share one bucket
+            # and a campaign in any of them can use all of it
+            bucket = SharedTokenBucket('twilio_cps', config['TWILIO_CPS']) if multi_worker() else None
+            _dialer = Dialer(config['DIALER_WORKERS'], config['TWILIO_CPS'], config['DIALER_STATUS_BATCH'],
+                             bucket=bucket)
+        return _dialer
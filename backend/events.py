@@ -0,0 +1,128 @@
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from config import get_config, multi_worker
+from models import append_event, events_after, last_event_log_id, prune_shared_state
+
+logger = logging.getLogger(__name__)
+
+# Logged events only need to outlive the slowest relay poll; the rest is slack for restarts
+EVENT_LOG_RETENTION_SECONDS = 600
+
+class EventBus:
+    """In-process pub/sub for dashboard updates.
+
+    Published events go into a bounded ring buffer; subscribers block on a condition
+    until something newer than the last id they saw arrives, so an idle subscriber costs
+    a parked thread and nothing else. Ids are "<epoch>-<n>": a client resuming with an id
+    from another process lifetime, or one older than the buffer, is told to resync.
+    """
+
+    def __init__(self, history=1000):
+        self.epoch = f"{int(time.time()):x}{os.getpid():x}"
+        self._events = deque(maxlen=history)
+        self._counter = itertools.count(1)
+        self._last = 0
+        self._cond = threading.Condition()
+
+    def publish(self, event_type, data):
+        return self.publish_encoded(event_type, json.dumps(data))
+
+    def publish_encoded(self, event_type, data):
+        """Publish an event whose data is already a JSON string"""
+        with self._cond:
+            seq = self._last = next(self._counter)
+            self._events.append((seq, event_type, data))
+            self._cond.notify_all()
+        return self.event_id(seq)
+
+    def event_id(self, seq):
+        return f"{self.epoch}-{seq}"
+
+    def resume(self, last_event_id):
+        """Sequence number to stream after, and whether events were missed since last_event_id"""
+        with self._cond:
+            if not last_event_id:
+                return self._last, False
+            epoch, _, seq = last_event_id.rpartition('-')
+            if epoch != self.epoch or not seq.isdigit() or int(seq) > self._last:
+                return self._last, True
+            oldest = self._events[0][0] if self._events else self._last + 1
+            if int(seq) < oldest - 1:
+                return self._last, True
+            return int(seq), False
+
+    def wait(self, after, timeout):
+        """(events with sequence > after, whether some fell out of the buffer first).
+
+        Blocks up to timeout seconds for the first event.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._last > after, timeout)
+            # Sequence numbers are contiguous, so the newer events are the buffer's tail
+            count = min(self._last - after, len(self._events))
+            events = list(itertools.islice(self._events, len(self._events) - count, None))
+            return events, self._last - after > count
+
+class EventRelay:
+    """Feeds events published by other worker processes into this process's bus.
+
+    With several workers each one appends what it publishes to event_log and tails the
+    table for everyone else's, so an SSE client hears about every change whichever
+    worker it is connected to. The relay also prunes old events and task snapshots.
+    """
+
+    def __init__(self, bus, interval):
+        self.bus = bus
+        self.interval = interval
+        self._after = last_event_log_id()
+
+    def start(self):
+        threading.Thread(target=self._run, name='event-relay', daemon=True).start()
+
+    def _run(self):
+        pruned_at = 0.0
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.poll()
+                if time.monotonic() - pruned_at > 60:
+                    prune_shared_state(get_config()['SHARED_STATE_RETENTION_SECONDS'], EVENT_LOG_RETENTION_SECONDS)
+                    pruned_at = time.monotonic()
+            except Exception:
+                logger.exception('Relaying events from other workers failed')
+
+    def poll(self):
+        rows = events_after(self._after)
+        while rows:
+            for row in rows:
+                if row['origin'] != self.bus.epoch:
+                    self.bus.publish_encoded(row['event_type'], row['data'])
+            self._after = rows[-1]['id']
+            rows = events_after(self._after)
+
+_bus = None
+_bus_pid = None
+_bus_lock = threading.Lock()
+
+def get_event_bus():
+    global _bus, _bus_pid
+    with _bus_lock:
+        # A bus inherited across fork belongs to the parent: no relay thread, wrong epoch
+        if _bus is None or _bus_pid != os.getpid():
+            _bus = EventBus(get_config()['EVENTS_HISTORY'])
+            _bus_pid = os.getpid()
+            if multi_worker():
+                EventRelay(_bus, get_config()['EVENTS_RELAY_SECONDS']).start()
+        return _bus
+
+def publish(event_type, data):
+    bus = get_event_bus()
+    encoded = json.dumps(data)
+    if multi_worker():
+        append_event(bus.epoch, event_type, encoded)
+    return bus.publish_encoded(event_type, encoded)
@@ -0,0 +1,128 @@
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class JobQueueFull(Exception):
+    pass
+
+class Job:
+    """A unit of background work whose state is safe to read from request threads"""
+
+    def __init__(self, key, params, on_update=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.params = params
+        self.state = 'queued'
+        self.progress = {}
+        self.result = {}
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._on_update = on_update
+        self._lock = threading.Lock()
+
+    def set_progress(self, source, state, **details):
+        """Record the state of one step (e.g. a scrape source) of this job"""
+        with self._lock:
+            self.progress[source] = {'state': state, **details}
+        self.notify()
+
+    def notify(self):
+        """Tell the on_update callback (if any) that this job changed"""
+        if self._on_update is None:
+            return
+        try:
+            self._on_update(self)
+        except Exception:
+            logger.exception(f"Publishing job {self.id} failed")
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'state': self.state,
+                'params': self.params,
+                'progress': {k: dict(v) for k, v in self.progress.items()},
+                'result': dict(self.result),
+                'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+            }
+
+class JobManager:
+    """Runs jobs on a bounded thread pool, collapsing duplicate in-flight work by key.
+
+    on_update(job) is called whenever a job changes state or reports progress.
+    """
+
+    def __init__(self, max_workers=2, max_pending=20, max_history=200, on_update=None):
+        self.max_pending = max_pending
+        self.max_history = max_history
+        self.on_update = on_update
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, params, fn):
+        """Queue fn(job) unless a job with the same key is in flight.
+
+        Returns (job, created) where created is False for a deduplicated request.
+        """
+        with self._lock:
+            existing = self._in_flight.get(key)
+            if existing is not None:
+                return existing, False
+            if len(self._in_flight) >= self.max_pending:
+                raise JobQueueFull(f"{len(self._in_flight)} jobs already queued or running")
+            job = Job(key, params, self.on_update)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+            self._trim_history()
+        job.notify()
+        self._executor.submit(self._run, job, fn)
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn):
+        with job._lock:
+            job.state = 'running'
+            job.started_at = time.time()
+        job.notify()
+        try:
+            result = fn(job)
+            with job._lock:
+                job.result = result or {}
+                job.state = 'succeeded'
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed")
+            with job._lock:
+                job.error = str(e)
+                job.state = 'failed'
+        finally:
+            with job._lock:
+                job.finished_at = time.time()
+            with self._lock:
+                if self._in_flight.get(job.key) is job:
+                    del self._in_flight[job.key]
+            job.notify()
+
+    def _trim_history(self):
+        # Forget the oldest finished jobs so the registry stays bounded
+        while len(self._jobs) > self.max_history:
+            for job_id, job in self._jobs.items():
+                if job.finished_at is not None:
+                    del self._jobs[job_id]
+                    break
+            else:
+                return
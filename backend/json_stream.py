@@ -0,0 +1,172 @@
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Characters that matter while scanning for the end of a JSON value
+_STRUCTURE_RE = re.compile(r'[{}\[\]"]')
+_STRING_RE = re.compile(r'["\\]')
+_START_RE = re.compile(r'[{\[]')
+_WRAPPER_RE = re.compile(r'\{\s*"agents"\s*:\s*\[')
+_WRAPPER_PREFIX = '{"agents":['
+
+class JSONRecordStream:
+    """Incrementally pulls JSON records out of noisy text, e.g. MCP client stdout.
+
+    Feed it chunks as they arrive and it yields dicts as soon as each one is complete.
+    It understands NDJSON, pretty-printed objects spanning many lines, top-level arrays
+    and {"agents": [...]} envelopes (both are streamed element by element), and skips
+    log lines in between. Only the record currently being read is buffered; one that
+    grows past max_record_bytes is dropped.
+    """
+
+    def __init__(self, max_record_bytes=1024 * 1024):
+        self.max_record_bytes = max_record_bytes
+        # Unconsumed input is self._buf[self._start:]; slicing is deferred to keep feeds linear
+        self._buf = ''
+        self._start = 0
+        self._mode = 'seek'
+        self._in_array = False
+        self._in_wrapper = False
+        self._reset_scan()
+
+    def _reset_scan(self, depth=0):
+        self._depth = depth
+        self._in_str = False
+        self._esc = False
+        self._pos = self._start
+
+    def feed(self, text):
+        if self._start:
+            self._pos -= self._start
+            self._buf, self._start = self._buf[self._start:], 0
+        self._buf += text
+        yield from self._drain()
+
+    def close(self):
+        """Signal end of input; an unfinished trailing record is discarded"""
+        if self._mode == 'value' and self._buf[self._start:].strip():
+            logger.debug("Discarding incomplete JSON record at end of stream")
+        self._buf, self._start = '', 0
+        self._mode = 'seek'
+
+    def _drain(self):
+        buf = self._buf
+        while self._start < len(buf):
+            if self._mode == 'seek':
+                match = _START_RE.search(buf, self._start)
+                if not match:
+                    self._start = len(buf)
+                    return
+                self._start = match.start()
+                if buf[self._start] == '[':
+                    self._start += 1
+                    self._mode, self._in_array = 'array', True
+                    continue
+                wrapper = _WRAPPER_RE.match(buf, self._start)
+                if wrapper:
+                    self._start = wrapper.end()
+                    self._mode, self._in_array, self._in_wrapper = 'array', True, True
+                    continue
+                compact = re.sub(r'\s+', '', buf[self._start:self._start + 64])
+                if len(compact) < len(_WRAPPER_PREFIX) and _WRAPPER_PREFIX.startswith(compact):
+                    return  # might still turn out to be an envelope; wait for more
+                self._mode = 'value'
+                self._reset_scan()
+            elif self._mode == 'array':
+                while self._start < len(buf) and buf[self._start] in ' \t\r\n,':
+                    self._start += 1
+                if self._start >= len(buf):
+                    return
+                char = buf[self._start]
+                if char == ']':
+                    self._start += 1
+                    self._in_array = False
+                    if self._in_wrapper:
+                        # Skip whatever else the envelope holds up to its closing brace
+                        self._in_wrapper = False
+                        self._mode = 'tail'
+                        self._reset_scan(depth=1)
+                    else:
+                        self._mode = 'seek'
+                elif char in '{[':
+                    self._mode = 'value'
+                    self._reset_scan()
+                else:
+                    # Not an array of records after all (e.g. a "[INFO] ..." log prefix)
+                    self._mode, self._in_array, self._in_wrapper = 'seek', False, False
+            else:
+                end = self._scan()
+                if end is None:
+                    if len(buf) - self._start > self.max_record_bytes:
+                        logger.warning(f"Dropping JSON record larger than {self.max_record_bytes} bytes")
+                        self._start = len(buf)
+                        self._mode, self._in_array, self._in_wrapper = 'seek', False, False
+                    return
+                text = buf[self._start:end]
+                self._start = end
+                finished_mode = self._mode
+                self._mode = 'array' if self._in_array else 'seek'
+                if finished_mode == 'value':
+                    yield from self._records(text)
+
+    def _scan(self):
+        """Advance the scan over the buffer; return the end index once the value closes"""
+        buf = self._buf
+        pos = self._pos
+        while True:
+            if self._in_str:
+                if self._esc:
+                    # Whatever follows a backslash is part of the escape
+                    if pos >= len(buf):
+                        self._pos = pos
+                        return None
+                    pos += 1
+                    self._esc = False
+                    continue
+                match = _STRING_RE.search(buf, pos)
+                if not match:
+                    self._pos = len(buf)
+                    return None
+                pos = match.end()
+                if match.group() == '\\':
+                    self._esc = True
+                else:
+                    self._in_str = False
+            else:
+                match = _STRUCTURE_RE.search(buf, pos)
+                if not match:
+                    self._pos = len(buf)
+                    return None
+                pos = match.end()
+                char = match.group()
+                if char == '"':
+                    self._in_str = True
+                elif char in '{[':
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._pos = pos
+                        return pos
+
+    def _records(self, text):
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            logger.debug(f"Skipping malformed JSON record: {text[:200]}")
+            return
+        if isinstance(value, dict) and isinstance(value.get('agents'), list):
+            yield from (item for item in value['agents'] if isinstance(item, dict))
+        elif isinstance(value, dict):
+            yield value
+        elif isinstance(value, list):
+            yield from (item for item in value if isinstance(item, dict))
+
+def iter_json_records(chunks, max_record_bytes=1024 * 1024):
+    """Yield JSON records from an iterable of text chunks"""
+    stream = JSONRecordStream(max_record_bytes)
+    for chunk in chunks:
+        yield from stream.feed(chunk)
+    stream.close()
@@ -0,0 +1,140 @@
+import csv
+import math
+import os
+import re
+import threading
+from collections import defaultdict
+
+ZIP_RE = re.compile(r'\b(\d{5})(?:-\d{4})?\b')
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+US_STATES = {
+    'al', 'ak', 'az', 'ar', 'ca', 'co', 'ct', 'de', 'dc', 'fl', 'ga', 'hi', 'id', 'il', 'in', 'ia', 'ks',
+    'ky', 'la', 'me', 'md', 'ma', 'mi', 'mn', 'ms', 'mo', 'mt', 'ne', 'nv', 'nh', 'nj', 'nm', 'ny', 'nc',
+    'nd', 'oh', 'ok', 'or', 'pa', 'ri', 'sc', 'sd', 'tn', 'tx', 'ut', 'vt', 'va', 'wa', 'wv', 'wi', 'wy',
+}
+
+def tokenize(text):
+    """Lowercase word tokens of a free-text location"""
+    return set(TOKEN_RE.findall((text or '').lower()))
+
+def parse_place(text):
+    """Split an address or location into (zip, city tokens).
+
+    '100 Main St, Austin, TX 78704' -> ('78704', ('austin',)); 'Round Rock TX' -> (None, ('round', 'rock'))
+    """
+    text = (text or '').lower()
+    zip_match = ZIP_RE.search(text)
+    zip_code = zip_match.group(1) if zip_match else None
+    parts = [' '.join(p.split()) for p in ZIP_RE.sub(' ', text).split(',')]
+    parts = [p for p in parts if p]
+    if parts and parts[-1] in US_STATES:
+        parts = parts[:-1]
+    elif parts:
+        words = parts[-1].split()
+        if len(words) > 1 and words[-1] in US_STATES:
+            parts[-1] = ' '.join(words[:-1])
+    city = None
+    if len(parts) >= 2:
+        city = parts[-1]
+    elif len(parts) == 1 and not parts[0][:1].isdigit():
+        # A lone part is a city ("Austin, TX") unless it looks like a street address
+        city = parts[0]
+    return zip_code, tuple(TOKEN_RE.findall(city)) if city else ()
+
+class ZipCentroids:
+    """Zip -> (lat, lon) table bucketed into a lat/lon grid for radius lookups"""
+
+    def __init__(self, centroids, cell_degrees=0.25):
+        self.centroids = centroids
+        self.cell_degrees = cell_degrees
+        self._grid = defaultdict(list)
+        for zip_code, (lat, lon) in centroids.items():
+            self._grid[self._cell(lat, lon)].append(zip_code)
+        self._neighbors = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_csv(cls, path):
+        """Load a zip,lat,lon CSV (header row optional)"""
+        centroids = {}
+        with open(path, newline='') as f:
+            for row in csv.reader(f):
+                try:
+                    centroids[row[0].strip().zfill(5)] = (float(row[1]), float(row[2]))
+                except (ValueError, IndexError):
+                    continue
+        return cls(centroids)
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees))
+
+    def within(self, zip_code, radius_miles):
+        """Zips whose centroid lies within radius_miles of zip_code (including itself)"""
+        key = (zip_code, radius_miles)
+        with self._lock:
+            if key in self._neighbors:
+                return self._neighbors[key]
+        origin = self.centroids.get(zip_code)
+        if origin is None:
+            return (zip_code,)
+        lat, lon = origin
+        # A degree of latitude is ~69 miles; longitude degrees shrink with cos(lat)
+        lat_cells = int(math.ceil(radius_miles / 69.0 / self.cell_degrees))
+        lon_cells = int(math.ceil(radius_miles / (69.0 * max(math.cos(math.radians(lat)), 0.01)) / self.cell_degrees))
+        row, col = self._cell(lat, lon)
+        found = []
+        for r in range(row - lat_cells, row + lat_cells + 1):
+            for c in range(col - lon_cells, col + lon_cells + 1):
+                for other in self._grid.get((r, c), ()):
+                    if haversine_miles(origin, self.centroids[other]) <= radius_miles:
+                        found.append(other)
+        result = tuple(found)
+        with self._lock:
+            self._neighbors[key] = result
+        return result
+
+def haversine_miles(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 3958.8 * 2 * math.asin(math.sqrt(h))
+
+_centroids = None
+_centroids_path = None
+_centroids_lock = threading.Lock()
+
+def get_zip_centroids(path):
+    """Load (once) the zip-centroid table at path, or None if there isn't one"""
+    global _centroids, _centroids_path
+    with _centroids_lock:
+        if _centroids_path != path:
+            _centroids_path = path
+            _centroids = ZipCentroids.from_csv(path) if path and os.path.exists(path) else None
+        return _centroids
+
+class BuyerIndex:
+    """Inverted index from location tokens (zips and city words) to buyers.
+
+    Built once per batch so matching an agent costs its posting lists, not a scan of every buyer.
+    """
+
+    def __init__(self, buyers, field='location_interest'):
+        self.buyers = buyers
+        self._postings = defaultdict(list)
+        for position, buyer in enumerate(buyers):
+            for token in tokenize(buyer.get(field)):
+                self._postings[token].append(position)
+
+    def match(self, zip_codes=(), city_tokens=()):
+        """Buyers mentioning any of zip_codes, or every word of the city, in original order"""
+        positions = set()
+        for zip_code in zip_codes:
+            positions.update(self._postings.get(zip_code, ()))
+        if city_tokens:
+            lists = sorted((self._postings.get(token, []) for token in city_tokens), key=len)
+            if lists[0]:
+                common = set(lists[0])
+                for other in lists[1:]:
+                    common.intersection_update(other)
+                positions |= common
+        return [self.buyers[p] for p in sorted(positions)]
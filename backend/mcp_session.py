@@ -0,0 +1,210 @@
+import atexit
+import itertools
+import json
+import logging
+import os
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = '2024-11-05'
+
+class MCPSessionError(Exception):
+    pass
+
+class MCPTimeout(MCPSessionError):
+    pass
+
+class MCPToolError(MCPSessionError):
+    pass
+
+class MCPSession:
+    """A single MCP server process spoken to over stdio with newline-delimited JSON-RPC.
+
+    Requests are multiplexed by id, so many prompts can be in flight on one session.
+    """
+
+    def __init__(self, command, env=None, startup_timeout=60):
+        self.command = command
+        self.env = env or {}
+        self.startup_timeout = startup_timeout
+        self.tools = set()
+        self.last_ok = 0
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._proc = None
+        self._reader = None
+
+    def start(self):
+        # Own process group so close() also takes down anything npx spawned
+        self._proc = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE, text=True, bufsize=1,
+                                      env={**os.environ, **self.env}, start_new_session=True)
+        self._reader = threading.Thread(target=self._read_loop, name='mcp-reader', daemon=True)
+        self._reader.start()
+        threading.Thread(target=self._drain_stderr, name='mcp-stderr', daemon=True).start()
+        try:
+            self.request('initialize', {
+                'protocolVersion': PROTOCOL_VERSION,
+                'capabilities': {},
+                'clientInfo': {'name': 'leadgen', 'version': '1.0'},
+            }, timeout=self.startup_timeout)
+            self.notify('notifications/initialized')
+            listed = self.request('tools/list', {}, timeout=self.startup_timeout)
+            self.tools = {tool['name'] for tool in listed.get('tools', [])}
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def is_alive(self):
+        return self._proc is not None and self._proc.poll() is None and self._reader.is_alive()
+
+    def ping(self, timeout=5):
+        """Health check: True if the server answers a ping in time"""
+        try:
+            self.request('ping', {}, timeout=timeout)
+            return True
+        except Exception:
+            return False
+
+    def call_tool(self, name, arguments, timeout=None):
+        """Call a tool and return the concatenated text of its content blocks"""
+        result = self.request('tools/call', {'name': name, 'arguments': arguments}, timeout=timeout)
+        text = '\n'.join(block.get('text', '') for block in result.get('content', []) if block.get('type') == 'text')
+        if result.get('isError'):
+            raise MCPToolError(f"Tool {name} failed: {text}")
+        return text
+
+    def request(self, method, params, timeout=None):
+        request_id = next(self._ids)
+        future = Future()
+        with self._pending_lock:
+            self._pending[request_id] = future
+        try:
+            self._send({'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params})
+            response = future.result(timeout=timeout)
+        except FutureTimeout:
+            # Let the server stop working on it; the session itself stays usable
+            self.notify('notifications/cancelled', {'requestId': request_id, 'reason': 'timeout'})
+            raise MCPTimeout(f"{method} timed out after {timeout}s")
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+        if 'error' in response:
+            raise MCPSessionError(f"{method} failed: {response['error'].get('message')}")
+        self.last_ok = time.monotonic()
+        return response.get('result', {})
+
+    def notify(self, method, params=None):
+        message = {'jsonrpc': '2.0', 'method': method}
+        if params is not None:
+            message['params'] = params
+        try:
+            self._send(message)
+        except MCPSessionError:
+            pass
+
+    def close(self):
+        if self._proc is None:
+            return
+        if self._proc.poll() is None:
+            try:
+                os.killpg(self._proc.pid, signal.SIGTERM)
+                self._proc.wait(timeout=5)
+            except (ProcessLookupError, subprocess.TimeoutExpired):
+                try:
+                    os.killpg(self._proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        self._fail_pending(MCPSessionError('MCP session closed'))
+
+    def _send(self, message):
+        with self._write_lock:
+            try:
+                self._proc.stdin.write(json.dumps(message) + '\n')
+                self._proc.stdin.flush()
+            except (BrokenPipeError, OSError, ValueError) as e:
+                raise MCPSessionError(f"MCP server is not accepting input: {e}")
+
+    def _read_loop(self):
+        for line in self._proc.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                logger.debug(f"Ignoring non-JSON MCP output: {line[:200]}")
+                continue
+            # Only responses are of interest; server notifications/requests are ignored
+            if 'id' in message and ('result' in message or 'error' in message):
+                with self._pending_lock:
+                    future = self._pending.get(message['id'])
+                if future is not None and not future.done():
+                    future.set_result(message)
+        self._fail_pending(MCPSessionError('MCP server exited'))
+
+    def _drain_stderr(self):
+        # An undrained stderr pipe would eventually block the server
+        for line in self._proc.stderr:
+            logger.debug(f"MCP server: {line.rstrip()}")
+
+    def _fail_pending(self, error):
+        with self._pending_lock:
+            futures = list(self._pending.values())
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+
+class MCPSessionManager:
+    """Keeps one MCP session alive per configuration and restarts it when it dies"""
+
+    def __init__(self, health_interval=30, retry_after=60):
+        self.health_interval = health_interval
+        self.retry_after = retry_after
+        self._session = None
+        self._key = None
+        self._failed_at = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def get_session(self, command, env, startup_timeout=60):
+        """Return a healthy session for this command/env, starting or restarting it as needed"""
+        key = (tuple(command), tuple(sorted(env.items())))
+        with self._lock:
+            session = self._session
+            if session is not None and self._key == key and session.is_alive():
+                # Quiet sessions get pinged before reuse in case the server wedged
+                if time.monotonic() - session.last_ok < self.health_interval or session.ping():
+                    return session
+                logger.warning("MCP session failed its health check; restarting")
+            if self._key == key and self._failed_at and time.monotonic() - self._failed_at < self.retry_after:
+                raise MCPSessionError('MCP session recently failed to start')
+            if session is not None:
+                session.close()
+            self._session, self._key = None, key
+            try:
+                self._session = MCPSession(command, env, startup_timeout).start()
+            except Exception as e:
+                self._failed_at = time.monotonic()
+                raise MCPSessionError(f"Could not start MCP session: {e}")
+            self._failed_at = None
+            logger.info(f"Started MCP session: {' '.join(command)}")
+            return self._session
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+def parse_command(command):
+    return shlex.split(command) if isinstance(command, str) else list(command)
@@ -0,0 +1,143 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from config import get_config
+
+slow_log = logging.getLogger('leadgen.slow')
+
+# Seconds; spans everything from a cached SQLite read to a stuck npx run
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+class Histogram:
+    """Prometheus-style histogram with labels, cheap enough to observe on every SQL statement"""
+
+    def __init__(self, name, help_text, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *labels):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(series[0]), series[1], series[2]) for labels, series in self._series.items()]
+        for labels, counts, total, count in sorted(snapshot):
+            base = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+            sep = ',' if base else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {cumulative}')
+            suffix = f'{{{base}}}' if base else ''
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return '\n'.join(lines)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+HTTP_REQUESTS = Histogram('leadgen_http_request_seconds', 'Time to build each API response',
+                          ['method', 'route', 'status'])
+SQL_STATEMENTS = Histogram('leadgen_sql_statement_seconds', 'Time executing each SQLite statement',
+                           ['statement', 'table'])
+OPERATIONS = Histogram('leadgen_operation_seconds', 'Time spent in external calls and heavy operations',
+                       ['operation', 'outcome'])
+REGISTRY = [HTTP_REQUESTS, SQL_STATEMENTS, OPERATIONS]
+
+def enabled():
+    return get_config()['METRICS'] == 'on'
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    return '\n'.join(histogram.render() for histogram in REGISTRY) + '\n'
+
+def observe_request(method, route, status, seconds):
+    HTTP_REQUESTS.observe(seconds, method, route, str(status))
+    _maybe_log_slow(seconds, 'SLOW_OPERATION_MS', f"{method} {route} -> {status}")
+
+def observe_sql(sql, seconds):
+    statement, table = classify_sql(sql)
+    SQL_STATEMENTS.observe(seconds, statement, table)
+    # Checked inline: this runs on every statement, so only format the message when it's needed
+    if seconds * 1000 >= get_config()['SLOW_QUERY_MS']:
+        slow_log.warning(f"Slow: SQL {' '.join(sql.split())[:300]} took {seconds * 1000:.1f}ms")
+
+@contextmanager
+def span(operation, **details):
+    """Time a block as `operation`.
+
+    Yields a dict whose 'outcome' the block may change (e.g. to 'timeout'); an exception
+    escaping the block records 'error'.
+    """
+    result = {'outcome': 'ok'}
+    if not enabled():
+        yield result
+        return
+    start = time.perf_counter()
+    try:
+        yield result
+    except GeneratorExit:
+        # A stream the caller stopped reading early still did its work
+        raise
+    except BaseException:
+        result['outcome'] = 'error'
+        raise
+    finally:
+        record(operation, time.perf_counter() - start, result['outcome'], **details)
+
+def record(operation, seconds, outcome='ok', **details):
+    """Record one already-timed operation, for code that can't sit inside a with block"""
+    if not enabled():
+        return
+    OPERATIONS.observe(seconds, operation, outcome)
+    _maybe_log_slow(seconds, 'SLOW_OPERATION_MS', operation, details)
+
+def timed(operation):
+    """Decorator form of span()"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(operation):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _maybe_log_slow(seconds, threshold_key, what, details=None):
+    threshold_ms = get_config()[threshold_key]
+    if seconds * 1000 >= threshold_ms:
+        extra = f" {details}" if details else ''
+        slow_log.warning(f"Slow: {what} took {seconds * 1000:.1f}ms{extra}")
+
+_SQL_KEYWORDS = {'from', 'into', 'update', 'join', 'table', 'exists'}
+
+@functools.lru_cache(maxsize=1024)
+def classify_sql(sql):
+    """(statement kind, main table) of a SQL string, for low-cardinality labels"""
+    words = sql.replace('(', ' ').replace(',', ' ').split()
+    if not words:
+        return 'other', ''
+    statement = words[0].lower()
+    if statement == 'with':
+        statement = next((w.lower() for w in words if w.lower() in ('select', 'insert', 'update', 'delete')), 'with')
+    table = ''
+    for previous, word in zip(words, words[1:]):
+        if previous.lower() in _SQL_KEYWORDS and word.lower() not in ('not', 'select', 'or', 'if'):
+            table = word.strip('"`[];').lower()
+            break
+    return statement, table
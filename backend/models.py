@@ -1,16 +1,149 @@
+import json
+import logging
 import sqlite3
+import threading
+import time
 from contextlib import contextmanager
 import os
+import metrics
+from config import get_config
+from matching import parse_place
+
+logger = logging.getLogger(__name__)
 
 DB_PATH = os.environ.get('DATABASE_URL', 'leads.db').replace('sqlite:///', '')
 
+# Columns a client may read or filter on via the leads API
+LEAD_FIELDS = ['id', 'name', 'phone', 'category', 'address', 'website', 'status', 'buyer_count', 'zip']
+
+# Connections are pooled per process (forked workers never share a handle) and lent to
+# one thread at a time; nested get_db() calls on that thread reuse the same one. Keeping
+# connections open keeps their parsed schema, page cache and prepared-statement cache
+# warm across requests, even though the servers run each request on a fresh thread.
+# Up to SQLITE_POOL_SIZE idle connections are kept; extra ones opened under load are
+# closed when returned rather than waited for.
+_pool = []
+_pool_key = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+# Values a config may put into the PRAGMA statements run on every new connection
+JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that records how long each statement takes to execute"""
+
+    def execute(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            metrics.observe_sql(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            metrics.observe_sql(sql, time.perf_counter() - start)
+
+    def executescript(self, script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            metrics.observe_sql(script, time.perf_counter() - start)
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+def _connect():
+    """Open a new connection tuned from config"""
+    config = get_config()
+    # With metrics off, connections are plain sqlite3 ones and pay nothing for timing
+    conn = sqlite3.connect(DB_PATH, timeout=config['SQLITE_BUSY_TIMEOUT_MS'] / 1000,
+                           cached_statements=config['SQLITE_STATEMENT_CACHE'],
+                           # Pooled connections move between threads, though only one uses each at a time
+                           check_same_thread=False,
+                           factory=TimedConnection if metrics.enabled() else sqlite3.Connection)
+    conn.row_factory = sqlite3.Row
+    # WAL lets readers proceed while a writer commits; NORMAL sync is durable enough under WAL
+    conn.execute(f"PRAGMA journal_mode = {_pragma_value(config, 'SQLITE_JOURNAL_MODE', JOURNAL_MODES, 'WAL')}")
+    conn.execute(f"PRAGMA synchronous = {_pragma_value(config, 'SQLITE_SYNCHRONOUS', SYNCHRONOUS_MODES, 'NORMAL')}")
+    conn.execute(f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}")
+    # Negative cache_size is in KiB rather than pages
+    conn.execute(f"PRAGMA cache_size = -{int(config['SQLITE_CACHE_SIZE_KB'])}")
+    conn.execute(f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+    return conn
+
+def open_db():
+    """A connection of its own, outside the pool, for long-lived work; the caller closes it"""
+    return _connect()
+
+def _pragma_value(config, key, allowed, default):
+    """config[key] if it is one of the allowed PRAGMA values, else default (the value is spliced into SQL)"""
+    value = str(config[key]).upper()
+    if value not in allowed:
+        logger.warning(f"Ignoring {key}={config[key]!r}; expected one of {sorted(allowed)}")
+        return default
+    return value
+
+def _borrow():
+    """An idle pooled connection for this process and database, or a new one"""
+    global _pool, _pool_key
+    key = (os.getpid(), DB_PATH)
+    with _pool_lock:
+        if _pool_key != key:
+            # Connections inherited across a fork belong to the parent; leave them alone
+            _pool, _pool_key = [], key
+        if _pool:
+            return _pool.pop()
+    return _connect()
+
+def _give_back(conn):
+    # Uncommitted work must not leak into the next borrower
+    if conn.in_transaction:
+        conn.rollback()
+    with _pool_lock:
+        if _pool_key == (os.getpid(), DB_PATH) and len(_pool) < get_config()['SQLITE_POOL_SIZE']:
+            _pool.append(conn)
+            return
+    conn.close()
+
 @contextmanager
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """A pooled connection, held by the calling thread until its outermost get_db() exits"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        yield conn
+        return
+    conn = _borrow()
+    _local.conn, _local.pid = conn, os.getpid()
     try:
         yield conn
     finally:
+        # A generator may be finalized on another thread; only release what this thread holds
+        if getattr(_local, 'conn', None) is conn:
+            _local.conn = None
+        _give_back(conn)
+
+def close_db():
+    """Close this process's idle pooled connections (e.g. before forking workers)"""
+    global _pool
+    with _pool_lock:
+        idle, _pool = (_pool, []) if _pool_key and _pool_key[0] == os.getpid() else ([], [])
+    for conn in idle:
         conn.close()
 
 def init_db():
@@ -47,3 +180,463 @@ def init_db():
             # Column doesn't exist, add it
             conn.execute('ALTER TABLE leads ADD COLUMN buyer_count INTEGER DEFAULT 0')
             conn.commit()
+
+        # Zip is denormalized out of the address so it can be filtered through an index
+        try:
+            conn.execute('SELECT zip FROM leads LIMIT 1')
+        except sqlite3.OperationalError:
+            conn.execute('ALTER TABLE leads ADD COLUMN zip TEXT')
+            rows = conn.execute('SELECT id, address FROM leads').fetchall()
+            conn.executemany('UPDATE leads SET zip = ? WHERE id = ?',
+                             [(extract_zip_from_address(row['address']), row['id']) for row in rows])
+            conn.commit()
+
+        # Keyset pagination relies on a non-null buyer_count
+        conn.execute('UPDATE leads SET buyer_count = 0 WHERE buyer_count IS NULL')
+
+        # Every filter/sort exposed by GET /api/leads ends in id so pages can seek by (key, id)
+        c.execute('CREATE INDEX IF NOT EXISTS idx_leads_status_id ON leads (status, id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_leads_category_id ON leads (category, id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_leads_zip_id ON leads (zip, id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_leads_buyer_count_id ON leads (buyer_count, id)')
+        # A filter with sort=buyer_count (or a min/max_buyers range) seeks by (filter, buyer_count, id)
+        # rather than sorting every matching row
+        c.execute('CREATE INDEX IF NOT EXISTS idx_leads_status_buyer_count_id ON leads (status, buyer_count, id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_leads_category_buyer_count_id ON leads (category, buyer_count, id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_leads_zip_buyer_count_id ON leads (zip, buyer_count, id)')
+        conn.commit()
+
+        # Normalized phone is the dedup key for ingestion; leads without a usable phone stay NULL
+        try:
+            conn.execute('SELECT phone_norm FROM leads LIMIT 1')
+        except sqlite3.OperationalError:
+            conn.execute('ALTER TABLE leads ADD COLUMN phone_norm TEXT')
+            # Earlier scrapes inserted duplicates; only the oldest row keeps the key
+            seen = set()
+            updates = []
+            for row in conn.execute('SELECT id, phone FROM leads ORDER BY id').fetchall():
+                phone_norm = normalize_phone(row['phone'])
+                if phone_norm in seen:
+                    phone_norm = None
+                seen.add(phone_norm)
+                updates.append((phone_norm, row['id']))
+            conn.executemany('UPDATE leads SET phone_norm = ? WHERE id = ?', updates)
+            conn.commit()
+        c.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_leads_phone_norm ON leads (phone_norm)')
+        conn.commit()
+
+        # Normalized city words, so buyer counts can be kept current per (zip, city) place
+        try:
+            conn.execute('SELECT city FROM leads LIMIT 1')
+        except sqlite3.OperationalError:
+            conn.execute('ALTER TABLE leads ADD COLUMN city TEXT')
+            rows = conn.execute('SELECT id, address FROM leads').fetchall()
+            conn.executemany('UPDATE leads SET city = ? WHERE id = ?',
+                             [(extract_city_from_address(row['address']), row['id']) for row in rows])
+            conn.commit()
+        c.execute('CREATE INDEX IF NOT EXISTS idx_leads_city_zip ON leads (city, zip)')
+        conn.commit()
+
+        init_lead_versions(conn)
+        conn.commit()
+
+        # Per-lead call history is read newest first
+        c.execute('CREATE INDEX IF NOT EXISTS idx_call_logs_lead_created ON call_logs (lead_id, created_at)')
+        init_call_log_search(conn)
+        conn.commit()
+
+        init_stats(conn)
+        conn.commit()
+
+        init_shared_state(conn)
+        conn.commit()
+
+        init_buyers(conn)
+        conn.commit()
+
+def init_lead_versions(conn):
+    """Stamp every lead write with a global, increasing change version.
+
+    Triggers bump lead_version.version on insert, on any update that changes a lead field,
+    and on delete (leaving a tombstone), so clients can ask for just what changed since
+    the version they last saw.
+    """
+    conn.execute('CREATE TABLE IF NOT EXISTS lead_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)')
+    conn.execute('CREATE TABLE IF NOT EXISTS lead_tombstones (id INTEGER PRIMARY KEY, version INTEGER NOT NULL)')
+    try:
+        conn.execute('SELECT version FROM leads LIMIT 1')
+    except sqlite3.OperationalError:
+        conn.execute('ALTER TABLE leads ADD COLUMN version INTEGER')
+        conn.execute('UPDATE leads SET version = id')
+    conn.execute('INSERT OR IGNORE INTO lead_version (id, version) SELECT 1, COALESCE(MAX(version), 0) FROM leads')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_leads_version ON leads (version)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_lead_tombstones_version ON lead_tombstones (version)')
+    changed = ' OR '.join(f"new.{field} IS NOT old.{field}" for field in LEAD_FIELDS if field != 'id')
+    # Recreated on every start so the field list tracks LEAD_FIELDS
+    conn.executescript(f'''
+        DROP TRIGGER IF EXISTS leads_version_au;
+        CREATE TRIGGER IF NOT EXISTS leads_version_ai AFTER INSERT ON leads BEGIN
+            UPDATE lead_version SET version = version + 1;
+            UPDATE leads SET version = (SELECT version FROM lead_version) WHERE id = new.id;
+            DELETE FROM lead_tombstones WHERE id = new.id;
+        END;
+        CREATE TRIGGER leads_version_au AFTER UPDATE ON leads
+        WHEN new.version IS old.version AND ({changed}) BEGIN
+            UPDATE lead_version SET version = version + 1;
+            UPDATE leads SET version = (SELECT version FROM lead_version) WHERE id = new.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS leads_version_ad AFTER DELETE ON leads BEGIN
+            UPDATE lead_version SET version = version + 1;
+            INSERT OR REPLACE INTO lead_tombstones (id, version) SELECT old.id, version FROM lead_version;
+        END;
+    ''')
+
+def lead_version(conn):
+    return conn.execute('SELECT version FROM lead_version').fetchone()[0]
+
+def init_call_log_search(conn):
+    """Full-text index over call transcripts, kept in sync with call_logs by triggers"""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'call_logs_fts'").fetchone()
+    try:
+        conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS call_logs_fts USING fts5(
+                            transcript, content='call_logs', content_rowid='id', tokenize='porter unicode61')''')
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Transcript search disabled, SQLite lacks FTS5: {e}")
+        return
+    # External-content FTS: deletes must hand back the old text so its terms can be removed
+    conn.executescript('''
+        CREATE TRIGGER IF NOT EXISTS call_logs_fts_ai AFTER INSERT ON call_logs BEGIN
+            INSERT INTO call_logs_fts (rowid, transcript) VALUES (new.id, new.transcript);
+        END;
+        CREATE TRIGGER IF NOT EXISTS call_logs_fts_ad AFTER DELETE ON call_logs BEGIN
+            INSERT INTO call_logs_fts (call_logs_fts, rowid, transcript) VALUES ('delete', old.id, old.transcript);
+        END;
+        CREATE TRIGGER IF NOT EXISTS call_logs_fts_au AFTER UPDATE OF transcript ON call_logs BEGIN
+            INSERT INTO call_logs_fts (call_logs_fts, rowid, transcript) VALUES ('delete', old.id, old.transcript);
+            INSERT INTO call_logs_fts (rowid, transcript) VALUES (new.id, new.transcript);
+        END;
+    ''')
+    if not exists:
+        # Index transcripts logged before search existed
+        conn.execute("INSERT INTO call_logs_fts (call_logs_fts) VALUES ('rebuild')")
+
+# Lead columns with a row per distinct value in lead_stats
+STATS_DIMENSIONS = ['status', 'category', 'zip']
+
+def init_stats(conn):
+    """Summary tables for GET /api/stats, kept current by triggers on leads and call_logs.
+
+    lead_stats holds a lead count and buyer_count total per (dimension, value) and
+    call_stats_daily a count per (day, call_status); NULLs are stored as ''. Reading
+    them costs one row per group however large the underlying tables get.
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'lead_stats'").fetchone()
+    conn.execute('''CREATE TABLE IF NOT EXISTS lead_stats (
+                        dimension TEXT, value TEXT, leads INTEGER NOT NULL, buyers INTEGER NOT NULL,
+                        PRIMARY KEY (dimension, value))''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS call_stats_daily (
+                        day TEXT, call_status TEXT, calls INTEGER NOT NULL,
+                        PRIMARY KEY (day, call_status))''')
+
+    def add(row):
+        return '\n'.join(f"""INSERT INTO lead_stats (dimension, value, leads, buyers)
+                VALUES ('{dim}', COALESCE({row}.{dim}, ''), 1, COALESCE({row}.buyer_count, 0))
+                ON CONFLICT (dimension, value) DO UPDATE SET leads = leads + 1, buyers = buyers + excluded.buyers;"""
+                         for dim in STATS_DIMENSIONS)
+
+    def remove(row):
+        return '\n'.join(f"""UPDATE lead_stats SET leads = leads - 1, buyers = buyers - COALESCE({row}.buyer_count, 0)
+                WHERE dimension = '{dim}' AND value = COALESCE({row}.{dim}, '');"""
+                          for dim in STATS_DIMENSIONS)
+
+    call_day = "COALESCE(date({row}.created_at), date('now'))"
+    conn.executescript(f'''
+        CREATE TRIGGER IF NOT EXISTS lead_stats_ai AFTER INSERT ON leads BEGIN
+            {add('new')}
+        END;
+        CREATE TRIGGER IF NOT EXISTS lead_stats_au AFTER UPDATE OF {', '.join(STATS_DIMENSIONS)}, buyer_count ON leads BEGIN
+            {remove('old')}
+            {add('new')}
+            DELETE FROM lead_stats WHERE leads = 0;
+        END;
+        CREATE TRIGGER IF NOT EXISTS lead_stats_ad AFTER DELETE ON leads BEGIN
+            {remove('old')}
+            DELETE FROM lead_stats WHERE leads = 0;
+        END;
+        CREATE TRIGGER IF NOT EXISTS call_stats_ai AFTER INSERT ON call_logs BEGIN
+            INSERT INTO call_stats_daily (day, call_status, calls)
+            VALUES ({call_day.format(row='new')}, COALESCE(new.call_status, ''), 1)
+            ON CONFLICT (day, call_status) DO UPDATE SET calls = calls + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS call_stats_au AFTER UPDATE OF call_status, created_at ON call_logs BEGIN
+            UPDATE call_stats_daily SET calls = calls - 1
+            WHERE day = {call_day.format(row='old')} AND call_status = COALESCE(old.call_status, '');
+            INSERT INTO call_stats_daily (day, call_status, calls)
+            VALUES ({call_day.format(row='new')}, COALESCE(new.call_status, ''), 1)
+            ON CONFLICT (day, call_status) DO UPDATE SET calls = calls + 1;
+            DELETE FROM call_stats_daily WHERE calls = 0;
+        END;
+        CREATE TRIGGER IF NOT EXISTS call_stats_ad AFTER DELETE ON call_logs BEGIN
+            UPDATE call_stats_daily SET calls = calls - 1
+            WHERE day = {call_day.format(row='old')} AND call_status = COALESCE(old.call_status, '');
+            DELETE FROM call_stats_daily WHERE calls = 0;
+        END;
+    ''')
+    if not exists:
+        rebuild_stats(conn)
+
+def rebuild_stats(conn):
+    """Recompute the summary tables from scratch (after bulk edits made with triggers off, or drift)"""
+    conn.execute('DELETE FROM lead_stats')
+    for dim in STATS_DIMENSIONS:
+        conn.execute(f"""INSERT INTO lead_stats (dimension, value, leads, buyers)
+                         SELECT '{dim}', COALESCE({dim}, ''), COUNT(*), COALESCE(SUM(buyer_count), 0)
+                         FROM leads GROUP BY COALESCE({dim}, '')""")
+    conn.execute('DELETE FROM call_stats_daily')
+    conn.execute("""INSERT INTO call_stats_daily (day, call_status, calls)
+                    SELECT COALESCE(date(created_at), date('now')), COALESCE(call_status, ''), COUNT(*)
+                    FROM call_logs GROUP BY 1, 2""")
+    conn.commit()
+
+BULK_CHUNK_SIZE = 500
+
+# Columns written by ingestion, in insert order
+INGEST_FIELDS = ['name', 'phone', 'category', 'address', 'website', 'status', 'buyer_count', 'zip', 'city', 'phone_norm']
+
+def init_shared_state(conn):
+    """Tables that let several worker processes see each other's jobs, campaigns and events.
+
+    shared_tasks holds the latest snapshot of each background job or campaign, written by
+    the process running it, plus a flag any process can set to ask for it to be cancelled.
+    event_log is an append-only feed of published events that every process tails.
+    rate_limits holds token buckets that every process draws from (the Twilio CPS cap).
+    """
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS shared_tasks (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            body TEXT NOT NULL,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_shared_tasks_updated ON shared_tasks (updated_at);
+        CREATE TABLE IF NOT EXISTS rate_limits (
+            name TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS event_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            data TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_event_log_created ON event_log (created_at);
+    ''')
+    # Tasks started with a dedup key record it, and the pid running them, so other processes can join them
+    try:
+        conn.execute('SELECT task_key FROM shared_tasks LIMIT 1')
+    except sqlite3.OperationalError:
+        conn.execute('ALTER TABLE shared_tasks ADD COLUMN task_key TEXT')
+        conn.execute('ALTER TABLE shared_tasks ADD COLUMN owner_pid INTEGER')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_shared_tasks_key ON shared_tasks (kind, task_key)')
+
+def save_shared_task(task_id, kind, body, key=None):
+    """Store the latest snapshot of a task; returns whether another process asked to cancel it"""
+    with get_db() as conn:
+        conn.execute('''
+            INSERT INTO shared_tasks (id, kind, body, updated_at, task_key, owner_pid) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET body = excluded.body, updated_at = excluded.updated_at
+        ''', (task_id, kind, json.dumps(body), time.time(), key, os.getpid()))
+        row = conn.execute('SELECT cancel_requested FROM shared_tasks WHERE id = ?', (task_id,)).fetchone()
+        conn.commit()
+    return bool(row['cancel_requested'])
+
+def load_shared_task(task_id, kind):
+    """A task snapshot written by any process, or None"""
+    with get_db() as conn:
+        row = conn.execute('SELECT body FROM shared_tasks WHERE id = ? AND kind = ?', (task_id, kind)).fetchone()
+    return json.loads(row['body']) if row else None
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def find_shared_task(kind, key, states=('queued', 'running')):
+    """Snapshot of a task with this dedup key that is in one of states and whose process is still alive, or None"""
+    with get_db() as conn:
+        rows = conn.execute('SELECT body, owner_pid FROM shared_tasks WHERE kind = ? AND task_key = ? ORDER BY updated_at DESC',
+                            (kind, key)).fetchall()
+    for row in rows:
+        body = json.loads(row['body'])
+        # A worker that died mid-task leaves its last snapshot behind
+        if body.get('state') in states and row['owner_pid'] and _process_alive(row['owner_pid']):
+            return body
+    return None
+
+def take_shared_token(name, rate, capacity):
+    """Take a token from a token bucket shared by every process; returns 0, or how long to wait before one is due"""
+    with get_db() as conn:
+        # IMMEDIATE so two processes can't both read the same balance
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute('SELECT tokens, updated_at FROM rate_limits WHERE name = ?', (name,)).fetchone()
+        now = time.time()
+        tokens = capacity if row is None else min(capacity, row['tokens'] + max(now - row['updated_at'], 0) * rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / rate
+        if not wait:
+            tokens -= 1
+        conn.execute('''INSERT INTO rate_limits (name, tokens, updated_at) VALUES (?, ?, ?)
+                        ON CONFLICT (name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at''',
+                     (name, tokens, now))
+        conn.commit()
+    return wait
+
+def request_shared_task_cancel(task_id, kind):
+    """Flag a task for cancellation by whichever process runs it; False if there is no such task"""
+    with get_db() as conn:
+        cur = conn.execute('UPDATE shared_tasks SET cancel_requested = 1 WHERE id = ? AND kind = ?', (task_id, kind))
+        conn.commit()
+    return cur.rowcount > 0
+
+def append_event(origin, event_type, data):
+    with get_db() as conn:
+        conn.execute('INSERT INTO event_log (origin, event_type, data, created_at) VALUES (?, ?, ?, ?)',
+                     (origin, event_type, data, time.time()))
+        conn.commit()
+
+def events_after(event_id, limit=500):
+    """(id, origin, event_type, data) rows of event_log newer than event_id, oldest first"""
+    with get_db() as conn:
+        return conn.execute('SELECT id, origin, event_type, data FROM event_log WHERE id > ? ORDER BY id LIMIT ?',
+                            (event_id, limit)).fetchall()
+
+def last_event_log_id():
+    with get_db() as conn:
+        return conn.execute('SELECT COALESCE(MAX(id), 0) FROM event_log').fetchone()[0]
+
+def prune_shared_state(task_max_age, event_max_age):
+    """Drop task snapshots and logged events older than the given ages in seconds"""
+    now = time.time()
+    with get_db() as conn:
+        conn.execute('DELETE FROM shared_tasks WHERE updated_at < ?', (now - task_max_age,))
+        conn.execute('DELETE FROM event_log WHERE created_at < ?', (now - event_max_age,))
+        conn.commit()
+
+def init_buyers(conn):
+    """Buyer signals mined from social media, kept so lead buyer counts can be updated incrementally.
+
+    buyers holds one row per distinct post, stamped with when it was last mined;
+    buyer_places indexes it by location token (zip or city word) and that time.
+    buyer_window remembers the recency cutoff buyer counts were last computed with.
+    """
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS buyers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            signal_key TEXT NOT NULL UNIQUE,
+            platform TEXT,
+            user_id TEXT,
+            post_content TEXT,
+            location_interest TEXT,
+            requirements TEXT,
+            budget TEXT,
+            posted_at TEXT,
+            first_seen REAL NOT NULL,
+            seen_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_buyers_seen_at ON buyers (seen_at);
+        CREATE TABLE IF NOT EXISTS buyer_places (
+            token TEXT NOT NULL,
+            seen_at REAL NOT NULL,
+            buyer_id INTEGER NOT NULL,
+            PRIMARY KEY (token, seen_at, buyer_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS buyer_window (id INTEGER PRIMARY KEY CHECK (id = 1), cutoff REAL NOT NULL);
+        INSERT OR IGNORE INTO buyer_window (id, cutoff) VALUES (1, 0);
+    ''')
+
+def upsert_leads(leads, chunk_size=BULK_CHUNK_SIZE):
+    """Insert or update leads keyed on normalized phone, one transaction per chunk.
+
+    Returns (inserted_ids, updated_ids). A re-ingested lead keeps its call status.
+    """
+    inserted_ids = []
+    updated_ids = []
+    for inserted, updated in upsert_lead_batches(leads, chunk_size):
+        inserted_ids.extend(inserted)
+        updated_ids.extend(updated)
+    return inserted_ids, updated_ids
+
+def upsert_lead_batches(leads, chunk_size=BULK_CHUNK_SIZE):
+    """upsert_leads for inputs too big to collect every id: yields (inserted_ids, updated_ids) per committed chunk"""
+    chunk = []
+    for lead in leads:
+        chunk.append(lead)
+        if len(chunk) >= chunk_size:
+            yield _upsert_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield _upsert_chunk(chunk)
+
+def _upsert_chunk(chunk):
+    inserted_ids = []
+    updated_ids = []
+    rows = []
+    unkeyed = []
+    for lead in chunk:
+        row = (lead['name'], lead['phone'], lead.get('category', ''), lead.get('address', ''),
+               lead.get('website', ''), lead.get('status', 'Not Called'), lead.get('buyer_count', 0),
+               extract_zip_from_address(lead.get('address')), extract_city_from_address(lead.get('address')),
+               normalize_phone(lead['phone']))
+        (rows if row[-1] else unkeyed).append(row)
+
+    columns = ', '.join(INGEST_FIELDS)
+    placeholders = ', '.join('?' for _ in INGEST_FIELDS)
+    with get_db() as conn:
+        keys = list(dict.fromkeys(row[-1] for row in rows))
+        existing = _ids_by_phone_norm(conn, keys)
+        conn.executemany(f'''INSERT INTO leads ({columns}) VALUES ({placeholders})
+                             ON CONFLICT (phone_norm) DO UPDATE SET
+                                 name = excluded.name, phone = excluded.phone, category = excluded.category,
+                                 address = excluded.address, website = excluded.website,
+                                 buyer_count = excluded.buyer_count, zip = excluded.zip, city = excluded.city''', rows)
+        for phone_norm, lead_id in _ids_by_phone_norm(conn, keys).items():
+            (updated_ids if phone_norm in existing else inserted_ids).append(lead_id)
+        # Without a phone there is nothing to dedup on, so these are always new rows
+        for row in unkeyed:
+            inserted_ids.append(conn.execute(f'INSERT INTO leads ({columns}) VALUES ({placeholders})', row).lastrowid)
+        conn.commit()
+    return inserted_ids, updated_ids
+
+def _ids_by_phone_norm(conn, keys):
+    if not keys:
+        return {}
+    found = conn.execute(f"SELECT phone_norm, id FROM leads WHERE phone_norm IN ({', '.join('?' for _ in keys)})", keys)
+    return {row['phone_norm']: row['id'] for row in found}
+
+def normalize_phone(phone):
+    """Reduce a phone number to its digits (dropping a US country code), or None if unusable"""
+    digits = ''.join(ch for ch in str(phone or '') if ch.isdigit())
+    if len(digits) == 11 and digits.startswith('1'):
+        digits = digits[1:]
+    return digits if len(digits) >= 7 else None
+
+def extract_zip_from_address(address):
+    """Extract zip code from an address string"""
+    if not address:
+        return None
+    # Simple implementation - would need to be more robust in production
+    parts = address.replace(',', ' ').split()
+    for part in parts:
+        if len(part) == 5 and part.isdigit():
+            return part
+    return None
+
+def extract_city_from_address(address):
+    """Normalized city words of an address ('100 Main St, Round Rock, TX' -> 'round rock'), or None"""
+    return ' '.join(parse_place(address)[1]) or None
@@ -0,0 +1,137 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import get_config
+
+class ResultCache:
+    """JSON results by key: an in-memory LRU in front of an on-disk SQLite store.
+
+    Used for scrape results (keyed by source, location and limit) and rendered TTS audio.
+    Entries expire after the TTL given when stored; the disk store is trimmed
+    least-recently-used first once it grows past max_bytes.
+    """
+
+    def __init__(self, path, memory_entries=256, max_bytes=50 * 1024 * 1024):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        with self._conn() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    source TEXT,
+                    expires_at REAL,
+                    accessed_at REAL,
+                    size INTEGER,
+                    payload TEXT
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed ON cache_entries (accessed_at)')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode = WAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._counters['memory_hits'] += 1
+                    # Decode per hit so callers can mutate results without corrupting the cache
+                    return json.loads(entry[1])
+                del self._memory[key]
+        with self._conn() as conn:
+            row = conn.execute('SELECT expires_at, payload FROM cache_entries WHERE key = ?', (key,)).fetchone()
+            if row is None or row[0] <= now:
+                if row is not None:
+                    conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+                with self._lock:
+                    self._counters['misses'] += 1
+                return None
+            conn.execute('UPDATE cache_entries SET accessed_at = ? WHERE key = ?', (now, key))
+        with self._lock:
+            self._counters['disk_hits'] += 1
+            self._remember(key, row[0], row[1])
+        return json.loads(row[1])
+
+    def put(self, key, source, value, ttl):
+        now = time.time()
+        expires_at = now + ttl
+        payload = json.dumps(value)
+        with self._conn() as conn:
+            conn.execute('INSERT OR REPLACE INTO cache_entries (key, source, expires_at, accessed_at, size, payload) VALUES (?, ?, ?, ?, ?, ?)',
+                         (key, source, expires_at, now, len(payload), payload))
+            self._trim_disk(conn, now)
+        with self._lock:
+            self._counters['stores'] += 1
+            self._remember(key, expires_at, payload)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        with self._conn() as conn:
+            conn.execute('DELETE FROM cache_entries')
+
+    def stats(self):
+        with self._conn() as conn:
+            entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries').fetchone()
+        with self._lock:
+            counters = dict(self._counters)
+            memory_entries = len(self._memory)
+        lookups = counters['memory_hits'] + counters['disk_hits'] + counters['misses']
+        hits = counters['memory_hits'] + counters['disk_hits']
+        return {
+            **counters,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'memory_entries': memory_entries,
+            'disk_entries': entries,
+            'disk_bytes': size,
+        }
+
+    def _remember(self, key, expires_at, payload):
+        # Caller holds self._lock
+        self._memory[key] = (expires_at, payload)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _trim_disk(self, conn, now):
+        conn.execute('DELETE FROM cache_entries WHERE expires_at <= ?', (now,))
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache_entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in conn.execute('SELECT key, size FROM cache_entries ORDER BY accessed_at').fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._counters['evictions'] += evicted
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_scrape_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            config = get_config()
+            _cache = ResultCache(config['SCRAPE_CACHE_PATH'], config['SCRAPE_CACHE_MEMORY_ENTRIES'],
+                                 config['SCRAPE_CACHE_MAX_BYTES'])
+        return _cache
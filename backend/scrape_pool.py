@@ -0,0 +1,107 @@
+"""Multi-location scrapes sharded across a pool of worker processes.
+
+Each location is a shard, scraped and matched in one of SCRAPE_PROCESSES processes, so
+the metros' MCP runs overlap and their matching runs on separate cores. The processes
+draw their MCP runs from one semaphore of SCRAPE_MCP_BUDGET slots (split between web
+workers under serve.py), so whichever shards are busiest use the whole budget. Single
+location scrapes, which run in the API process itself, draw from the same semaphore.
+Shards are handed back as they finish so the caller can ingest each one straight away.
+
+Pool processes are spawned on first use and kept for later jobs, along with their MCP
+sessions and scrape cache handles. Their timings appear in /metrics only as the
+shard's total, since each process keeps its own histograms.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from config import get_config
+
+_pool = None
+_pool_pid = None
+_budget = None
+_budget_pid = None
+_pool_lock = threading.Lock()
+
+def pool_shape():
+    """(processes, concurrent MCP runs shared between them) for this worker's share of the budget"""
+    config = get_config()
+    budget = max(config['SCRAPE_MCP_BUDGET'] // max(config['WEB_WORKERS'], 1), 1)
+    return max(min(config['SCRAPE_PROCESSES'], budget), 1), budget
+
+def _init_process(mcp_slots):
+    from scraper import share_mcp_slots
+    share_mcp_slots(mcp_slots)
+
+def _current_budget():
+    global _budget, _budget_pid
+    if _budget is None or _budget_pid != os.getpid():
+        _budget = multiprocessing.get_context('spawn').BoundedSemaphore(pool_shape()[1])
+        _budget_pid = os.getpid()
+    return _budget
+
+def get_mcp_budget():
+    """The semaphore every MCP run in this API process and its scrape pool acquires a slot from"""
+    with _pool_lock:
+        return _current_budget()
+
+def get_scrape_pool():
+    """The process pool for scrape shards (one per API process)"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            processes, _ = pool_shape()
+            # Spawned rather than forked: a fork would copy the API's threads' locks mid-use
+            context = multiprocessing.get_context('spawn')
+            _pool = ProcessPoolExecutor(processes, mp_context=context, initializer=_init_process,
+                                        initargs=(_current_budget(),))
+            _pool_pid = os.getpid()
+        return _pool
+
+def _discard_pool(pool):
+    """Drop a pool whose process died so the next job starts a fresh one.
+
+    The process may have died holding MCP slots, so the budget starts afresh too; runs
+    holding slots of the old one release them there.
+    """
+    global _pool, _budget
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+            _budget = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def scrape_shard(location, limit, force_refresh=False):
+    """Scrape and match one location (runs in a pool process)"""
+    from scraper import scrape_real_estate_leads
+    started = time.perf_counter()
+    sources = {}
+    buyers = []
+
+    def on_progress(source, state, **details):
+        sources[source] = {'state': state, **details}
+
+    agents = scrape_real_estate_leads(location=location, limit=limit, on_progress=on_progress,
+                                      force_refresh=force_refresh, on_buyers=buyers.extend)
+    return {'agents': agents, 'buyers': buyers, 'sources': sources, 'seconds': time.perf_counter() - started}
+
+def scrape_shards(locations, limit, force_refresh=False):
+    """Yield (location, shard result, error) for each location as soon as its shard finishes"""
+    pool = get_scrape_pool()
+    try:
+        futures = {pool.submit(scrape_shard, location, limit, force_refresh): location for location in locations}
+    except BrokenProcessPool:
+        # A process died after the last job; start over with a fresh pool
+        _discard_pool(pool)
+        pool = get_scrape_pool()
+        futures = {pool.submit(scrape_shard, location, limit, force_refresh): location for location in locations}
+    for future in as_completed(futures):
+        try:
+            yield futures[future], future.result(), None
+        except BrokenProcessPool as e:
+            _discard_pool(pool)
+            yield futures[future], None, e
+        except Exception as e:
+            yield futures[future], None, e
@@ -1,15 +1,87 @@
 import asyncio
+import codecs
+import functools
+import hashlib
 import subprocess
 import json
 import os
+import signal
 import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from itertools import islice
 from config import get_config
+from scrape_cache import get_scrape_cache
+from json_stream import JSONRecordStream, iter_json_records
+from matching import BuyerIndex, get_zip_centroids, parse_place
+from mcp_session import MCPSessionManager, MCPSessionError, MCPTimeout, MCPToolError, parse_command
+from metrics import record, span, timed
 import logging
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# The MCP client and server are command lines this process executes, so they come from the
+# environment only, never from the runtime config that POST /api/config writes.
+# The one-shot client runs per prompt when no persistent session is used; --config/--prompt are appended
+MCP_CLIENT_COMMAND = os.getenv('MCP_CLIENT_COMMAND', 'npx @brightdata/mcp-client')
+MCP_SERVER_COMMAND = os.getenv('MCP_SERVER_COMMAND', 'npx @brightdata/mcp')
+
+# Caps how many MCP runs are in flight across all concurrent scrapes: in the API process
+# the scrape pool's SCRAPE_MCP_BUDGET semaphore, in pool processes the one they were handed
+_mcp_slots = None
+_mcp_slots_lock = threading.Lock()
+
+def _get_mcp_slots():
+    with _mcp_slots_lock:
+        if _mcp_slots is not None:
+            return _mcp_slots
+    from scrape_pool import get_mcp_budget
+    return get_mcp_budget()
+
+def share_mcp_slots(semaphore):
+    """Limit MCP runs with a semaphore shared with the API process (scrape pool processes)"""
+    global _mcp_slots
+    with _mcp_slots_lock:
+        _mcp_slots = semaphore
+
+def source_timeout(source):
+    """Timeout in seconds for one MCP run against the given source"""
+    config = get_config()
+    return config['MCP_SOURCE_TIMEOUTS'].get(source, config['MCP_TIMEOUT_SECONDS'])
+
+def fan_out(tasks):
+    """Run {name: callable} concurrently and return {name: result}.
+
+    A task that raises yields an empty list so one failing source never sinks the rest.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix='scrape') as pool:
+        futures = {name: pool.submit(fn) for name, fn in tasks.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logger.error(f"Scrape source {name} failed: {str(e)}")
+                results[name] = []
+    return results
+
+def mcp_server_env(api_token, web_unlocker_zone=None, browser_auth=None):
+    """Environment the Bright Data MCP server needs"""
+    env = {"API_TOKEN": api_token}
+    
+    if web_unlocker_zone:
+        env["WEB_UNLOCKER_ZONE"] = web_unlocker_zone
+    
+    if browser_auth:
+        env["BROWSER_AUTH"] = browser_auth
+    
+    return env
+
 def create_mcp_config(api_token, web_unlocker_zone=None, browser_auth=None):
     """Create a temporary MCP configuration file with Bright Data settings"""
     config = {
@@ -17,94 +89,195 @@ def create_mcp_config(api_token, web_unlocker_zone=None, browser_auth=None):
             "Bright Data": {
                 "command": "npx",
                 "args": ["@brightdata/mcp"],
-                "env": {
-                    "API_TOKEN": api_token
-                }
+                "env": mcp_server_env(api_token, web_unlocker_zone, browser_auth)
             }
         }
     }
     
-    if web_unlocker_zone:
-        config["mcpServers"]["Bright Data"]["env"]["WEB_UNLOCKER_ZONE"] = web_unlocker_zone
-    
-    if browser_auth:
-        config["mcpServers"]["Bright Data"]["env"]["BROWSER_AUTH"] = browser_auth
-    
     temp_config = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False)
     json.dump(config, temp_config)
     temp_config.close()
     
     return temp_config.name
 
-def run_mcp_scraper(prompt, config_path):
-    """Run a Bright Data MCP scraping task using the MCP client"""
+def stream_mcp_scraper(prompt, config_path, timeout=None):
+    """Run a Bright Data MCP scraping task using the MCP client, yielding records as it prints them
+
+    The client is killed (with any node children) if it runs longer than timeout seconds,
+    or as soon as the caller stops iterating.
+    """
+    cmd = parse_command(MCP_CLIENT_COMMAND) + ["--config", config_path, "--prompt", prompt]
+    proc = None
+    timer = None
+    timed_out = threading.Event()
+    stderr_tail = deque(maxlen=50)
+    slots = _get_mcp_slots()
+    with span('mcp_slot_wait'):
+        slots.acquire()
+    started = time.perf_counter()
+    outcome = 'ok'
     try:
-        cmd = ["npx", "@brightdata/mcp-client", "--config", config_path, "--prompt", prompt]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        # Own process group so a timeout can kill npx and the node processes it spawned
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+        threading.Thread(target=_drain_lines, args=(proc.stderr, stderr_tail), daemon=True).start()
+        if timeout:
+            timer = threading.Timer(timeout, lambda: (timed_out.set(), _kill_group(proc)))
+            timer.daemon = True
+            timer.start()
         
-        if result.returncode != 0:
-            logger.error(f"MCP client error: {result.stderr}")
-            return []
+        # Parse records incrementally so callers can start on them before the client exits
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        stream = JSONRecordStream(max_record_bytes=get_config()['MCP_MAX_RECORD_BYTES'])
+        while True:
+            chunk = proc.stdout.read1(65536)
+            if not chunk:
+                break
+            yield from stream.feed(decoder.decode(chunk))
+        yield from stream.feed(decoder.decode(b'', final=True))
+        stream.close()
+        proc.wait()
         
-        # Parse the output to extract structured data
-        try:
-            # The output might contain logs and other information before the JSON
-            # Look for a valid JSON object in the output
-            output_lines = result.stdout.strip().split('\n')
-            json_data = None
-            
-            for line in output_lines:
-                line = line.strip()
-                if line.startswith('{') and line.endswith('}'):
-                    try:
-                        json_data = json.loads(line)
-                        break
-                    except json.JSONDecodeError:
-                        continue
-            
-            if json_data and 'agents' in json_data:
-                return json_data['agents']
-            elif json_data:
-                return [json_data]
-            else:
-                logger.warning("No valid JSON data found in MCP output")
-                return []
-                
-        except json.JSONDecodeError:
-            logger.error(f"Failed to parse MCP output: {result.stdout}")
-            return []
+        if timed_out.is_set():
+            outcome = 'timeout'
+            logger.error(f"MCP client timed out after {timeout}s")
+        elif proc.returncode != 0:
+            outcome = 'error'
+            logger.error(f"MCP client error: {''.join(stderr_tail)}")
             
     except Exception as e:
+        outcome = 'error'
         logger.error(f"Error running MCP client: {str(e)}")
-        return []
     finally:
+        if timer:
+            timer.cancel()
+        if proc is not None and proc.poll() is None:
+            _kill_group(proc)
+            proc.wait()
+        record('mcp_oneshot', time.perf_counter() - started, outcome, prompt=prompt[:80])
+        slots.release()
         # Clean up the temporary config file
         if os.path.exists(config_path):
             os.unlink(config_path)
 
+def run_mcp_scraper(prompt, config_path, timeout=None):
+    """Run a Bright Data MCP scraping task using the MCP client"""
+    return list(stream_mcp_scraper(prompt, config_path, timeout))
+
+def _kill_group(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+def _drain_lines(pipe, tail):
+    # Keep only the last lines of stderr for error reporting; an undrained pipe would block the client
+    for line in pipe:
+        tail.append(line.decode('utf-8', errors='replace'))
+
+def collect(records, limit=None):
+    """Take up to limit records from a record stream, then close it (stopping its client).
+
+    Records are parsed as the client prints them, which is what lets a scraper stop the
+    client as soon as it has enough. That is all the streaming buys: each source's records
+    are collected into a list here, because the scrape cache stores whole results and
+    matching needs every agent and buyer, so nothing is ingested before a source finishes.
+    """
+    with closing(records):
+        return list(islice(records, limit))
+
+# One MCP server process shared by every prompt in this worker
+_mcp_sessions = MCPSessionManager()
+# (server command, tool) pairs found not to offer the prompt tool; those go straight to one-shot
+_missing_prompt_tools = set()
+
+def stream_mcp_prompt(prompt, source):
+    """Yield the records for one scrape prompt, from the persistent MCP session unless
+    configured for one-shot clients"""
+    config = get_config()
+    timeout = source_timeout(source)
+    tool_key = (MCP_SERVER_COMMAND, config['MCP_PROMPT_TOOL'])
+    if config['MCP_SESSION_MODE'] == 'persistent' and tool_key not in _missing_prompt_tools:
+        try:
+            # Released into the semaphore it came from, even if the budget is replaced meanwhile
+            slots = _get_mcp_slots()
+            with span('mcp_slot_wait'):
+                slots.acquire()
+            try:
+                env = mcp_server_env(config['BRIGHTDATA_API_TOKEN'], config['BRIGHTDATA_WEB_UNLOCKER_ZONE'],
+                                     config.get('BRIGHTDATA_BROWSER_AUTH', ''))
+                session = _mcp_sessions.get_session(parse_command(MCP_SERVER_COMMAND), env)
+                if config['MCP_PROMPT_TOOL'] not in session.tools:
+                    # Don't keep a server alive (or restart it per prompt) when it can't answer prompts
+                    _missing_prompt_tools.add(tool_key)
+                    _mcp_sessions.close()
+                    raise MCPSessionError(f"MCP server has no {config['MCP_PROMPT_TOOL']} tool "
+                                          f"(it offers {', '.join(sorted(session.tools))})")
+                with span('mcp_session', source=source) as outcome:
+                    try:
+                        output = session.call_tool(config['MCP_PROMPT_TOOL'], {'prompt': prompt}, timeout=timeout)
+                    except MCPTimeout:
+                        outcome['outcome'] = 'timeout'
+                        raise
+            finally:
+                slots.release()
+        except (MCPTimeout, MCPToolError) as e:
+            logger.error(f"MCP prompt for {source} failed: {str(e)}")
+            return
+        except MCPSessionError as e:
+            logger.warning(f"{str(e)}; falling back to the one-shot MCP client")
+        else:
+            yield from iter_json_records([output], config['MCP_MAX_RECORD_BYTES'])
+            return
+    
+    config_path = create_mcp_config(config['BRIGHTDATA_API_TOKEN'], config['BRIGHTDATA_WEB_UNLOCKER_ZONE'],
+                                    config.get('BRIGHTDATA_BROWSER_AUTH', ''))
+    yield from stream_mcp_scraper(prompt, config_path, timeout=timeout)
+
+def cached_scrape(source):
+    """Serve a scrape function's results from the scrape cache for its source's TTL.
+
+    The wrapped function gains a force_refresh keyword that skips the lookup (but still
+    stores the fresh result). Dummy-mode and empty results are never cached.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(location="Austin, TX", limit=30, force_refresh=False):
+            config = get_config()
+            if not config['BRIGHTDATA_API_TOKEN']:
+                return fn(location, limit)
+            cache = get_scrape_cache()
+            key = f"{source}|{normalize_location(location)}|{limit}"
+            if not force_refresh:
+                cached = cache.get(key)
+                if cached is not None:
+                    return cached
+            results = fn(location, limit)
+            if results:
+                ttl = config['SCRAPE_CACHE_TTLS'].get(source, config['SCRAPE_CACHE_TTL_SECONDS'])
+                cache.put(key, source, results, ttl)
+            return results
+        return wrapper
+    return decorator
+
+@cached_scrape('realtor')
 def scrape_realtor_agents(location="Austin, TX", limit=30):
     """Scrape real estate agents from Realtor.com using Bright Data MCP"""
     config = get_config()
     api_token = config['BRIGHTDATA_API_TOKEN']
-    web_unlocker_zone = config['BRIGHTDATA_WEB_UNLOCKER_ZONE']
-    browser_auth = config.get('BRIGHTDATA_BROWSER_AUTH', '')
     
     if not api_token:
         logger.warning("No Bright Data API token provided. Using dummy data.")
-        return generate_dummy_agents(location, limit)
-    
-    # Create MCP config file
-    config_path = create_mcp_config(api_token, web_unlocker_zone, browser_auth)
+        return generate_dummy_agents(location, limit, 'realtor')
     
     # Craft the prompt for agent extraction
     prompt = f"Extract data for {limit} real estate agents in {location} from Realtor.com. For each agent, get their name, phone number, brokerage name, address, and website if available. Return as structured JSON."
     
     # Run the MCP scraper
-    agents = run_mcp_scraper(prompt, config_path)
+    agents = collect(stream_mcp_prompt(prompt, 'realtor'), limit)
     
     # Process and format the results
     formatted_agents = []
-    for agent in agents[:limit]:
+    for agent in agents:
         formatted_agents.append({
             'name': agent.get('name', 'Unknown Agent'),
             'phone': agent.get('phone', 'N/A'),
@@ -115,29 +288,25 @@ def scrape_realtor_agents(location="Austin, TX", limit=30):
     
     return formatted_agents
 
+@cached_scrape('zillow')
 def scrape_zillow_agents(location="Austin, TX", limit=30):
     """Scrape real estate agents from Zillow using Bright Data MCP"""
     config = get_config()
     api_token = config['BRIGHTDATA_API_TOKEN']
-    web_unlocker_zone = config['BRIGHTDATA_WEB_UNLOCKER_ZONE']
-    browser_auth = config.get('BRIGHTDATA_BROWSER_AUTH', '')
     
     if not api_token:
         logger.warning("No Bright Data API token provided. Using dummy data.")
-        return generate_dummy_agents(location, limit)
-    
-    # Create MCP config file
-    config_path = create_mcp_config(api_token, web_unlocker_zone, browser_auth)
+        return generate_dummy_agents(location, limit, 'zillow')
     
     # Craft the prompt for agent extraction
     prompt = f"Extract data for {limit} real estate agents in {location} from Zillow.com. For each agent, get their name, phone number, brokerage name, address, and website if available. Return as structured JSON."
     
     # Run the MCP scraper
-    agents = run_mcp_scraper(prompt, config_path)
+    agents = collect(stream_mcp_prompt(prompt, 'zillow'), limit)
     
     # Process and format the results
     formatted_agents = []
-    for agent in agents[:limit]:
+    for agent in agents:
         formatted_agents.append({
             'name': agent.get('name', 'Unknown Agent'),
             'phone': agent.get('phone', 'N/A'),
@@ -148,44 +317,41 @@ def scrape_zillow_agents(location="Austin, TX", limit=30):
     
     return formatted_agents
 
+@cached_scrape('social')
 def mine_social_media_for_buyers(location="Austin, TX", limit=20):
     """Mine social media for buyer intent signals using Bright Data MCP"""
     config = get_config()
     api_token = config['BRIGHTDATA_API_TOKEN']
-    web_unlocker_zone = config['BRIGHTDATA_WEB_UNLOCKER_ZONE']
-    browser_auth = config.get('BRIGHTDATA_BROWSER_AUTH', '')
     
     if not api_token:
         logger.warning("No Bright Data API token provided. Using dummy data.")
         return generate_dummy_buyers(location, limit)
     
-    # Create MCP config file
-    config_path = create_mcp_config(api_token, web_unlocker_zone, browser_auth)
-    
     # Craft prompts for different platforms
     platforms = [
         {
             "name": "Reddit",
+            "source": "reddit",
             "prompt": f"Find recent posts on Reddit where people are talking about moving to {location} or looking for housing in {location}. Extract their requirements, budget if mentioned, and any other relevant details. Return as structured JSON."
         },
         {
             "name": "Twitter",
+            "source": "twitter",
             "prompt": f"Find recent tweets where people mention moving to {location}, looking for houses in {location}, or needing a real estate agent in {location}. Return as structured JSON."
         },
         {
             "name": "Facebook Groups",
+            "source": "facebook",
             "prompt": f"Find housing or real estate focused Facebook groups for {location} and extract recent posts from people looking to buy or rent. Return as structured JSON."
         }
     ]
     
+    # Query every platform at once; wall time is the slowest platform, not the sum
+    results = fan_out({platform["source"]: (lambda platform=platform: collect(stream_mcp_prompt(platform["prompt"], platform["source"]), limit))
+                       for platform in platforms})
     all_buyers = []
     for platform in platforms:
-        # Run the MCP scraper for each platform
-        buyers = run_mcp_scraper(platform["prompt"], config_path)
-        all_buyers.extend(buyers)
-        
-        # Recreate config file for each platform
-        config_path = create_mcp_config(api_token, web_unlocker_zone, browser_auth)
+        all_buyers.extend(results[platform["source"]])
     
     # Process and format the results
     formatted_buyers = []
@@ -202,19 +368,30 @@ def mine_social_media_for_buyers(location="Austin, TX", limit=20):
     
     return formatted_buyers
 
+@timed('match_buyers_to_agents')
 def match_buyers_to_agents(buyers, agents, location="Austin, TX"):
-    """Match potential buyers with suitable real estate agents based on location and requirements"""
+    """Match potential buyers with suitable real estate agents based on location and requirements
+
+    A buyer matches an agent whose zip (or a zip within MATCH_RADIUS_MILES, when a zip-centroid
+    table is available) or whose city appears in the buyer's location interest.
+    """
+    config = get_config()
+    centroids = get_zip_centroids(config['ZIP_CENTROIDS_PATH'])
+    radius = config['MATCH_RADIUS_MILES']
+    index = BuyerIndex(buyers)
+    default_place = parse_place(location)
     matches = []
     
     for agent in agents:
-        # Extract zip code from agent address if available
-        agent_zip = extract_zip_from_address(agent['address']) or location
+        # Agents whose address has no usable zip or city are assumed to work the scraped location
+        agent_zip, city_tokens = parse_place(agent['address'])
+        if not agent_zip and not city_tokens:
+            agent_zip, city_tokens = default_place
         
-        matched_buyers = []
-        for buyer in buyers:
-            # Check if buyer's location interest matches agent's area
-            if location_match(buyer['location_interest'], agent_zip):
-                matched_buyers.append(buyer)
+        zip_codes = ()
+        if agent_zip:
+            zip_codes = centroids.within(agent_zip, radius) if centroids and radius else (agent_zip,)
+        matched_buyers = index.match(zip_codes, city_tokens)
         
         if matched_buyers:
             matches.append({
@@ -237,20 +414,18 @@ def extract_zip_from_address(address):
             return part
     return None
 
-def location_match(buyer_location, agent_location):
-    """Check if buyer and agent locations match"""
-    # Simple implementation - in production would use more sophisticated geo-matching
-    return buyer_location.lower() in agent_location.lower() or agent_location.lower() in buyer_location.lower()
-
-def generate_dummy_agents(location="Austin, TX", limit=30):
+def generate_dummy_agents(location="Austin, TX", limit=30, source='realtor'):
     """Generate dummy agent data when API key is not available"""
     dummy_agents = []
     brokerages = ["Century 21", "RE/MAX", "Keller Williams", "Coldwell Banker", "Sotheby's"]
+    # Leads are keyed on phone, so each source and location gets its own numbers (stable across re-scrapes)
+    seed = int(hashlib.sha1(f"{source}|{normalize_location(location)}".encode('utf-8')).hexdigest(), 16)
+    area_code, first_line = 200 + seed % 800, (seed // 800) % 10000
     
     for i in range(limit):
         dummy_agents.append({
             'name': f"Agent Smith {i+1}",
-            'phone': f"512-555-{1000+i}",
+            'phone': f"{area_code}-555-{(first_line + i) % 10000:04d}",
             'category': 'Real Estate Agent',
             'address': f"{100+i} Main St, {location}",
             'website': f"https://agent{i+1}.realtor.example.com"
@@ -286,17 +461,42 @@ def generate_dummy_buyers(location="Austin, TX", limit=20):
     
     return dummy_buyers
 
-def scrape_real_estate_leads(location="Austin, TX", limit=30):
-    """Main function to scrape real estate agents and match with potential buyers"""
-    # Get agents from multiple sources
-    realtor_agents = scrape_realtor_agents(location, limit//2)
-    zillow_agents = scrape_zillow_agents(location, limit//2)
+def normalize_location(location):
+    """Canonical form of a location string, e.g. ' austin,  TX' -> 'austin, tx'"""
+    return ' '.join(location.lower().replace(',', ', ').split()).strip(', ')
+
+def _track(on_progress, source, fn, *args):
+    """Run one scrape step, reporting its start and result count to on_progress"""
+    if on_progress:
+        on_progress(source, 'running')
+    try:
+        results = fn(*args)
+    except Exception as e:
+        if on_progress:
+            on_progress(source, 'failed', error=str(e))
+        raise
+    if on_progress:
+        on_progress(source, 'done', count=len(results))
+    return results
+
+def scrape_real_estate_leads(location="Austin, TX", limit=30, on_progress=None, force_refresh=False, on_buyers=None):
+    """Main function to scrape real estate agents and match with potential buyers
+
+    on_progress(source, state, **details) is called as each source starts and finishes.
+    force_refresh bypasses the scrape cache. on_buyers(buyers) receives every buyer mined.
+    """
+    # Get agents from multiple sources and mine social media for buyer intent signals, all at once
+    results = fan_out({
+        'realtor': lambda: _track(on_progress, 'realtor', scrape_realtor_agents, location, limit//2, force_refresh),
+        'zillow': lambda: _track(on_progress, 'zillow', scrape_zillow_agents, location, limit//2, force_refresh),
+        'social': lambda: _track(on_progress, 'social', mine_social_media_for_buyers, location, limit, force_refresh),
+    })
     
     # Combine agents from different sources
-    all_agents = realtor_agents + zillow_agents
-    
-    # Mine social media for buyer intent signals
-    buyers = mine_social_media_for_buyers(location, limit)
+    all_agents = results['realtor'] + results['zillow']
+    buyers = results['social']
+    if on_buyers:
+        on_buyers(buyers)
     
     # Match buyers with agents
     matches = match_buyers_to_agents(buyers, all_agents, location)
@@ -310,8 +510,9 @@ def scrape_real_estate_leads(location="Austin, TX", limit=30):
     
     # If we don't have enough matches, add remaining agents
     if len(enhanced_agents) < limit:
+        matched = {id(match['agent']) for match in matches}
         for agent in all_agents:
-            if agent not in [a for a in enhanced_agents]:
+            if id(agent) not in matched:
                 agent['buyer_count'] = 0
                 enhanced_agents.append(agent)
                 if len(enhanced_agents) >= limit:
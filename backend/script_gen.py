@@ -0,0 +1,115 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from config import get_config
+from dialer import build_call_script
+from scrape_cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TEMPLATE = (
+    "Write a friendly two or three sentence cold-call opener to a real estate agent named {first_name}. "
+    "You are Ava from Home IQ. Say we've tracked {buyer_count} qualified buyers searching in {area} right now "
+    "and offer to send them the list. Reply with the spoken words only."
+)
+
+_script_cache = None
+_script_cache_lock = threading.Lock()
+_llm_slots = None
+_llm_slots_lock = threading.Lock()
+# Prompts currently being generated, so concurrent campaigns share one LLM request
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def get_script_cache():
+    global _script_cache
+    with _script_cache_lock:
+        if _script_cache is None:
+            config = get_config()
+            _script_cache = ResultCache(config['SCRIPT_CACHE_PATH'], max_bytes=config['SCRIPT_CACHE_MAX_BYTES'])
+        return _script_cache
+
+def _get_llm_slots():
+    global _llm_slots
+    with _llm_slots_lock:
+        if _llm_slots is None:
+            _llm_slots = threading.BoundedSemaphore(get_config()['LLM_CONCURRENCY'])
+        return _llm_slots
+
+def script_inputs(lead):
+    """The lead fields a pitch depends on; leads with equal inputs get the same script"""
+    first_name = lead['name'].split()[0] if lead['name'] else "there"
+    return first_name, lead['buyer_count'] or 10, lead['zip'] or "your area"
+
+def script_prompt(lead):
+    first_name, buyer_count, area = script_inputs(lead)
+    return PROMPT_TEMPLATE.format(first_name=first_name, buyer_count=buyer_count, area=area)
+
+def prompt_key(prompt, config):
+    return hashlib.sha256(f"{config['LLM_MODEL']}\0{prompt}".encode('utf-8')).hexdigest()
+
+def generate_scripts(leads):
+    """Personalized script per lead id.
+
+    Leads are grouped by their template inputs so each distinct prompt is sent once;
+    cached prompts skip the LLM, the rest run concurrently (at most LLM_CONCURRENCY at a
+    time process-wide), and any the LLM fails on fall back to the template script.
+    """
+    config = get_config()
+    cache = get_script_cache()
+    groups = {}
+    for lead in leads:
+        groups.setdefault(script_prompt(lead), []).append(lead)
+    scripts = {}
+    missing = []
+    for prompt in groups:
+        key = prompt_key(prompt, config)
+        cached = cache.get(key)
+        if cached:
+            scripts[prompt] = cached
+        else:
+            missing.append((key, prompt))
+    if missing:
+        workers = min(config['LLM_CONCURRENCY'], len(missing))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='llm') as pool:
+            for (key, prompt), script in zip(missing, pool.map(lambda item: _generate_once(*item, config), missing)):
+                if script:
+                    scripts[prompt] = script
+    return {lead['id']: scripts.get(prompt) or build_call_script(lead)
+            for prompt, group in groups.items() for lead in group}
+
+def _generate_once(key, prompt, config):
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+    if not owner:
+        return future.result()
+    try:
+        # Waiters are released before anything else can fail
+        try:
+            script = _generate(prompt)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(script)
+        if script:
+            try:
+                get_script_cache().put(key, 'llm', script, config['SCRIPT_CACHE_TTL_SECONDS'])
+            except Exception as e:
+                logger.error(f"Caching a generated script failed: {str(e)}")
+        return script
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+def _generate(prompt):
+    from voice import get_llm_response
+    with _get_llm_slots():
+        try:
+            return (get_llm_response(prompt) or '').strip() or None
+        except Exception as e:
+            logger.error(f"LLM script generation failed: {str(e)}")
+            return None
@@ -0,0 +1,128 @@
+"""Production server: pre-forked worker processes sharing one listening socket.
+
+The parent builds the app (setting up the database once), binds the port and forks
+WEB_WORKERS workers, which inherit the imported code copy-on-write. Each worker serves
+connections on its own threads and lets at most WEB_THREADS requests into the app at
+once; server-sent event streams don't hold a slot while they wait. The parent restarts
+workers that die and stops them all on SIGTERM or Ctrl-C. Vendor SDKs (Twilio, the MCP
+client, ...) are imported by each worker on first use, not up front.
+
+Scrape jobs, call campaigns and events run in the worker that started them; with more
+than one worker they are shared through the database (see models.init_shared_state).
+/metrics reports on whichever worker answers.
+
+Usage: WEB_WORKERS=4 WEB_THREADS=8 python serve.py
+"""
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from werkzeug.serving import make_server
+from app import create_app
+from buyers import start_buyer_refresh
+from config import get_config
+from models import close_db
+
+logger = logging.getLogger('serve')
+
+# How long a stopping worker waits for requests already in the app to finish
+SHUTDOWN_GRACE_SECONDS = 30
+
+class ConcurrencyLimit:
+    """WSGI middleware that lets at most `limit` requests into the app at once.
+
+    A slot is held while the app builds its response, not while a streamed body is
+    sent, so long-lived event streams don't starve ordinary requests.
+    """
+
+    def __init__(self, app, limit):
+        self.app = app
+        self.limit = limit
+        self._slots = threading.BoundedSemaphore(limit)
+
+    def __call__(self, environ, start_response):
+        with self._slots:
+            return self.app(environ, start_response)
+
+    def drain(self, timeout):
+        """Wait until no request is inside the app, or timeout seconds pass"""
+        deadline = time.monotonic() + timeout
+        for _ in range(self.limit):
+            if not self._slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                return False
+        return True
+
+def run_worker(server, limit):
+    """Serve until SIGTERM/SIGINT, then let in-flight requests finish; never returns"""
+    start_buyer_refresh()
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever to notice, so it can't run on this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    server.serve_forever()
+    if not limit.drain(SHUTDOWN_GRACE_SECONDS):
+        logger.warning(f"Worker {os.getpid()} stopping with requests still running")
+    sys.exit(0)
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(process)d %(name)s %(levelname)s %(message)s')
+    config = get_config()
+    # Background threads start in each worker: a fork would leave the parent's behind
+    app = create_app(background=False)
+    # Workers open their own connections; don't hand them one mid-use by the parent
+    close_db()
+    limit = ConcurrencyLimit(app, config['WEB_THREADS'])
+    server = make_server(config['WEB_HOST'], config['WEB_PORT'], limit, threaded=True)
+    workers = config['WEB_WORKERS']
+    logger.info(f"Listening on http://{config['WEB_HOST']}:{server.server_port} with "
+                f"{workers} worker(s) x {config['WEB_THREADS']} threads")
+
+    if workers <= 1 or not hasattr(os, 'fork'):
+        if workers > 1:
+            logger.warning('This platform cannot fork; running a single worker')
+        run_worker(server, limit)
+
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            run_worker(server, limit)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        logger.warning(f"Worker {pid} exited with status {status}; restarting")
+        # Don't spin if workers die as soon as they start
+        if time.monotonic() - started < 1:
+            time.sleep(1)
+        if not stopping:
+            spawn()
+    server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -1,48 +1,225 @@
-import os
+import hashlib
+import threading
+import time
+from calendar import timegm
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
 import requests
+from requests.adapters import HTTPAdapter
+from twilio.http.http_client import TwilioHttpClient
 from twilio.rest import Client
+from config import get_config
+from metrics import span, timed
+from scrape_cache import ResultCache
 
-twilio_sid = os.getenv('TWILIO_ACCOUNT_SID')
-twilio_token = os.getenv('TWILIO_AUTH_TOKEN')
-twilio_number = os.getenv('TWILIO_PHONE_NUMBER')
-elevenlabs_api_key = os.getenv('ELEVENLABS_API_KEY')
-elevenlabs_agent_id = os.getenv('ELEVENLABS_AGENT_ID')
-llm_api_key = os.getenv('LLM_API_KEY')
+# Credentials are read from the cached runtime config on each call, so keys saved
+# from the dashboard take effect without a restart
 
-# Placeholder for LLM response (replace with Gemini/GPT-4 API call)
+class ClientRegistry:
+    """Long-lived vendor clients, shared by every call and rebuilt only when their settings change.
+
+    Each client is keyed by the config values it was built from; keep-alive pools survive
+    across calls, so a campaign pays for one TLS handshake per connection, not per request.
+    A replaced client is closed only once requests already using it have timed out.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, fields, build):
+        config = get_config()
+        key = tuple(config[field] for field in fields)
+        entry = self._clients.get(name)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        with self._lock:
+            entry = self._clients.get(name)
+            if entry is not None and entry[0] == key:
+                return entry[1]
+            client = build(config)
+            self._clients[name] = (key, client)
+        if entry is not None:
+            # Other threads may be mid-request on the old client, so let it drain first
+            timer = threading.Timer(_drain_seconds(config), _close_client, (entry[1],))
+            timer.daemon = True
+            timer.start()
+        return client
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for _, client in clients:
+            _close_client(client)
+
+def _drain_seconds(config):
+    """Longest a request started on a client can still be running"""
+    return config['HTTP_CONNECT_TIMEOUT'] + max(config['HTTP_READ_TIMEOUT'], config['LLM_TIMEOUT_SECONDS'])
+
+def _close_client(client):
+    session = getattr(getattr(client, 'http_client', None), 'session', None) or client
+    if hasattr(session, 'close'):
+        session.close()
+
+def _pooled_adapter(config):
+    return HTTPAdapter(pool_connections=4, pool_maxsize=config['HTTP_POOL_SIZE'])
+
+def _build_http_session(config):
+    session = requests.Session()
+    adapter = _pooled_adapter(config)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def _build_twilio_client(config):
+    http_client = TwilioHttpClient()
+    # Set after construction: the constructor only accepts one number, requests takes the pair
+    http_client.timeout = http_timeout(config)
+    adapter = _pooled_adapter(config)
+    http_client.session.mount('https://', adapter)
+    http_client.session.mount('http://', adapter)
+    client = Client(config['TWILIO_ACCOUNT_SID'], config['TWILIO_AUTH_TOKEN'], http_client=http_client)
+    client.api.base_url = config['TWILIO_API_BASE']
+    return client
+
+_clients = ClientRegistry()
+
+def http_session():
+    """Shared keep-alive session for ElevenLabs and the LLM API"""
+    return _clients.get('http', ('HTTP_POOL_SIZE',), _build_http_session)
+
+def twilio_client():
+    return _clients.get('twilio', ('TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN', 'TWILIO_API_BASE',
+                                   'HTTP_POOL_SIZE', 'HTTP_CONNECT_TIMEOUT', 'HTTP_READ_TIMEOUT'), _build_twilio_client)
+
+def http_timeout(config, read_timeout=None):
+    return (config['HTTP_CONNECT_TIMEOUT'], read_timeout or config['HTTP_READ_TIMEOUT'])
+
+# LLM response from any OpenAI-compatible chat completions endpoint (GPT-4 by default)
+@timed('get_llm_response')
 def get_llm_response(prompt):
-    # Example with OpenAI GPT-4
-    import openai
-    openai.api_key = llm_api_key
-    resp = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[{"role": "system", "content": "You are a sales agent."}, {"role": "user", "content": prompt}]
+    config = get_config()
+    r = http_session().post(
+        f"{config['LLM_API_BASE'].rstrip('/')}/chat/completions",
+        headers={"Authorization": f"Bearer {config['LLM_API_KEY']}"},
+        json={
+            "model": config['LLM_MODEL'],
+            "messages": [{"role": "system", "content": "You are a sales agent."}, {"role": "user", "content": prompt}],
+        },
+        timeout=http_timeout(config, config['LLM_TIMEOUT_SECONDS']),
     )
-    return resp['choices'][0]['message']['content']
+    r.raise_for_status()
+    return r.json()['choices'][0]['message']['content']
+
+_tts_cache = None
+_tts_cache_lock = threading.Lock()
+
+def get_tts_cache():
+    global _tts_cache
+    with _tts_cache_lock:
+        if _tts_cache is None:
+            config = get_config()
+            _tts_cache = ResultCache(config['TTS_CACHE_PATH'], config['TTS_CACHE_MEMORY_ENTRIES'],
+                                     config['TTS_CACHE_MAX_BYTES'])
+        return _tts_cache
+
+def tts_cache_key(text, config):
+    """Content address of a rendering: the same voice, agent and text always produce the same audio"""
+    material = '\0'.join([config['ELEVENLABS_VOICE_ID'], config['ELEVENLABS_AGENT_ID'], text])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+# Twilio fetches the audio when the call connects, so a cached URL must outlive the dial by this much
+AUDIO_URL_EXPIRY_MARGIN_SECONDS = 300
+
+def audio_url_expiry(audio_url, body):
+    """When a rendered audio URL stops working: the response's expires_at/expires_in, or a signed URL's expiry; None if unstated"""
+    now = time.time()
+    if isinstance(body.get('expires_at'), (int, float)):
+        return float(body['expires_at'])
+    if isinstance(body.get('expires_in'), (int, float)):
+        return now + body['expires_in']
+    query = {k.lower(): v[0] for k, v in parse_qs(urlsplit(audio_url).query).items()}
+    try:
+        if 'expires' in query:
+            return float(query['expires'])
+        for prefix in ('x-amz-', 'x-goog-'):
+            if prefix + 'date' in query and prefix + 'expires' in query:
+                signed = timegm(time.strptime(query[prefix + 'date'], '%Y%m%dT%H%M%SZ'))
+                return signed + float(query[prefix + 'expires'])
+    except ValueError:
+        pass
+    return None
+
+def audio_url_ttl(audio_url, body, config):
+    """Seconds to cache a rendered audio URL: until shortly before it expires, at most TTS_CACHE_TTL_SECONDS"""
+    ttl = config['TTS_CACHE_TTL_SECONDS']
+    expires_at = audio_url_expiry(audio_url, body)
+    if expires_at is not None:
+        ttl = min(ttl, expires_at - AUDIO_URL_EXPIRY_MARGIN_SECONDS - time.time())
+    return ttl
 
 # Placeholder for ElevenLabs TTS (returns a URL to the generated audio)
 def elevenlabs_tts(text):
-    url = f"https://api.elevenlabs.io/v1/agents/{elevenlabs_agent_id}/generate"
+    config = get_config()
+    cache = get_tts_cache()
+    key = tts_cache_key(text, config)
+    audio_url = cache.get(key)
+    if audio_url:
+        return audio_url
+    url = f"{config['ELEVENLABS_API_BASE'].rstrip('/')}/agents/{config['ELEVENLABS_AGENT_ID']}/generate"
     headers = {
-        "xi-api-key": elevenlabs_api_key,
+        "xi-api-key": config['ELEVENLABS_API_KEY'],
         "Content-Type": "application/json"
     }
     data = {"text": text}
-    r = requests.post(url, headers=headers, json=data)
+    if config['ELEVENLABS_VOICE_ID']:
+        data["voice_id"] = config['ELEVENLABS_VOICE_ID']
+    # Timed here rather than around the whole function so cache hits don't hide vendor latency
+    with span('elevenlabs_tts') as outcome:
+        r = http_session().post(url, headers=headers, json=data, timeout=http_timeout(config))
+        if not r.ok:
+            outcome['outcome'] = 'error'
     if r.ok:
-        return r.json().get('audio_url')
+        body = r.json()
+        audio_url = body.get('audio_url')
+        ttl = audio_url_ttl(audio_url, body, config) if audio_url else 0
+        if ttl > 0:
+            cache.put(key, 'tts', audio_url, ttl)
+        return audio_url
     return None
 
+def prerender_scripts(scripts, workers=None):
+    """Render every distinct script ahead of dialing so TTS is off the per-call path.
+
+    Returns {script: audio_url or None}.
+    """
+    unique = list(dict.fromkeys(scripts))
+    if not unique:
+        return {}
+    workers = workers or get_config()['TTS_PRERENDER_WORKERS']
+    with ThreadPoolExecutor(max_workers=min(workers, len(unique)), thread_name_prefix='tts') as pool:
+        return dict(zip(unique, pool.map(_render_quietly, unique)))
+
+def _render_quietly(text):
+    try:
+        return elevenlabs_tts(text)
+    except Exception:
+        # A failed pre-render just means the call renders (and retries) on its own
+        return None
+
+@timed('place_call')
 def place_call(to_number, script):
-    client = Client(twilio_sid, twilio_token)
+    config = get_config()
+    client = twilio_client()
     # Generate TTS audio URL from ElevenLabs
     audio_url = elevenlabs_tts(script)
     if not audio_url:
         raise Exception("Failed to generate TTS audio")
     # Initiate call with Twilio, play audio
-    call = client.calls.create(
-        to=to_number,
-        from_=twilio_number,
-        url=audio_url  # TwiML Bin or webhook that plays audio
-    )
+    with span('twilio_calls_create'):
+        call = client.calls.create(
+            to=to_number,
+            from_=config['TWILIO_PHONE_NUMBER'],
+            url=audio_url  # TwiML Bin or webhook that plays audio
+        )
     return call.sid
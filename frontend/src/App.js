@@ -1,32 +1,74 @@
-import React, { useEffect, useState } from 'react';
-import { getLeads, scrapeLeads } from './api';
+import React, { useCallback, useEffect, useRef, useState } from 'react';
+import { getLeads, getLeadChanges, scrapeLeads, getScrapeJob, callBatch, getCallBatch } from './api';
 import LeadTable from './components/LeadTable';
 import SettingsModal from './components/SettingsModal';
 
+function mergeLeads(current, changed, deleted) {
+  const byId = new Map(current.map(lead => [lead.id, lead]));
+  deleted.forEach(id => byId.delete(id));
+  changed.forEach(lead => byId.set(lead.id, { ...byId.get(lead.id), ...lead }));
+  return Array.from(byId.values()).sort((a, b) => a.id - b.id);
+}
+
 function App() {
   const [leads, setLeads] = useState([]);
   const [loading, setLoading] = useState(false);
   const [scraping, setScraping] = useState(false);
   const [settingsOpen, setSettingsOpen] = useState(false);
+  const [campaign, setCampaign] = useState(null);
 
-  const fetchLeads = async () => {
-    setLoading(true);
-    const data = await getLeads();
-    setLeads(data);
-    setLoading(false);
-  };
+  const leadsVersion = useRef(null);
+
+  // First load pulls the table; after that only changed and deleted rows are fetched and merged
+  const fetchLeads = useCallback(async () => {
+    if (leadsVersion.current === null) {
+      setLoading(true);
+      const { leads: data, version } = await getLeads();
+      leadsVersion.current = version;
+      setLeads(data);
+      setLoading(false);
+      return;
+    }
+    const { changed, deleted, version } = await getLeadChanges(leadsVersion.current);
+    leadsVersion.current = version;
+    if (changed.length || deleted.length) {
+      setLeads(current => mergeLeads(current, changed, deleted));
+    }
+  }, []);
+
+  const applyLeadUpdate = useCallback((lead) => {
+    setLeads(current => mergeLeads(current, [lead], []));
+  }, []);
 
   useEffect(() => {
     fetchLeads();
-  }, []);
+  }, [fetchLeads]);
 
   const handleScrape = async () => {
     setScraping(true);
-    await scrapeLeads();
+    // Scrapes run as background jobs; poll until ours finishes
+    let job = await scrapeLeads();
+    while (job.state === 'queued' || job.state === 'running') {
+      await new Promise(resolve => setTimeout(resolve, 2000));
+      job = await getScrapeJob(job.job_id);
+    }
     await fetchLeads();
     setScraping(false);
   };
 
+  const handleCallAll = async () => {
+    // The server dials every Not Called lead on its own worker pool; we just watch progress
+    let progress = await callBatch({ filter: { status: 'Not Called' } });
+    setCampaign(progress);
+    while (['prerendering', 'running', 'cancelling'].includes(progress.state)) {
+      await new Promise(resolve => setTimeout(resolve, 2000));
+      progress = await getCallBatch(progress.campaign_id);
+      setCampaign(progress);
+    }
+    await fetchLeads();
+    setCampaign(null);
+  };
+
   return (
     <div className="min-h-screen bg-gray-50 p-8">
       <div className="flex justify-between items-center mb-8">
@@ -42,10 +84,17 @@ function App() {
       >
         {scraping ? 'Scraping...' : 'Scrape New Leads'}
       </button>
+      <button
+        className="mb-6 ml-4 bg-blue-600 text-white px-6 py-2 rounded hover:bg-blue-700 disabled:opacity-50"
+        onClick={handleCallAll}
+        disabled={!!campaign}
+      >
+        {campaign ? `Calling ${campaign.completed}/${campaign.total}...` : 'Call All Not Called'}
+      </button>
       {loading ? (
         <div>Loading leads...</div>
       ) : (
-        <LeadTable leads={leads} onStatusChange={fetchLeads} />
+        <LeadTable leads={leads} onLeadUpdate={applyLeadUpdate} onLeadsChanged={fetchLeads} />
       )}
       <SettingsModal open={settingsOpen} onClose={() => setSettingsOpen(false)} onSave={fetchLeads} />
     </div>
@@ -2,10 +2,61 @@ import axios from 'axios';
 
 const API_BASE = process.env.REACT_APP_API_BASE || 'http://localhost:5002/api';
 
-export const getLeads = () => axios.get(`${API_BASE}/leads`).then(r => r.data);
+// Walks the keyset-paginated leads endpoint until the last page. Returns the leads and
+// the change version to pass to getLeadChanges next time.
+export const getLeads = async (params = {}) => {
+  const leads = [];
+  let cursor = null;
+  let version = null;
+  do {
+    const { data } = await axios.get(`${API_BASE}/leads`, { params: { ...params, limit: 1000, cursor } });
+    leads.push(...data.leads);
+    // The first page's version is the safe one: later pages can only add newer changes
+    if (version === null) version = data.version;
+    cursor = data.next_cursor;
+  } while (cursor);
+  return { leads, version };
+};
+
+// Leads changed and ids deleted since `since`; an unchanged table comes back as a 304
+let changesEtag = null;
+export const getLeadChanges = async (since) => {
+  const changed = [];
+  const deleted = [];
+  let version = since;
+  let hasMore = true;
+  while (hasMore) {
+    const response = await axios.get(`${API_BASE}/leads`, {
+      params: { since: version, limit: 1000 },
+      headers: changesEtag ? { 'If-None-Match': changesEtag } : {},
+      validateStatus: status => (status >= 200 && status < 300) || status === 304,
+    });
+    if (response.status === 304) break;
+    changesEtag = response.headers.etag || null;
+    changed.push(...response.data.leads);
+    deleted.push(...response.data.deleted);
+    version = response.data.version;
+    hasMore = response.data.has_more;
+  }
+  return { changed, deleted, version };
+};
+
 export const addLead = (lead) => axios.post(`${API_BASE}/leads`, lead);
 export const updateLead = (id, data) => axios.patch(`${API_BASE}/leads/${id}`, data);
-export const scrapeLeads = (limit = 30) => axios.post(`${API_BASE}/scrape`, { limit });
+export const scrapeLeads = (limit = 30) => axios.post(`${API_BASE}/scrape`, { limit }).then(r => r.data);
+export const getScrapeJob = (job_id) => axios.get(`${API_BASE}/scrape/${job_id}`).then(r => r.data);
 export const callLead = (lead_id, script) => axios.post(`${API_BASE}/call`, { lead_id, script });
+export const callBatch = (body = {}) => axios.post(`${API_BASE}/call/batch`, body).then(r => r.data);
+export const getCallBatch = (campaign_id) => axios.get(`${API_BASE}/call/batch/${campaign_id}`).then(r => r.data);
 export const getCallLogs = (lead_id) => axios.get(`${API_BASE}/call_logs/${lead_id}`).then(r => r.data);
 export const addCallLog = (log) => axios.post(`${API_BASE}/call_logs`, log);
+
+// Live updates over server-sent events. EventSource reconnects on its own and resends
+// Last-Event-ID, so the server replays whatever was missed (or sends resync).
+export const subscribeEvents = (handlers) => {
+  const source = new EventSource(`${API_BASE}/events`);
+  Object.entries(handlers).forEach(([type, handler]) => {
+    source.addEventListener(type, (event) => handler(JSON.parse(event.data)));
+  });
+  return () => source.close();
+};
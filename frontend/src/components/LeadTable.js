@@ -1,29 +1,36 @@
-import React, { useState } from 'react';
-import { callLead, updateLead, getCallLogs } from '../api';
+import React, { useEffect, useState } from 'react';
+import { callLead, updateLead, getCallLogs, subscribeEvents } from '../api';
 
 const STATUS_COLORS = {
   'Not Called': 'bg-gray-200 text-gray-700',
+  'Queued': 'bg-indigo-100 text-indigo-700',
   'Calling': 'bg-blue-200 text-blue-700',
   'Completed': 'bg-green-200 text-green-700',
   'Interested': 'bg-yellow-200 text-yellow-700',
   'Declined': 'bg-red-200 text-red-700',
 };
 
-export default function LeadTable({ leads, onStatusChange }) {
+export default function LeadTable({ leads, onLeadUpdate, onLeadsChanged }) {
   const [loadingId, setLoadingId] = useState(null);
   const [transcript, setTranscript] = useState(null);
 
+  // Status changes from any tab (or the dialer) arrive as events instead of refetches
+  useEffect(() => subscribeEvents({
+    lead: onLeadUpdate,
+    leads_changed: onLeadsChanged,
+    scrape: onLeadsChanged,
+    resync: onLeadsChanged,
+  }), [onLeadUpdate, onLeadsChanged]);
+
   const handleCall = async (lead) => {
     setLoadingId(lead.id);
     await callLead(lead.id);
-    onStatusChange();
     setLoadingId(null);
   };
 
   const handleClose = async (lead) => {
     setLoadingId(lead.id);
     await updateLead(lead.id, { status: 'Completed' });
-    onStatusChange();
     setLoadingId(null);
   };
 